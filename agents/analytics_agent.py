@@ -10,77 +10,114 @@ integrating a text‑to‑SQL model via the LLM.
 
 from __future__ import annotations
 
+import asyncio
+from functools import cached_property
 import re
 from typing import Any, Dict, List, Optional
 
-from llm import call_gemini_prompt, LLMError
 from tools.sql_tool import SQLTool
-from tools.vector_rag_tool import VectorRAGTool, DefinitionRAGTool
+from tools.fast_json import dumps
+from tools.keyword_router import KeywordRouter
+from tools.reranker import rerank
+from tools.formatters import render_rows, summarise
+from tools.vector_rag_tool import VectorRAGTool
+from tools.rag_registry import get_rag
 from tools.analytics_tools import AnalyticsReportingTool, TextToSQLTool
-from tools.saved_reports import SavedReportsManager
+from tools.saved_reports import SavedReportsManager, ensure_initialized
 from tools.audit_logger import audit_agent_method
 
 
+_REPORT_ID_RE = re.compile(r"report\s+(\d+)")
+
+_SQL_LIST_SAVED_REPORTS = "SELECT id, title FROM saved_reports ORDER BY created_at DESC"
+_SQL_REVENUE_BY_DAY = (
+    "SELECT date(created_at) as date, SUM(total) as daily_revenue, COUNT(*) as order_count "
+    "FROM orders WHERE status != 'cancelled' "
+    "GROUP BY date(created_at) "
+    "ORDER BY daily_revenue DESC LIMIT 5"
+)
+_SQL_REVENUE_BY_MONTH = (
+    "SELECT strftime('%Y-%m', created_at) as month, SUM(total) as monthly_revenue, COUNT(*) as order_count "
+    "FROM orders WHERE status != 'cancelled' "
+    "GROUP BY strftime('%Y-%m', created_at) "
+    "ORDER BY monthly_revenue DESC LIMIT 5"
+)
+_SQL_TOTAL_REVENUE = (
+    "SELECT "
+    "TOTAL(total) FILTER (WHERE status != 'cancelled') as total_revenue, "
+    "COUNT(*) FILTER (WHERE status != 'cancelled') as successful_orders, "
+    "COUNT(*) FILTER (WHERE status = 'cancelled') as cancelled_orders, "
+    "AVG(total) FILTER (WHERE status != 'cancelled') as avg_order_value "
+    "FROM orders"
+)
+
+
 class AnalyticsAgent:
+    # General questions (metric definitions) may be answered by the router's
+    # combined classify-and-answer call without running this agent
+    SUPPORTS_PASSTHROUGH = True
+    # Keyword rules checked in order against the lowercased query
+    _INTENTS = (
+        ("_list_saved_reports", [["list reports", "saved reports"]]),
+        ("_analyze_revenue_by_day", [["revenue", "profit", "sales"], ["day", "daily", "highest", "best"]]),
+        ("_analyze_revenue_by_month", [["revenue", "profit", "sales"], ["month", "monthly"]]),
+        ("_analyze_total_revenue", [["revenue", "profit", "sales"], ["total", "overall"]]),
+    )
+    _ROUTER = KeywordRouter(_INTENTS)
+
     def __init__(self) -> None:
         self.sql = SQLTool("analytics")
-        self.rag = VectorRAGTool("main_documents")  # General RAG
-        
-        # Domain-specific RAG tools as per requirements
+
+    @cached_property
+    def rag(self) -> VectorRAGTool:
+        """General RAG over all documents, shared with the other agents."""
+        return get_rag("main_documents")
+
+    @cached_property
+    def definition_rag(self) -> Optional[VectorRAGTool]:
+        """Domain-specific RAG tool as per requirements, loaded on first use."""
         try:
-            self.definition_rag = DefinitionRAGTool()
+            return get_rag("definition_documents")
         except Exception as e:
             print(f"Warning: Could not initialize DefinitionRAGTool: {e}")
-            self.definition_rag = None
+            return None
 
-    def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
+    async def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
         q = query.lower()
         try:
-            if "list reports" in q or "saved reports" in q:
-                return self._list_saved_reports(query)
-            if ("revenue" in q or "profit" in q or "sales" in q) and ("day" in q or "daily" in q or "highest" in q or "best" in q):
-                return self._analyze_revenue_by_day(query)
-            if ("revenue" in q or "profit" in q or "sales" in q) and ("month" in q or "monthly" in q):
-                return self._analyze_revenue_by_month(query)
-            if ("revenue" in q or "profit" in q or "sales" in q) and ("total" in q or "overall" in q):
-                return self._analyze_total_revenue(query)
+            handler = self._ROUTER.match(q)
+            if handler:
+                return await getattr(self, handler)(query)
             # Run report if the query contains "report" followed by an ID
-            m = re.search(r"report\s+(\d+)", q)
+            m = _REPORT_ID_RE.search(q)
             if m:
                 report_id = int(m.group(1))
-                return self._run_saved_report(report_id, query)
+                return await self._run_saved_report(report_id, query)
             # Fallback RAG search across glossary and documents
-            rag_results = self.rag.search(query)
+            candidates = await self.rag.asearch(query, k=30)
+            rag_results = await asyncio.to_thread(rerank, query, candidates, k=4)
             if rag_results:
-                return self._summarise(
-                    f"RAG search results for '{query}': {rag_results}", query
+                return await self._summarise(
+                    f"RAG search results for '{query}': {dumps(rag_results)}", query
                 )
             return "I'm sorry, I couldn't understand your analytics request."
         except Exception:
             raise
 
-    def _summarise(self, raw_response: str, query: str) -> str:
-        prompt = (
-            "You are an analytics assistant summarising data for a user.  "
-            "Given the following raw information and the user's query, "
-            "compose a concise and insightful reply.\n\n"
-            f"User query: {query}\n"
-            f"Raw information: {raw_response}"
-        )
-        return call_gemini_prompt(prompt)
-
-    def _list_saved_reports(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT id, title FROM saved_reports ORDER BY created_at DESC"
-        )
-        return self._summarise(str(rows), query)
+    async def _summarise(self, raw_response: Any, query: str) -> str:
+        return await summarise("analytics", raw_response, query)
+
+    async def _list_saved_reports(self, query: str) -> str:
+        ensure_initialized()
+        rows = await self.sql.aread(_SQL_LIST_SAVED_REPORTS)
+        return render_rows("list_saved_reports", rows)
 
     @audit_agent_method("analytics")
-    def _create_advanced_analysis(self, query: str) -> str:
+    async def _create_advanced_analysis(self, query: str) -> str:
         """Create advanced analysis with chart generation."""
         try:
             # Use the analytics reporting tool to create a complete report
-            report = AnalyticsReportingTool.create_report(query, domain="analytics")
+            report = await AnalyticsReportingTool.acreate_report(query, domain="analytics")
             
             if report.get("chart") and report["chart"].get("type") != "message":
                 chart_info = report["chart"]
@@ -98,10 +135,10 @@ class AnalyticsAgent:
             return f"Failed to create advanced analysis: {str(e)}"
     
     @audit_agent_method("analytics") 
-    def _list_available_reports(self) -> str:
+    async def _list_available_reports(self) -> str:
         """List all available saved reports."""
         try:
-            reports = SavedReportsManager.list_all_reports()
+            reports = await asyncio.to_thread(SavedReportsManager.list_all_reports)
             
             if not reports:
                 return "No saved reports are currently available."
@@ -114,24 +151,24 @@ class AnalyticsAgent:
                     categories[category] = []
                 categories[category].append(report)
             
-            response = "Available Saved Reports:\n\n"
+            lines = ["Available Saved Reports:", ""]
             for category, category_reports in categories.items():
-                response += f"**{category.title()} Reports:**\n"
+                lines.append(f"**{category.title()} Reports:**")
                 for report in category_reports:
-                    response += f"  • Report {report['id']}: {report['name']} - {report['description']}\n"
-                response += "\n"
+                    lines.append(f"  • Report {report['id']}: {report['name']} - {report['description']}")
+                lines.append("")
             
-            response += "To run a report, say 'run report [ID]' or 'show report [ID]'"
-            return response
+            lines.append("To run a report, say 'run report [ID]' or 'show report [ID]'")
+            return "\n".join(lines)
             
         except Exception as e:
             return f"Failed to list reports: {str(e)}"
 
     @audit_agent_method("analytics")
-    def _run_saved_report(self, report_id: int, query: str) -> str:
+    async def _run_saved_report(self, report_id: int, query: str) -> str:
         """Run a saved report by ID."""
         try:
-            report_result = SavedReportsManager.execute_report(report_id)
+            report_result = await asyncio.to_thread(SavedReportsManager.execute_report, report_id)
             
             if report_result.get("error"):
                 return report_result["error"]
@@ -154,34 +191,17 @@ class AnalyticsAgent:
         except Exception as e:
             return f"Failed to run report {report_id}: {str(e)}"
 
-    def _analyze_revenue_by_day(self, query: str) -> str:
+    async def _analyze_revenue_by_day(self, query: str) -> str:
         """Analyze revenue by day to find highest revenue days."""
-        rows = self.sql.read(
-            "SELECT DATE(created_at) as date, SUM(total) as daily_revenue, COUNT(*) as order_count "
-            "FROM orders WHERE status != 'cancelled' "
-            "GROUP BY DATE(created_at) "
-            "ORDER BY daily_revenue DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _analyze_revenue_by_month(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_REVENUE_BY_DAY)
+        return await self._summarise(rows, query)
+
+    async def _analyze_revenue_by_month(self, query: str) -> str:
         """Analyze revenue by month."""
-        rows = self.sql.read(
-            "SELECT strftime('%Y-%m', created_at) as month, SUM(total) as monthly_revenue, COUNT(*) as order_count "
-            "FROM orders WHERE status != 'cancelled' "
-            "GROUP BY strftime('%Y-%m', created_at) "
-            "ORDER BY monthly_revenue DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _analyze_total_revenue(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_REVENUE_BY_MONTH)
+        return await self._summarise(rows, query)
+
+    async def _analyze_total_revenue(self, query: str) -> str:
         """Analyze total revenue and key metrics."""
-        rows = self.sql.read(
-            "SELECT "
-            "SUM(CASE WHEN status != 'cancelled' THEN total ELSE 0 END) as total_revenue, "
-            "COUNT(CASE WHEN status != 'cancelled' THEN 1 END) as successful_orders, "
-            "COUNT(CASE WHEN status = 'cancelled' THEN 1 END) as cancelled_orders, "
-            "AVG(CASE WHEN status != 'cancelled' THEN total ELSE NULL END) as avg_order_value "
-            "FROM orders"
-        )
-        return self._summarise(str(rows), query)
+        rows = await self.sql.aread(_SQL_TOTAL_REVENUE)
+        return await self._summarise(rows, query)
@@ -11,99 +11,143 @@ classification if desired.
 
 from __future__ import annotations
 
+import asyncio
+from functools import cached_property
 import random
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
-from llm import call_gemini_prompt, LLMError
+from llm import acall_gemini_prompt
 from tools.sql_tool import SQLTool
-from tools.vector_rag_tool import VectorRAGTool, PolicyRAGTool
-from tools.approval_system import check_and_handle_approval
+from tools.fast_json import dumps
+from tools.semantic_cache import summary_cache
+from tools.keyword_router import KeywordRouter
+from tools.reranker import rerank
+from tools.formatters import render_rows, summarise
+from tools.vector_rag_tool import VectorRAGTool
+from tools.rag_registry import get_rag
+from tools.approval_system import ApprovalSystem, check_and_handle_approval
 from tools.ml_tools import AnomalyDetectionTool
 from tools.audit_logger import audit_agent_method
 from tools.memory_manager import EntityMemory
 
 
+# Dollar amount in an invoice request, e.g. "$1200" or "99.50"
+_AMOUNT_RE = re.compile(r"\$?(\d+(?:\.\d{2})?)")
+
+_SQL_LIST_INVOICES = (
+    "SELECT invoices.id, customers.name AS customer_name, invoices.invoice_number, invoices.total_amount, invoices.status, invoices.issue_date "
+    "FROM invoices JOIN customers ON invoices.customer_id = customers.id "
+    "ORDER BY invoices.issue_date DESC LIMIT 5"
+)
+_SQL_LIST_PAYMENTS = (
+    "SELECT payments.id, customers.name AS customer_name, payments.amount, payments.method, payments.received_at "
+    "FROM payments JOIN customers ON payments.customer_id = customers.id "
+    "ORDER BY payments.received_at DESC LIMIT 5"
+)
+# Pick one row at random via a rowid probe instead of loading the whole table
+_SQL_RANDOM_CUSTOMER = (
+    "SELECT id, name FROM customers "
+    "WHERE rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM customers) "
+    "ORDER BY rowid LIMIT 1"
+)
+_SQL_RANDOM_INVOICEABLE_ORDER = (
+    "SELECT orders.id, orders.total, orders.customer_id FROM orders "
+    "JOIN customers ON customers.id = orders.customer_id "
+    "WHERE orders.rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM orders) "
+    "ORDER BY orders.rowid LIMIT 1"
+)
+_SQL_INSERT_INVOICE = (
+    "INSERT INTO invoices (customer_id, invoice_number, issue_date, due_date, total_amount, status, created_at) "
+    "VALUES (?, ?, date('now'), date('now','+30 day'), ?, 'unpaid', datetime('now'))"
+)
+_SQL_LINK_INVOICE_ORDER = "INSERT INTO invoice_orders (invoice_id, order_id) VALUES (?, ?)"
+
+
 class FinanceAgent:
+    # Keyword rules checked in order against the lowercased query; policy
+    # questions come last
+    _INTENTS = (
+        ("_list_invoices", [["invoices"], ["list", "show"]]),
+        ("_list_payments", [["payments"], ["list", "show"]]),
+        ("_create_intelligent_invoice", [["invoice"], ["create", "new"]]),
+        ("_handle_policy_query", [["policy", "refund", "procedure", "how", "what is", "what are"]]),
+    )
+    _ROUTER = KeywordRouter(_INTENTS)
+
     def __init__(self) -> None:
         self.sql = SQLTool("finance")
-        self.rag = VectorRAGTool("main_documents")  # General RAG
-        
-        # Domain-specific RAG tools as per requirements
+
+    @cached_property
+    def rag(self) -> VectorRAGTool:
+        """General RAG over all documents, shared with the other agents."""
+        return get_rag("main_documents")
+
+    @cached_property
+    def policy_rag(self) -> Optional[VectorRAGTool]:
+        """Domain-specific RAG tool as per requirements, loaded on first use."""
         try:
-            self.policy_rag = PolicyRAGTool()
+            return get_rag("policy_documents")
         except Exception as e:
             print(f"Warning: Could not initialize PolicyRAGTool: {e}")
-            self.policy_rag = None
+            return None
 
-    def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
+    async def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
         q = query.lower()
         try:
-            if "invoices" in q and ("list" in q or "show" in q):
-                return self._list_invoices(query)
-            if "payments" in q and ("list" in q or "show" in q):
-                return self._list_payments(query)
-            if "invoice" in q and ("create" in q or "new" in q):
-                return self._create_intelligent_invoice(query)
-            # Check for policy questions first
-            if any(keyword in q for keyword in ["policy", "refund", "procedure", "how", "what is", "what are"]):
-                return self._handle_policy_query(query)
+            handler = self._ROUTER.match(q)
+            if handler:
+                return await getattr(self, handler)(query)
             # Fallback RAG search
-            rag_results = self.rag.search(query)
+            candidates = await self.rag.asearch(query, k=30)
+            rag_results = await asyncio.to_thread(rerank, query, candidates, k=4)
             if rag_results:
-                return self._summarise(
-                    f"RAG search results for '{query}': {rag_results}", query
+                return await self._summarise(
+                    f"RAG search results for '{query}': {dumps(rag_results)}", query
                 )
             return "I'm sorry, I couldn't understand your finance request."
         except Exception:
             raise
 
-    def _summarise(self, raw_response: str, query: str) -> str:
-        prompt = (
-            "You are a finance assistant summarising data for a user.  "
-            "Given the following raw information and the user's query, "
-            "compose a concise and professional reply.\n\n"
-            f"User query: {query}\n"
-            f"Raw information: {raw_response}"
-        )
-        return call_gemini_prompt(prompt)
-
-    def _list_invoices(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT invoices.id, customers.name AS customer_name, invoices.invoice_number, invoices.total_amount, invoices.status, invoices.issue_date "
-            "FROM invoices JOIN customers ON invoices.customer_id = customers.id "
-            "ORDER BY invoices.issue_date DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _handle_policy_query(self, query: str) -> str:
-        """Handle policy and procedure questions using RAG."""
+    async def _summarise(self, raw_response: Any, query: str) -> str:
+        return await summarise("finance", raw_response, query)
+
+    async def _list_invoices(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_LIST_INVOICES)
+        return render_rows("list_invoices", rows)
+
+    async def _handle_policy_query(self, query: str) -> str:
+        """Handle policy and procedure questions using RAG.
+
+        The domain-specific policy search and the general tagged search are
+        independent, so both run concurrently; policy results are preferred
+        and, when present, the general search is not waited for.
+        """
+        general = asyncio.create_task(self.rag.asearch(query, k=3, tags="policy"))
         try:
-            # Try domain-specific policy RAG first
-            if self.policy_rag:
-                rag_results = self.policy_rag.search(query, k=3)
-                if rag_results:
-                    return self._summarise_policy_results(rag_results, query)
-            
-            # Fallback to general RAG
-            rag_results = self.rag.search(query, k=3, tags="policy")
+            rag_results = await self.policy_rag.asearch(query, k=3) if self.policy_rag else []
+            if rag_results:
+                general.cancel()
+            else:
+                rag_results = await general
             if rag_results:
-                return self._summarise_policy_results(rag_results, query)
+                return await self._summarise_policy_results(rag_results, query)
             
             return f"I couldn't find specific policy information about '{query}'. Please contact the finance department for clarification."
             
         except Exception as e:
+            general.cancel()
             print(f"Warning: Policy RAG search failed: {e}")
             return f"I'm having trouble accessing policy information for '{query}'. Please try again or contact finance support."
 
-    def _summarise_policy_results(self, results: list, query: str) -> str:
+    async def _summarise_policy_results(self, results: list, query: str) -> str:
         """Summarize policy RAG results into a helpful response."""
         if not results:
             return f"I couldn't find policy information about '{query}'."
         
         # Build context from results
-        context = ""
-        for i, result in enumerate(results[:3], 1):
-            context += f"{i}. {result.get('excerpt', '')}\n"
+        parts = [f"{i}. {result.get('excerpt', '')}" for i, result in enumerate(results[:3], 1)]
+        context = "\n".join(parts) + "\n"
         
         # Use LLM to provide a structured response
         prompt = f"""
@@ -116,72 +160,90 @@ Provide a clear, professional response that addresses the user's question about
 """
         
         try:
-            response = call_gemini_prompt(prompt)
+            response = await acall_gemini_prompt(prompt, stream=True)
             return response.strip()
         except Exception as e:
             # Fallback to simple concatenation
             return f"Based on our finance policies:\n\n{context}"
 
-    def _list_payments(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT payments.id, customers.name AS customer_name, payments.amount, payments.method, payments.received_at "
-            "FROM payments JOIN customers ON payments.customer_id = customers.id "
-            "ORDER BY payments.received_at DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
+    async def _list_payments(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_LIST_PAYMENTS)
+        return render_rows("list_payments", rows)
 
     @audit_agent_method("finance")
-    def _create_intelligent_invoice(self, query: str) -> str:
+    async def _create_intelligent_invoice(self, query: str) -> str:
         """Create an invoice with amount extracted from the query."""
-        import re
-        
         # Extract amount from query using regex
-        amount_match = re.search(r'\$?(\d+(?:\.\d{2})?)', query)
+        amount_match = _AMOUNT_RE.search(query)
         if amount_match:
             requested_amount = float(amount_match.group(1))
         else:
             # Fallback to dummy creation if no amount found
-            return self._create_dummy_invoice(query)
+            return await self._create_dummy_invoice(query)
         
         try:
-            # Pick a random customer
-            customers = self.sql.read("SELECT id, name FROM customers")
-            if not customers:
-                raise RuntimeError("No customers available to create an invoice")
-            customer = random.choice(customers)
+            customer, invoice_number, invoice_id = await asyncio.to_thread(
+                self._insert_invoice_for_random_customer, requested_amount
+            )
             customer_id = customer["id"]
             customer_name = customer["name"]
             
-            # Check if approval is needed
-            needs_approval, approval_message = check_and_handle_approval(
-                module="finance",
-                operation_type="invoice",
-                amount=requested_amount,
-                customer_id=customer_id,
-                customer_name=customer_name
-            )
-            
-            if needs_approval:
+            if invoice_id is None:
+                # Over the threshold: nothing was written, file an approval request
+                needs_approval, approval_message = await asyncio.to_thread(
+                    check_and_handle_approval,
+                    module="finance",
+                    operation_type="invoice",
+                    amount=requested_amount,
+                    customer_id=customer_id,
+                    customer_name=customer_name
+                )
                 return approval_message
             
-            invoice_number = f"INV{random.randint(100000,999999)}"
-            
-            # Create invoice with the requested amount
-            invoice_id = self.sql.write(
-                "INSERT INTO invoices (customer_id, invoice_number, issue_date, due_date, total_amount, status, created_at) "
-                "VALUES (?, ?, date('now'), date('now','+30 day'), ?, 'unpaid', datetime('now'))",
-                (customer_id, invoice_number, requested_amount),
-            )
-            
             # Update customer last contact
-            EntityMemory.update_last_contact(customer_id)
+            await asyncio.to_thread(EntityMemory.update_last_contact, customer_id)
+            summary_cache.invalidate()
             
             return f"Successfully created invoice {invoice_number} for {customer_name} with amount ${requested_amount:.2f}. Invoice ID: {invoice_id}"
             
         except Exception as e:
             return f"Failed to create invoice: {str(e)}"
 
-    def _create_dummy_invoice(self, query: str) -> str:
+    def _insert_invoice_for_random_customer(self, amount: float) -> Tuple[Dict[str, Any], Optional[str], Optional[int]]:
+        """Pick a customer and insert an invoice for `amount` in one transaction.
+
+        Returns `(customer, invoice_number, invoice_id)`; the invoice fields
+        are None when the amount needs approval, in which case nothing is
+        inserted.
+        """
+        with self.sql.transaction() as tx:
+            customers = tx.read(_SQL_RANDOM_CUSTOMER)
+            if not customers:
+                raise RuntimeError("No customers available to create an invoice")
+            customer = customers[0]
+            if ApprovalSystem.requires_approval("invoice", amount):
+                return customer, None, None
+            invoice_number = f"INV{random.randint(100000,999999)}"
+            invoice_id = tx.write(_SQL_INSERT_INVOICE, (customer["id"], invoice_number, amount))
+        return customer, invoice_number, invoice_id
+
+    def _invoice_random_order(self) -> Tuple[Dict[str, Any], str, int]:
+        """Invoice a random order of an existing customer in one transaction.
+
+        Returns `(order, invoice_number, invoice_id)`.
+        """
+        with self.sql.transaction() as tx:
+            orders = tx.read(_SQL_RANDOM_INVOICEABLE_ORDER)
+            if not orders:
+                raise RuntimeError("No invoiceable orders")
+            order = orders[0]
+            invoice_number = f"INV{random.randint(100000,999999)}"
+            invoice_id = tx.write(_SQL_INSERT_INVOICE, (order["customer_id"], invoice_number, order["total"]))
+            # Link invoice to order
+            tx.write(_SQL_LINK_INVOICE_ORDER, (invoice_id, order["id"]))
+        return order, invoice_number, invoice_id
+
+    async def _create_dummy_invoice(self, query: str) -> str:
         """Create a dummy invoice for demonstration purposes.
 
         The invoice is created for a random customer and associated with a
@@ -189,31 +251,11 @@ Provide a clear, professional response that addresses the user's question about
         into the `invoice_orders` link table.  Invoice lines are not created
         here.  Returns a summarised confirmation message.
         """
-        # Pick a random customer
-        customers = self.sql.read("SELECT id FROM customers")
-        if not customers:
-            raise RuntimeError("No customers available to create an invoice")
-        customer_id = random.choice(customers)["id"]
-        # Pick a random order for this customer if available
-        orders = self.sql.read(
-            "SELECT id, total FROM orders WHERE customer_id = ?", (customer_id,)
-        )
-        if not orders:
-            raise RuntimeError("Selected customer has no orders to invoice")
-        order = random.choice(orders)
+        order, invoice_number, invoice_id = await asyncio.to_thread(self._invoice_random_order)
+        customer_id = order["customer_id"]
         order_id = order["id"]
         total = order["total"]
-        invoice_number = f"INV{random.randint(100000,999999)}"
-        invoice_id = self.sql.write(
-            "INSERT INTO invoices (customer_id, invoice_number, issue_date, due_date, total_amount, status, created_at) "
-            "VALUES (?, ?, date('now'), date('now','+30 day'), ?, 'unpaid', datetime('now'))",
-            (customer_id, invoice_number, total),
-        )
-        # Link invoice to order
-        self.sql.write(
-            "INSERT INTO invoice_orders (invoice_id, order_id) VALUES (?, ?)",
-            (invoice_id, order_id),
-        )
+        summary_cache.invalidate()
         raw_resp = {
             "invoice_id": invoice_id,
             "customer_id": customer_id,
@@ -221,4 +263,4 @@ Provide a clear, professional response that addresses the user's question about
             "total": total,
             "invoice_number": invoice_number,
         }
-        return self._summarise(f"New invoice created: {raw_resp}", query)
+        return await self._summarise(f"New invoice created: {dumps(raw_resp)}", query)
@@ -9,124 +9,143 @@ invokes the LLM to summarise the result for the user.
 
 from __future__ import annotations
 
+import asyncio
+from functools import cached_property
 import random
 from typing import Any, Dict, List, Optional
 
-from llm import call_gemini_prompt, LLMError
 from tools.sql_tool import SQLTool
-from tools.vector_rag_tool import VectorRAGTool, DocRAGTool
+from tools.fast_json import dumps
+from tools.semantic_cache import summary_cache
+from tools.keyword_router import KeywordRouter
+from tools.reranker import rerank
+from tools.formatters import render_rows, summarise
+from tools.vector_rag_tool import VectorRAGTool
+from tools.rag_registry import get_rag
+
+
+_SQL_LIST_STOCK = (
+    "SELECT products.name AS product_name, stock.qty_on_hand, stock.reorder_point "
+    "FROM stock JOIN products ON stock.product_id = products.id "
+    "ORDER BY stock.qty_on_hand ASC LIMIT 5"
+)
+_SQL_PRODUCTS_BY_PRICE_DESC = (
+    "SELECT products.name, products.price, products.description, stock.qty_on_hand "
+    "FROM products LEFT JOIN stock ON products.id = stock.product_id "
+    "ORDER BY products.price DESC LIMIT 5"
+)
+_SQL_PRODUCTS_BY_PRICE_ASC = (
+    "SELECT products.name, products.price, products.description, stock.qty_on_hand "
+    "FROM products LEFT JOIN stock ON products.id = stock.product_id "
+    "ORDER BY products.price ASC LIMIT 5"
+)
+_SQL_LIST_SUPPLIERS = "SELECT id, name, email, phone FROM suppliers ORDER BY name LIMIT 5"
+# Pick one row at random via a rowid probe instead of loading the whole table
+_SQL_RANDOM_SUPPLIER = (
+    "SELECT id FROM suppliers "
+    "WHERE rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM suppliers) "
+    "ORDER BY rowid LIMIT 1"
+)
+_SQL_RANDOM_PRODUCT = (
+    "SELECT id, price FROM products "
+    "WHERE rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM products) "
+    "ORDER BY rowid LIMIT 1"
+)
+_SQL_INSERT_PO = "INSERT INTO purchase_orders (supplier_id, status, created_at) VALUES (?, 'draft', datetime('now'))"
+_SQL_INSERT_PO_ITEM = "INSERT INTO po_items (po_id, product_id, quantity, unit_cost) VALUES (?, ?, ?, ?)"
 
 
 class InventoryAgent:
+    # Keyword rules checked in order against the lowercased query
+    _INTENTS = (
+        ("_list_stock", [["stock", "inventory"], ["list", "show", "levels", "status"]]),
+        ("_list_products_by_price", [["product", "products"], ["expensive", "cheapest", "price", "pricing"]]),
+        ("_list_suppliers", [["suppliers"], ["list", "show"]]),
+        ("_create_dummy_po", [["purchase order", "po"], ["create", "new"]]),
+    )
+    _ROUTER = KeywordRouter(_INTENTS)
+
     def __init__(self) -> None:
         self.sql = SQLTool("inventory")
-        self.rag = VectorRAGTool("main_documents")  # General RAG
-        
-        # Domain-specific RAG tools as per requirements
+
+    @cached_property
+    def rag(self) -> VectorRAGTool:
+        """General RAG over all documents, shared with the other agents."""
+        return get_rag("main_documents")
+
+    @cached_property
+    def doc_rag(self) -> Optional[VectorRAGTool]:
+        """Domain-specific RAG tool as per requirements, loaded on first use."""
         try:
-            self.doc_rag = DocRAGTool()
+            return get_rag("business_documents")
         except Exception as e:
             print(f"Warning: Could not initialize DocRAGTool: {e}")
-            self.doc_rag = None
+            return None
 
-    def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
+    async def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
         q = query.lower()
         try:
-            if ("stock" in q or "inventory" in q) and ("list" in q or "show" in q or "levels" in q or "status" in q):
-                return self._list_stock(query)
-            if ("product" in q or "products" in q) and ("expensive" in q or "cheapest" in q or "price" in q or "pricing" in q):
-                return self._list_products_by_price(query)
-            if "suppliers" in q and ("list" in q or "show" in q):
-                return self._list_suppliers(query)
-            if ("purchase order" in q or "po" in q) and ("create" in q or "new" in q):
-                return self._create_dummy_po(query)
+            handler = self._ROUTER.match(q)
+            if handler:
+                return await getattr(self, handler)(query)
             # Fallback RAG search
-            rag_results = self.rag.search(query)
+            candidates = await self.rag.asearch(query, k=30)
+            rag_results = await asyncio.to_thread(rerank, query, candidates, k=4)
             if rag_results:
-                return self._summarise(
-                    f"RAG search results for '{query}': {rag_results}", query
+                return await self._summarise(
+                    f"RAG search results for '{query}': {dumps(rag_results)}", query
                 )
             return "I'm sorry, I couldn't understand your inventory request."
         except Exception:
             raise
 
-    def _summarise(self, raw_response: str, query: str) -> str:
-        prompt = (
-            "You are an inventory assistant summarising data for a user.  "
-            "Given the following raw information and the user's query, "
-            "compose a concise and helpful reply.\n\n"
-            f"User query: {query}\n"
-            f"Raw information: {raw_response}"
-        )
-        return call_gemini_prompt(prompt)
-
-    def _list_stock(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT products.name AS product_name, stock.qty_on_hand, stock.reorder_point "
-            "FROM stock JOIN products ON stock.product_id = products.id "
-            "ORDER BY stock.qty_on_hand ASC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _list_products_by_price(self, query: str) -> str:
+    async def _summarise(self, raw_response: Any, query: str) -> str:
+        return await summarise("inventory", raw_response, query)
+
+    async def _list_stock(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_LIST_STOCK)
+        return render_rows("list_stock", rows)
+
+    async def _list_products_by_price(self, query: str) -> str:
         q = query.lower()
         if "expensive" in q or "highest" in q:
             # Show most expensive products
-            rows = self.sql.read(
-                "SELECT products.name, products.price, products.description, stock.qty_on_hand "
-                "FROM products LEFT JOIN stock ON products.id = stock.product_id "
-                "ORDER BY products.price DESC LIMIT 5"
-            )
+            rows = await self.sql.aread(_SQL_PRODUCTS_BY_PRICE_DESC)
         elif "cheapest" in q or "lowest" in q:
             # Show cheapest products
-            rows = self.sql.read(
-                "SELECT products.name, products.price, products.description, stock.qty_on_hand "
-                "FROM products LEFT JOIN stock ON products.id = stock.product_id "
-                "ORDER BY products.price ASC LIMIT 5"
-            )
+            rows = await self.sql.aread(_SQL_PRODUCTS_BY_PRICE_ASC)
         else:
             # Show products with pricing info
-            rows = self.sql.read(
-                "SELECT products.name, products.price, products.description, stock.qty_on_hand "
-                "FROM products LEFT JOIN stock ON products.id = stock.product_id "
-                "ORDER BY products.price DESC LIMIT 5"
-            )
-        return self._summarise(str(rows), query)
-
-    def _list_suppliers(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT id, name, email, phone FROM suppliers ORDER BY name LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _create_dummy_po(self, query: str) -> str:
+            rows = await self.sql.aread(_SQL_PRODUCTS_BY_PRICE_DESC)
+        return render_rows("list_products", rows)
+
+    async def _list_suppliers(self, query: str) -> str:
+        rows = await self.sql.aread(_SQL_LIST_SUPPLIERS)
+        return render_rows("list_suppliers", rows)
+
+    async def _create_dummy_po(self, query: str) -> str:
         """Create a dummy purchase order for demonstration.
 
         Select a random supplier and product and create a purchase order with
         a single line item.  Returns a summarised confirmation message.
         """
-        suppliers = self.sql.read("SELECT id FROM suppliers")
+        suppliers = await self.sql.aread(_SQL_RANDOM_SUPPLIER)
         if not suppliers:
             raise RuntimeError("No suppliers available to create a purchase order")
-        supplier_id = random.choice(suppliers)["id"]
+        supplier_id = suppliers[0]["id"]
         # Pick a random product
-        products = self.sql.read("SELECT id, price FROM products")
+        products = await self.sql.aread(_SQL_RANDOM_PRODUCT)
         if not products:
             raise RuntimeError("No products available to create a purchase order")
-        product = random.choice(products)
+        product = products[0]
         product_id = product["id"]
         unit_cost = product["price"]  # using selling price as stand‑in for cost
         quantity = random.randint(1, 10)
         # Create PO header
-        po_id = self.sql.write(
-            "INSERT INTO purchase_orders (supplier_id, status, created_at) VALUES (?, 'draft', datetime('now'))",
-            (supplier_id,),
-        )
+        po_id = await self.sql.awrite(_SQL_INSERT_PO, (supplier_id,))
         # Create PO line
-        self.sql.write(
-            "INSERT INTO po_items (po_id, product_id, quantity, unit_cost) VALUES (?, ?, ?, ?)",
-            (po_id, product_id, quantity, unit_cost),
-        )
+        await self.sql.awrite(_SQL_INSERT_PO_ITEM, (po_id, product_id, quantity, unit_cost))
+        summary_cache.invalidate()
         raw_resp = {
             "po_id": po_id,
             "supplier_id": supplier_id,
@@ -134,4 +153,4 @@ class InventoryAgent:
             "quantity": quantity,
             "unit_cost": unit_cost,
         }
-        return self._summarise(f"New purchase order created: {raw_resp}", query)
+        return await self._summarise(f"New purchase order created: {dumps(raw_resp)}", query)
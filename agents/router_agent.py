@@ -10,14 +10,154 @@ also records conversations, messages and tool invocations in the database.
 
 from __future__ import annotations
 
-import json
-from typing import Dict, Optional
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import database
-from llm import call_gemini, LLMError
+from llm import acall_gemini, acall_gemini_json, for_conversation, stream_to, LLMError
+from tools.audit_logger import tool_call_logger
+from tools.fast_json import dumps
+from tools.micro_batcher import MicroBatcher
 from tools.sql_tool import SQLTool
 
 
+_DOMAINS = frozenset({"sales", "finance", "inventory", "analytics"})
+_DOMAIN_RE = re.compile(r"\b(sales|finance|inventory|analytics)\b", re.IGNORECASE)
+
+_CLASSIFIER_PROMPT = (
+    "You are a domain classifier for a modular ERP system.  "
+    "Classify user requests into exactly one of these domains:\n"
+    "- Sales: customer management, leads, orders, products, CRM activities\n"
+    "- Finance: invoices, payments, accounting, billing\n"
+    "- Inventory: stock levels, suppliers, purchase orders, warehouse management\n"
+    "- Analytics: reports, revenue analysis, profit analysis, data insights, trends, statistics\n"
+)
+_SINGLE_CLASSIFIER_PROMPT = (
+    f"{_CLASSIFIER_PROMPT}"
+    "Respond with exactly one domain name: Sales, Finance, Inventory, or Analytics.\n\n"
+    "User request: "
+)
+
+# Structured-output schemas that restrict the classifier to the domain names
+_DOMAIN_ENUM = {"type": "string", "enum": ["Sales", "Finance", "Inventory", "Analytics"]}
+_DOMAIN_SCHEMA = {
+    "type": "object",
+    "properties": {"domain": _DOMAIN_ENUM},
+    "required": ["domain"],
+}
+_BATCH_DOMAIN_SCHEMA = {
+    "type": "object",
+    "properties": {"domains": {"type": "array", "items": _DOMAIN_ENUM}},
+    "required": ["domains"],
+}
+
+# Vocabulary for the local first-pass classifier.  A query is routed without
+# the LLM only when it clearly belongs to one domain (see `_keyword_domain`).
+DOMAIN_KEYWORDS = {
+    "sales": {
+        "sale", "sales", "lead", "leads", "customer", "customers", "order", "orders",
+        "product", "products", "crm", "deal", "deals", "quote", "quotes",
+        "prospect", "prospects", "contact", "contacts",
+    },
+    "finance": {
+        "finance", "financial", "invoice", "invoices", "invoicing", "payment", "payments",
+        "refund", "refunds", "billing", "bill", "bills", "accounting", "ledger",
+        "tax", "receivable", "receivables", "payable", "payables", "overdue",
+    },
+    "inventory": {
+        "inventory", "stock", "stocks", "supplier", "suppliers", "purchase", "po",
+        "warehouse", "warehouses", "reorder", "restock", "sku", "skus", "shipment",
+        "shipments",
+    },
+    "analytics": {
+        "analytics", "analysis", "report", "reports", "revenue", "profit", "profits",
+        "trend", "trends", "statistics", "stats", "insights", "kpi", "kpis",
+        "margin", "growth", "dashboard", "chart",
+    },
+}
+# Words common in questions for other domains too ("average order value",
+# "customer lifetime value" are analytics); they never route on their own
+_SHARED_KEYWORDS = frozenset({
+    "sale", "sales", "customer", "customers", "order", "orders",
+    "product", "products", "purchase",
+})
+_DISTINCT_KEYWORDS = {domain: keywords - _SHARED_KEYWORDS for domain, keywords in DOMAIN_KEYWORDS.items()}
+_KEYWORD_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def _keyword_domain(query: str) -> Optional[str]:
+    """Return the domain for clear-cut queries, or None if the LLM should decide.
+
+    Each domain scores the number of its keywords in the query, leaving out
+    `_SHARED_KEYWORDS`.  The best domain wins if it is the only one with any
+    match ("invoice 123", "low stock") or leads the runner-up by at least
+    two matches.
+    """
+    tokens = set(_KEYWORD_TOKEN_RE.findall(query.lower()))
+    scores = sorted(
+        ((len(tokens & keywords), domain) for domain, keywords in _DISTINCT_KEYWORDS.items()),
+        reverse=True,
+    )
+    (best, domain), (runner_up, _) = scores[0], scores[1]
+    if best - runner_up >= 2 or (best and not runner_up):
+        return domain
+    return None
+
+
+# With ROUTER_FAST_PATH enabled, queries the LLM must classify are classified
+# and answered in one call; the answer is used directly when it needs no
+# company data and the chosen agent sets SUPPORTS_PASSTHROUGH.
+FAST_PATH = os.environ.get("ROUTER_FAST_PATH", "").lower() in {"1", "true", "yes"}
+
+_COMBINED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "domain": {"type": "string", "enum": sorted(_DOMAINS)},
+        "needs_data": {"type": "boolean"},
+        "response": {"type": "string"},
+    },
+    "required": ["domain", "needs_data", "response"],
+}
+_COMBINED_PROMPT = (
+    f"{_CLASSIFIER_PROMPT}"
+    "Return a JSON object with the request's \"domain\" (sales, finance, inventory "
+    "or analytics), \"needs_data\": true if answering requires the company's "
+    "records, documents or policies and false otherwise, and \"response\": a "
+    "concise answer using only general knowledge (empty if needs_data is true)."
+    "\n\nUser request: "
+)
+
+# Router writes, kept constant so the connection's statement cache reuses them
+_SQL_INSERT_CONVERSATION = "INSERT INTO conversations (user_id, started_at) VALUES (?, ?)"
+_SQL_INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, sender, content, created_at) "
+    "VALUES (?, ?, ?, ?)"
+)
+
+# Number of normalised queries whose domain is remembered
+_CLASSIFY_CACHE_SIZE = 4096
+
+# Batches whose requests exceed this many characters are classified one by
+# one so that the prompt stays well inside the model's context window.
+_MAX_BATCH_CHARS = 6000
+
+
+def _parse_domain(response: str) -> str:
+    """Return the lowercase domain named in `response`.
+
+    The first domain name found wins, so replies such as "Domain: Sales." are
+    accepted as well as a bare "Sales".
+    """
+    match = _DOMAIN_RE.search(response)
+    if not match:
+        raise ValueError(f"Unexpected domain classification: {response}")
+    return match.group(1).lower()
+
+
 class RouterAgent:
     """Entry point for handling conversational queries."""
 
@@ -26,117 +166,324 @@ class RouterAgent:
         self.agents = agents
         # Tools used by the router to log calls and approvals
         self.router_sql = SQLTool("router")
+        self._classifier = MicroBatcher(self._classify_batch, max_batch=16, max_wait=0.02)
+        # normalised query -> domain, least recently used first
+        self._classify_cache: OrderedDict[str, str] = OrderedDict()
 
-    def _create_conversation(self, user_id: int) -> int:
+    def _create_conversation(self, user_id: int, started_at: Optional[str] = None) -> int:
         """Create a new conversation row and return its ID."""
-        sql = "INSERT INTO conversations (user_id, started_at) VALUES (?, datetime('now'))"
-        return self.router_sql.write(sql, (user_id,))
-
-    def _add_message(self, conversation_id: int, sender: str, content: str) -> int:
-        """Insert a message into the messages table and return its ID."""
-        sql = (
-            "INSERT INTO messages (conversation_id, sender, content, created_at) "
-            "VALUES (?, ?, ?, datetime('now'))"
+        return self.router_sql.write(_SQL_INSERT_CONVERSATION, (user_id, started_at or database.utc_now()))
+
+    def _add_message(
+        self,
+        conversation_id: int,
+        sender: str,
+        content: str,
+        created_at: Optional[str] = None,
+    ) -> int:
+        """Insert a message into the messages table and return its ID.
+
+        Pass `created_at` to record a time other than now.  Inside
+        `router_sql.transaction()` the insert joins the open transaction.
+        """
+        return self.router_sql.write(
+            _SQL_INSERT_MESSAGE, (conversation_id, sender, content, created_at or database.utc_now())
         )
-        return self.router_sql.write(sql, (conversation_id, sender, content))
 
-    def _log_tool_call(self, agent: str, tool_name: str, input_json: Dict, output_json: Dict) -> int:
-        """Record a tool invocation in the tool_calls table."""
-        sql = (
-            "INSERT INTO tool_calls (agent, tool_name, input_json, output_json, created_at) "
-            "VALUES (?, ?, ?, ?, datetime('now'))"
+    def _log_tool_call(
+        self,
+        agent: str,
+        tool_name: str,
+        input_json: Dict,
+        output_json: Dict,
+        created_at: Optional[str] = None,
+    ) -> None:
+        """Record a tool invocation in the tool_calls table.
+
+        The row is written in the background by `tool_call_logger`, so its
+        timestamp is fixed when the call is logged rather than when written.
+        """
+        tool_call_logger.log(
+            agent,
+            tool_name,
+            dumps(input_json),
+            dumps(output_json),
+            created_at or database.utc_now(),
         )
-        return self.router_sql.write(
-            sql,
-            (
-                agent,
-                tool_name,
-                json.dumps(input_json, default=str),
-                json.dumps(output_json, default=str),
-            ),
+
+    def _record_turn(
+        self,
+        conversation_id: int,
+        query: str,
+        received_at: str,
+        agent: str,
+        tool_name: str,
+        output_json: Dict,
+        reply: Optional[str] = None,
+    ) -> None:
+        """Write the user message and the agent reply in one transaction and log the call.
+
+        The texts are stored once, in `messages`; the tool call refers to
+        them by message ID and only records their lengths.  The reply and
+        the tool call share one timestamp taken when the turn finished; the
+        user message keeps `received_at`.
+        """
+        finished_at = database.utc_now()
+        with self.router_sql.transaction():
+            query_id = self._add_message(conversation_id, "user", query, created_at=received_at)
+            if reply is not None:
+                reply_id = self._add_message(conversation_id, agent, reply, created_at=finished_at)
+                output_json = {"message_id": reply_id, "response_len": len(reply), **output_json}
+        self._log_tool_call(
+            agent,
+            tool_name,
+            {"message_id": query_id, "query_len": len(query)},
+            output_json,
+            created_at=finished_at,
         )
 
-    def classify_domain(self, query: str) -> str:
+    async def classify_domain(self, query: str) -> str:
         """Call the LLM to classify the user's query into a domain.
 
-        This method uses a simple prompt to instruct the model to respond with
-        one of the recognised domain names: "Sales", "Finance", "Inventory",
-        or "Analytics".  It returns the lowercase domain string.  Any
-        unexpected response will result in a `ValueError`.
+        The model is asked to respond with one of the recognised domain
+        names: "Sales", "Finance", "Inventory", or "Analytics".  It returns
+        the lowercase domain string.  Any unexpected response will result in
+        a `ValueError`.
+
+        Clear-cut queries are routed by keyword without calling the LLM.
+        Queries from chats that arrive within a few milliseconds of each
+        other are classified together in a single LLM request, and recent
+        classifications are reused for repeated queries.
+        """
+        domain, _, _ = await self._classify(query)
+        return domain
+
+    async def _classify(self, query: str, allow_answer: bool = False) -> Tuple[str, str, Optional[str]]:
+        """Return `(domain, source, answer)`.
+
+        `source` is "keywords", "cache", "llm" or "combined".  `answer` is a
+        ready reply from :meth:`classify_and_answer` when `allow_answer` is set,
+        the fast path is enabled and the reply can be used as is; else None.
+        """
+        domain = _keyword_domain(query)
+        if domain is not None:
+            return domain, "keywords", None
+        key = " ".join(query.lower().split())[:256]
+        domain = self._classify_cache.get(key)
+        if domain is not None:
+            self._classify_cache.move_to_end(key)
+            return domain, "cache", None
+        answer = None
+        source = "llm"
+        combined = await self.classify_and_answer(query) if allow_answer and FAST_PATH else None
+        if combined is not None:
+            domain = combined["domain"]
+            source = "combined"
+            agent = self.agents.get(domain)
+            if not combined["needs_data"] and combined["response"] and getattr(agent, "SUPPORTS_PASSTHROUGH", False):
+                answer = combined["response"]
+        else:
+            domain = await self._classifier.submit(query)
+        # Only validated domains reach this point, so they are safe to reuse
+        self._classify_cache[key] = domain
+        if len(self._classify_cache) > _CLASSIFY_CACHE_SIZE:
+            self._classify_cache.popitem(last=False)
+        return domain, source, answer
+
+    async def classify_and_answer(self, query: str) -> Optional[Dict[str, Any]]:
+        """Classify `query` and draft a general-knowledge answer in one LLM call.
+
+        Returns `{"domain", "needs_data", "response"}`, or None if the model
+        does not return a usable object.
         """
-        system_prompt = (
-            "You are a domain classifier for a modular ERP system.  "
-            "Classify user requests into exactly one of these domains:\n"
-            "- Sales: customer management, leads, orders, products, CRM activities\n"
-            "- Finance: invoices, payments, accounting, billing\n"
-            "- Inventory: stock levels, suppliers, purchase orders, warehouse management\n"
-            "- Analytics: reports, revenue analysis, profit analysis, data insights, trends, statistics\n"
-            "Respond with exactly one domain name: Sales, Finance, Inventory, or Analytics."
-        )
-        messages = [
-            {"role": "user", "parts": [{"text": f"{system_prompt}\n\nUser request: {query}"}]},
-        ]
         try:
-            response = call_gemini(messages)
+            data = await acall_gemini_json(_COMBINED_PROMPT + query, _COMBINED_SCHEMA, "route")
         except LLMError as e:
-            raise
-        # Normalise the response: take the first word, strip punctuation and whitespace
-        domain_raw = response.strip().split()[0]
-        # Remove punctuation and convert to lowercase
-        import string
-        domain = domain_raw.lower().strip(string.punctuation)
-        if domain not in {"sales", "finance", "inventory", "analytics"}:
-            raise ValueError(f"Unexpected domain classification: {response}")
-        return domain
+            print(f"Warning: Combined classification failed: {e}")
+            return None
+        domain = str(data.get("domain", "")).lower()
+        if domain not in _DOMAINS:
+            return None
+        return {
+            "domain": domain,
+            "needs_data": bool(data.get("needs_data", True)),
+            "response": str(data.get("response") or "").strip(),
+        }
+
+    async def _classify_one(self, query: str) -> str:
+        """Classify one query, constraining the reply to a domain name.
+
+        Models without structured-output support fall back to a free-text
+        reply that is searched for a domain name.
+        """
+        prompt = _SINGLE_CLASSIFIER_PROMPT + query
+        try:
+            data = await acall_gemini_json(prompt, _DOMAIN_SCHEMA, "domain")
+            domain = str(data.get("domain", "")).lower()
+            if domain in _DOMAINS:
+                return domain
+        except LLMError:
+            pass
+        messages = [{"role": "user", "parts": [{"text": prompt}]}]
+        return _parse_domain(await acall_gemini(messages))
+
+    async def _classify_batch(self, queries: List[str]) -> List[Any]:
+        """Classify several queries with one LLM call.
 
-    def handle_chat(self, query: str, conversation_id: Optional[int] = None, user_id: int = 1) -> Dict[str, str]:
+        The reply is a JSON list of domain names, one per query in order.
+        Queries without a valid label in the reply (or all of them, if the
+        reply is unusable) are classified individually.  Returns a domain or
+        an exception for each query.
+        """
+        if len(queries) == 1 or sum(len(q) for q in queries) > _MAX_BATCH_CHARS:
+            return await asyncio.gather(*(self._classify_one(q) for q in queries), return_exceptions=True)
+        numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1))
+        prompt = (
+            f"{_CLASSIFIER_PROMPT}"
+            f"Classify each of the following {len(queries)} user requests.  Return a JSON "
+            f"object whose \"domains\" list has exactly {len(queries)} entries, the domain "
+            "of each request in order."
+            f"\n\nUser requests:\n{numbered}"
+        )
+        try:
+            data = await acall_gemini_json(prompt, _BATCH_DOMAIN_SCHEMA, "domains")
+            labels = [str(label).lower() for label in data.get("domains") or []]
+        except LLMError:
+            labels = []
+        if len(labels) != len(queries):
+            labels = []
+        results: List[Any] = []
+        retry = []
+        for i, query in enumerate(queries):
+            label = labels[i] if labels else None
+            if label in _DOMAINS:
+                results.append(label)
+            else:
+                results.append(None)
+                retry.append(i)
+        if retry:
+            retried = await asyncio.gather(
+                *(self._classify_one(queries[i]) for i in retry), return_exceptions=True
+            )
+            for i, result in zip(retry, retried):
+                results[i] = result
+        return results
+
+    async def handle_chat(self, query: str, conversation_id: Optional[int] = None, user_id: int = 1) -> Dict[str, str]:
         """Process a user message.
 
         Inserts the message into the conversation history, determines the domain
         using the LLM, delegates handling to the domain agent and records the
         response.  Returns a dictionary with the conversation ID and the agent's
         textual response.
+
+        The user message, the reply and the tool call are written together in
+        a single transaction once the turn is complete (or has failed), so a
+        chat turn pays for one commit instead of one per row.  Blocking
+        database and LLM calls are executed on worker threads.
         """
+        # The conversation and the user message are stamped with the arrival time
+        received_at = database.utc_now()
+        started = time.perf_counter()
         # Ensure we have a conversation
         if conversation_id is None:
-            conversation_id = self._create_conversation(user_id)
-        # Record the user message
-        self._add_message(conversation_id, sender="user", content=query)
+            conversation_id = await asyncio.to_thread(self._create_conversation, user_id, received_at)
         # Determine which agent should handle the request
-        domain: str
         try:
-            domain = self.classify_domain(query)
+            domain, classified_by, answer = await self._classify(query, allow_answer=True)
         except Exception as e:
             # Record error as tool call
-            self._log_tool_call(
+            await asyncio.to_thread(
+                self._record_turn,
+                conversation_id,
+                query,
+                received_at,
                 "router",
                 "classify_domain",
-                {"query": query},
                 {"error": str(e)},
             )
             raise
         agent = self.agents.get(domain)
         if agent is None:
-            raise RuntimeError(f"No agent registered for domain '{domain}'")
-        # Delegate to the agent
+            error = f"No agent registered for domain '{domain}'"
+            await asyncio.to_thread(
+                self._record_turn,
+                conversation_id,
+                query,
+                received_at,
+                "router",
+                "classify_domain",
+                {"error": error},
+            )
+            raise RuntimeError(error)
+        # Delegate to the agent unless the classifier already answered
+        path = "agent" if answer is None else "fast"
         try:
-            response_text = agent.handle_query(query, conversation_id)
+            if answer is not None:
+                response_text = answer
+            else:
+                with for_conversation(conversation_id):
+                    response_text = await agent.handle_query(query, conversation_id)
         except Exception as e:
             # Log any agent error
-            self._log_tool_call(
+            await asyncio.to_thread(
+                self._record_turn,
+                conversation_id,
+                query,
+                received_at,
                 domain,
                 "handle_query",
-                {"query": query},
-                {"error": str(e)},
+                {"error": str(e), "classified_by": classified_by, "path": path},
             )
             raise
-        # Record the agent's reply as a message
-        self._add_message(conversation_id, sender=domain, content=response_text)
-        # Log the call
-        self._log_tool_call(
+        # Record the user message, the agent's reply and the call
+        await asyncio.to_thread(
+            self._record_turn,
+            conversation_id,
+            query,
+            received_at,
             domain,
             "handle_query",
-            {"query": query},
-            {"response": response_text},
+            {
+                "ok": True,
+                "classified_by": classified_by,
+                "path": path,
+                "latency_ms": round((time.perf_counter() - started) * 1000),
+            },
+            response_text,
         )
         return {"conversation_id": conversation_id, "response": response_text}
+
+    async def handle_chat_stream(
+        self, query: str, conversation_id: Optional[int] = None, user_id: int = 1
+    ) -> AsyncIterator[str]:
+        """Process a user message like :meth:`handle_chat`, yielding the reply in chunks.
+
+        LLM summaries are forwarded as they are generated.  Replies that do
+        not involve a streamed LLM call (templated listings, cached answers,
+        confirmations) are yielded as a single chunk once complete.  The
+        conversation is recorded exactly as in :meth:`handle_chat`.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with stream_to(queue.put_nowait):
+            # The task copies the current context, so the sink stays active inside it
+            task = asyncio.create_task(self.handle_chat(query, conversation_id, user_id))
+        streamed = False
+        try:
+            while not task.done():
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    streamed = True
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            while not queue.empty():
+                streamed = True
+                yield queue.get_nowait()
+            result = task.result()
+            if not streamed:
+                yield result["response"]
+        finally:
+            if not task.done():
+                task.cancel()
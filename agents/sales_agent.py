@@ -13,67 +13,186 @@ replace these heuristics with additional LLM calls if desired.
 
 from __future__ import annotations
 
+import asyncio
+from functools import cached_property
 import random
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, Iterable, List, Optional
 
-from llm import call_gemini_prompt, LLMError
+import numpy as np
+
+import database
+from llm import acall_gemini_prompt, call_gemini_json, call_gemini_prompt, LLMError
 from tools.sql_tool import SQLTool
-from tools.vector_rag_tool import VectorRAGTool, SalesRAGTool
+from tools.fast_json import dumps, extract_json
+from tools.semantic_cache import SemanticCache
+from tools.vector_rag_tool import VectorRAGTool
+from tools.rag_registry import get_rag
 from tools.ml_tools import LeadScoringTool
-from tools.audit_logger import audit_agent_method
-from tools.memory_manager import EntityMemory
+from tools.reranker import rerank
+from tools.row_stats import summarise_rows
+
+
+# Complete replies to read-only sales queries.  Entries are tied to the write
+# generations of the tables the pipeline reads, so any change to that data
+# makes them unreachable.
+sales_response_cache = SemanticCache(threshold=0.93, ttl_seconds=10 * 60)
+_CACHED_TABLES = (
+    "customers", "leads", "orders", "order_items", "products", "tickets",
+    "invoices", "payments", "documents",
+)
+# Queries that may create records are never answered from the cache
+_WRITE_HINT_RE = re.compile(r"\b(create|new|add|open|submit|register|place|raise|log)\b", re.IGNORECASE)
+_CREATION_ACTIONS = ("new_lead", "new_order", "support_ticket")
+# Literals that select different records: numbers, emails, quoted strings and
+# capitalised names after the first word.  They are part of the cache
+# context, so "orders for customer 12" never reuses the reply for customer 13.
+_LITERAL_RE = re.compile(r"\d+(?:\.\d+)?|[\w.+-]+@[\w.-]+|\"[^\"]*\"|'[^']*'|(?<=\s)[A-Z][\w&-]*")
+
+# Used when the LLM cannot generate SQL for a retrieval action
+_SQL_FALLBACK_BY_ACTION = {
+    "retrieve_orders": "SELECT o.id, c.name AS customer_name, o.total, o.status, o.created_at FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 20",
+    "retrieve_customers": "SELECT id, name, email, phone, created_at FROM customers ORDER BY created_at DESC LIMIT 20",
+    "retrieve_products": "SELECT id, name, price, description FROM products ORDER BY price DESC LIMIT 20",
+    "retrieve_leads": "SELECT id, customer_name, contact_email, score, status, created_at FROM leads ORDER BY created_at DESC LIMIT 20",
+}
+_SQL_ORDERS_SELECT = (
+    "SELECT o.id, c.name AS customer_name, o.total, o.status, o.created_at "
+    "FROM orders o JOIN customers c ON o.customer_id = c.id "
+)
+_SQL_CUSTOMERS_SELECT = "SELECT id, name, email, phone, created_at FROM customers "
+_SQL_PRODUCTS_SELECT = "SELECT id, name, price, description FROM products "
+_SQL_LEADS_SELECT = "SELECT id, customer_name, contact_email, score, status, created_at FROM leads "
+# Ready-made SQL for retrievals whose only constraints are these common
+# filters, keyed by (action type, filters).  Limits follow the SQL prompt's
+# rules ("recent"/"top" = 10, default = 20).
+SQL_TEMPLATES = {
+    ("retrieve_orders", frozenset()): _SQL_FALLBACK_BY_ACTION["retrieve_orders"],
+    ("retrieve_orders", frozenset({"recent"})): _SQL_ORDERS_SELECT + "ORDER BY o.created_at DESC LIMIT 10",
+    ("retrieve_orders", frozenset({"cancelled"})): _SQL_ORDERS_SELECT + "WHERE o.status = 'cancelled' ORDER BY o.created_at DESC LIMIT 20",
+    ("retrieve_orders", frozenset({"cancelled", "recent"})): _SQL_ORDERS_SELECT + "WHERE o.status = 'cancelled' ORDER BY o.created_at DESC LIMIT 10",
+    ("retrieve_orders", frozenset({"high_value"})): _SQL_ORDERS_SELECT + "ORDER BY o.total DESC LIMIT 10",
+    ("retrieve_customers", frozenset()): _SQL_FALLBACK_BY_ACTION["retrieve_customers"],
+    ("retrieve_customers", frozenset({"recent"})): _SQL_CUSTOMERS_SELECT + "ORDER BY created_at DESC LIMIT 10",
+    ("retrieve_products", frozenset()): _SQL_FALLBACK_BY_ACTION["retrieve_products"],
+    ("retrieve_products", frozenset({"high_value"})): _SQL_PRODUCTS_SELECT + "ORDER BY price DESC LIMIT 10",
+    ("retrieve_leads", frozenset()): _SQL_FALLBACK_BY_ACTION["retrieve_leads"],
+    ("retrieve_leads", frozenset({"recent"})): _SQL_LEADS_SELECT + "ORDER BY created_at DESC LIMIT 10",
+    ("retrieve_leads", frozenset({"high_value"})): _SQL_LEADS_SELECT + "ORDER BY score DESC LIMIT 10",
+}
+# Query words that select a template filter
+_TEMPLATE_FILTER_WORDS = {
+    "recent": "recent", "latest": "recent", "newest": "recent",
+    "cancelled": "cancelled", "canceled": "cancelled",
+    "top": "high_value", "best": "high_value", "biggest": "high_value",
+    "largest": "high_value", "high": "high_value", "value": "high_value",
+}
+# Templates are only used when every other word of the query is generic, so
+# that names, counts, dates and other specifics still go to the LLM
+_GENERIC_QUERY_WORDS = frozenset(
+    "show me list get give display view see find what which are is the our my of "
+    "order orders customer customers client clients product products item items "
+    "lead leads sales please can you could i want to".split()
+)
+_QUERY_WORD_RE = re.compile(r"[a-z_]+|\d+")
+
+_SQL_INSERT_LEAD = (
+    "INSERT INTO leads (customer_name, contact_email, message, score, status, created_at) "
+    "VALUES (?, ?, ?, ?, 'new', datetime('now'))"
+)
+_SQL_INSERT_LEAD_AT = (
+    "INSERT INTO leads (customer_name, contact_email, message, score, status, created_at) "
+    "VALUES (?, ?, ?, ?, 'new', ?)"
+)
+# Pick one row at random via a rowid probe instead of loading the whole table
+_SQL_RANDOM_CUSTOMER = (
+    "SELECT id FROM customers "
+    "WHERE rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM customers) "
+    "ORDER BY rowid LIMIT 1"
+)
+_SQL_RANDOM_PRODUCT = (
+    "SELECT id, price FROM products "
+    "WHERE rowid >= (SELECT abs(random()) % max(rowid) + 1 FROM products) "
+    "ORDER BY rowid LIMIT 1"
+)
+
+_ACTION_TYPES = (
+    "new_lead", "new_order", "support_ticket", "retrieve_customers", "retrieve_orders",
+    "retrieve_leads", "retrieve_products", "rag_query", "other",
+)
+# Intent and, for retrievals, the SQL to run, produced by one LLM call
+_INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action_type": {"type": "string", "enum": list(_ACTION_TYPES)},
+        "filters": {"type": "array", "items": {"type": "string"}},
+        "context": {"type": "string"},
+        "sql": {"type": "string"},
+    },
+    "required": ["action_type", "filters", "context", "sql"],
+}
+# A reply wrapped in a Markdown code fence; the closing fence may be missing
+_FENCE_RE = re.compile(r"^```(?:[\w-]*\n)?\s*(.*?)\s*(?:```)?$", re.S)
+# Model-written SQL is only run when it is a single SELECT statement
+_SELECT_RE = re.compile(r"^\s*select\b[^;]*;?\s*$", re.IGNORECASE | re.DOTALL)
+
+_SALES_SCHEMA_INFO = """
+        Available tables and columns:
+        - customers: id, name, email, phone, created_at
+        - orders: id, customer_id, total, status, created_at (JOIN with customers for customer_name)
+        - order_items: id, order_id, product_id, quantity, price
+        - products: id, sku, name, price, description
+        - leads: id, customer_name, contact_email, message, score, status, created_at
+        - tickets: id, customer_id, subject, message, status, priority, created_at
+        """
+_SQL_RULES = """Requirements:
+- Select appropriate columns for the action type
+- Use JOINs when needed (especially orders with customers)
+- Apply filters based on user intent (cancelled, recent, high_value, etc.)
+- Sort by most relevant field
+- Use ONLY SQLite-compatible syntax
+- For LIMIT values, use only integer numbers, not expressions
+- For "recent" or "latest" queries: Simply ORDER BY created_at DESC with LIMIT - do NOT use date filters
+- Only use date filters when user specifically mentions timeframes like "last week", "this month", etc.
+- Use appropriate LIMIT based on the request:
+  * "all" or "every" = no LIMIT
+  * "recent" or "latest" = LIMIT 10
+  * "top" or "best" = LIMIT 10
+  * "show me" = LIMIT 20
+  * specific count mentioned = use that exact number
+  * default = LIMIT 20"""
 
+# The static instructions below are sent as system messages and the
+# per-request values as the user message, so every call shares the same
+# prompt prefix and LM Studio can reuse its cached evaluation.
+_INTENT_AND_SQL_SYSTEM = """
+You are a Sales & CRM agent. Analyze the user query, determine the action needed
+and, for data retrieval, write the SQLite query that answers it.
 
-class SalesAgent:
-    def __init__(self) -> None:
-        self.sql = SQLTool("sales")
-        self.rag = VectorRAGTool("main_documents")  # General RAG
-        
-        # Domain-specific RAG tools as per requirements
-        try:
-            self.sales_rag = SalesRAGTool()
-        except Exception as e:
-            print(f"Warning: Could not initialize SalesRAGTool: {e}")
-            self.sales_rag = None
+You handle: customers, leads, orders, support tickets, products
 
-    def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
-        """Intelligently interpret and respond to user queries within the Sales domain.
+Classify the query into one of these action types:
+1. "new_lead" - creating a new sales lead
+2. "new_order" - creating a new order
+3. "support_ticket" - handling customer support
+4. "retrieve_customers" - getting customer information
+5. "retrieve_orders" - getting order information
+6. "retrieve_leads" - getting lead information
+7. "retrieve_products" - getting product information
+8. "rag_query" - asking about procedures, policies, guidelines, definitions, "how to", "what is", "what are"
+9. "other" - anything else
 
-        This method uses the LLM to understand the user's intent, generates appropriate
-        SQL queries, executes them, and provides intelligent analysis of the results.
-        """
-        try:
-            # Step 1: Understand what the user wants
-            intent = self._analyze_intent(query)
-            
-            # Step 2: Execute the appropriate action based on LLM classification
-            action_type = intent.get("action_type", "other")
-            
-            if action_type.startswith("retrieve_"):
-                return self._handle_retrieval_action(action_type, intent, query)
-            elif action_type in ["new_lead", "new_order", "support_ticket"]:
-                return self._handle_creation_action(action_type, intent, query)
-            elif action_type == "rag_query":
-                # Handle RAG queries for procedures, policies, definitions
-                return self._handle_rag_query(query)
-            else:
-                # Fallback: attempt RAG search on documents
-                rag_results = self.rag.search(query)
-                if rag_results:
-                    return self._summarise(
-                        f"RAG search results for '{query}': {rag_results}", query
-                    )
-                return "I'm sorry, I couldn't understand your sales request."
-        except Exception:
-            # Re-raise so the router can log the error
-            raise
+Also determine any specific filters or conditions mentioned (e.g. "cancelled", "recent", "high_value").
+{schema_info}
+For the retrieve_* action types, set "sql" to a single read-only SELECT statement.
+{sql_rules}
+For every other action type, set "sql" to an empty string.
 
-    def _analyze_intent(self, query: str) -> dict:
-        """Use LLM to understand user intent and classify the type of action needed."""
-        prompt = f"""
-You are a Sales & CRM agent. Analyze this user query and determine the action needed.
+Example SQL: SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 10
+""".format(schema_info=_SALES_SCHEMA_INFO, sql_rules=_SQL_RULES)
 
-Query: "{query}"
+_INTENT_SYSTEM = """
+You are a Sales & CRM agent. Analyze the user query and determine the action needed.
 
 You handle: customers, leads, orders, support tickets, products
 
@@ -97,24 +216,246 @@ Key indicators for rag_query:
 Also determine any specific filters or conditions mentioned.
 
 Respond with ONLY a JSON object:
-{{
+{
     "action_type": "new_lead|new_order|support_ticket|retrieve_customers|retrieve_orders|retrieve_leads|retrieve_products|rag_query|other",
     "filters": ["cancelled", "recent", "high_value", etc.],
     "context": "brief description of what user wants"
+}
+"""
+
+_SQL_SYSTEM = f"""
+You are a Sales & CRM agent generating SQL queries for a SQLite database.
+The request, action type, filters and context are given in the user message.
+
+{_SALES_SCHEMA_INFO}
+
+Generate a SQL query to fulfill the request. {_SQL_RULES}
+
+Important: Respond with ONLY a valid SQL query, no backticks, no explanation, no formatting.
+Example formats:
+- Recent orders: SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 10
+- Show orders: SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 20
+"""
+
+
+_ANALYSIS_PROMPT = """
+You are a Sales & CRM expert analyzing data for a business user.
+
+User query: "{query}"
+Action performed: {action_type}
+Data found: {count} records
+{aggregates}Sample data (columnar: "cols" lists the column names, each entry of "rows" is one record in that order): {sample}
+{rag_context}
+
+Provide a professional response that:
+1. Directly answers their question
+2. Summarizes key findings from the data
+3. Highlights important business insights
+4. Mentions any notable patterns or trends
+5. Uses appropriate sales/CRM terminology
+6. Incorporates relevant context from procedures when available
+
+Be conversational, helpful, and business-focused.
+"""
+
+_LEAD_EXTRACTION_PROMPT = """
+Extract lead information from this request:
+"{query}"
+{rag_context}
+
+Carefully extract the specific details mentioned:
+- Look for person names (first name + last name)
+- Look for company names (often "at [Company]" or "[Company] Inc/LLC/Ltd")
+- Look for email addresses (format: name@domain.com) - these are often after "email" or contain @
+- Extract any message or description
+
+Pay special attention to email addresses - they are critical for lead creation.
+
+If specific details are provided, extract them exactly. If not provided, use reasonable defaults.
+Consider the lead scoring criteria from procedures when available.
+
+IMPORTANT: Respond with ONLY valid JSON, no explanations or markdown formatting.
+
+JSON format:
+{{
+    "customer_name": "extracted full name (first last) or Company Name",
+    "contact_email": "extracted email or reasonable default", 
+    "message": "extracted message or description of the lead request",
+    "score": 0.5
+}}
+
+Examples:
+- "John Smith at TechCorp" -> customer_name: "John Smith", contact_email: "john.smith@techcorp.com"
+- "Create lead for Jane Doe, email jane@example.com" -> customer_name: "Jane Doe", contact_email: "jane@example.com"
+- "John Smith at TechCorp, email john@techcorp.com" -> customer_name: "John Smith", contact_email: "john@techcorp.com"
+"""
+
+_TICKET_EXTRACTION_PROMPT = """
+Extract support ticket information from: "{query}"
+
+Create JSON with:
+{{
+    "subject": "brief subject line",
+    "message": "detailed message",
+    "priority": "low|medium|high"
 }}
 """
-        
+
+_SUMMARY_PROMPT = (
+    "You are an assistant summarising sales data for a user.  "
+    "Given the following raw information and the user's query, "
+    "compose a concise and friendly reply.  Tabular data is columnar: "
+    "\"cols\" lists the column names and each entry of \"rows\" is one record.\n\n"
+)
+
+
+def _rows_to_columnar(rows: List[Any]) -> Dict[str, Any]:
+    """Rows as `{"cols": [...], "rows": [[...], ...]}`, without all-NULL columns.
+
+    Column names appear once instead of in every record, which keeps row
+    data in prompts short.
+    """
+    records = [dict(row) for row in rows]
+    cols = [c for c in (records[0] if records else {}) if any(r.get(c) is not None for r in records)]
+    return {"cols": cols, "rows": [[r.get(c) for c in cols] for r in records]}
+
+
+def _rows_to_prompt(rows: List[Any], max_rows: int = 10) -> str:
+    """Columnar JSON of the first `max_rows` rows, for use in a prompt."""
+    return dumps(_rows_to_columnar(rows[:max_rows]))
+
+
+def _strip_fence(text: str) -> str:
+    """Return `text` without a surrounding Markdown code fence."""
+    text = text.strip()
+    match = _FENCE_RE.match(text)
+    return match.group(1) if match else text
+
+
+def _clean_select(sql: Any) -> Optional[str]:
+    """Return `sql` without fences and trailing semicolon if it is one SELECT, else None."""
+    if not isinstance(sql, str):
+        return None
+    sql = _strip_fence(sql)
+    if not _SELECT_RE.match(sql):
+        return None
+    return sql.strip().rstrip(";").strip()
+
+
+class SalesAgent:
+    # General questions (definitions, how-tos) may be answered by the router's
+    # combined classify-and-answer call without running this agent
+    SUPPORTS_PASSTHROUGH = True
+
+    def __init__(self) -> None:
+        self.sql = SQLTool("sales")
+
+    @cached_property
+    def rag(self) -> VectorRAGTool:
+        """General RAG over all documents, shared with the other agents."""
+        return get_rag("main_documents")
+
+    @cached_property
+    def sales_rag(self) -> Optional[VectorRAGTool]:
+        """Domain-specific RAG tool as per requirements, loaded on first use."""
         try:
-            response = call_gemini_prompt(prompt)
-            # Clean up response and parse JSON
-            response = response.strip()
-            if response.startswith("```json"):
-                response = response[7:-3]
-            elif response.startswith("```"):
-                response = response[3:-3]
-            
-            import json
-            return json.loads(response)
+            return get_rag("sales_documents")
+        except Exception as e:
+            print(f"Warning: Could not initialize SalesRAGTool: {e}")
+            return None
+
+    async def handle_query(self, query: str, conversation_id: Optional[int] = None) -> str:
+        """Intelligently interpret and respond to user queries within the Sales domain.
+
+        This method uses the LLM to understand the user's intent, generates appropriate
+        SQL queries, executes them, and provides intelligent analysis of the results.
+        Blocking steps run on worker threads so the event loop stays
+        responsive.  Replies to read-only queries are cached semantically, so
+        a repeated or paraphrased question over unchanged data skips every
+        LLM call.
+        """
+        cacheable = not _WRITE_HINT_RE.search(query)
+        context = f"sales|{database.table_generations(_CACHED_TABLES)}|{_LITERAL_RE.findall(query)}"
+        if cacheable:
+            cached = await asyncio.to_thread(sales_response_cache.get, query, context)
+            if cached is not None:
+                return cached
+        # The procedures context is only used by retrievals but does not
+        # depend on the intent, so it is fetched while the intent is analysed
+        procedures = asyncio.create_task(self._fetch_procedures(query))
+        try:
+            # Step 1: Understand what the user wants
+            intent = await asyncio.to_thread(self._analyze_intent, query)
+            action_type = intent.get("action_type", "other")
+            if not action_type.startswith("retrieve_"):
+                procedures.cancel()
+            if action_type.startswith("retrieve_"):
+                response = await self._handle_retrieval_action(action_type, intent, query, procedures)
+            elif action_type == "rag_query":
+                # Handle RAG queries for procedures, policies, definitions
+                response = await self._handle_rag_query(query)
+            else:
+                response = await asyncio.to_thread(self._run_action, action_type, intent, query)
+        finally:
+            procedures.cancel()
+        if cacheable and action_type not in _CREATION_ACTIONS:
+            await asyncio.to_thread(sales_response_cache.put, query, response, context)
+        return response
+
+    async def _fetch_procedures(self, query: str) -> List[Dict[str, Any]]:
+        """Sales procedures relevant to `query`, or an empty list."""
+        try:
+            sales_rag = await asyncio.to_thread(getattr, self, "sales_rag")
+            if sales_rag:
+                return await sales_rag.asearch_procedures(query, k=2)
+        except Exception as e:
+            print(f"Warning: RAG search failed: {e}")
+        return []
+
+    def _run_action(self, action_type: str, intent: Dict[str, Any], query: str) -> str:
+        """Execute a non-retrieval action chosen by the LLM intent classification."""
+        try:
+            if action_type in _CREATION_ACTIONS:
+                return self._handle_creation_action(action_type, intent, query)
+            else:
+                # Fallback: attempt RAG search on documents
+                rag_results = rerank(query, self.rag.search(query, k=30), k=4)
+                if rag_results:
+                    return self._summarise(
+                        f"RAG search results for '{query}': {dumps(rag_results)}", query
+                    )
+                return "I'm sorry, I couldn't understand your sales request."
+        except Exception:
+            # Re-raise so the router can log the error
+            raise
+
+    def _analyze_intent(self, query: str) -> dict:
+        """Use LLM to understand user intent and classify the type of action needed.
+
+        One structured call returns the action type together with the SQL for
+        retrieval actions, so the retrieval path needs no separate SQL
+        generation call.  Models without structured-output support fall back
+        to the free-text prompt.
+        """
+        try:
+            data = call_gemini_json(f'Query: "{query}"', _INTENT_SCHEMA, "sales_intent", system=_INTENT_AND_SQL_SYSTEM)
+            if data.get("action_type") in _ACTION_TYPES:
+                filters = data.get("filters")
+                return {
+                    "action_type": data["action_type"],
+                    "filters": filters if isinstance(filters, list) else [],
+                    "context": str(data.get("context", "")),
+                    "sql": _clean_select(data.get("sql")),
+                }
+        except LLMError:
+            pass
+        return self._analyze_intent_text(query)
+
+    def _analyze_intent_text(self, query: str) -> dict:
+        """Free-text intent classification, without SQL."""
+        try:
+            response = call_gemini_prompt(f'Query: "{query}"', system=_INTENT_SYSTEM)
+            return extract_json(response)
         except Exception as e:
             # Fallback intent
             return {
@@ -123,137 +464,108 @@ Respond with ONLY a JSON object:
                 "context": "general query"
             }
 
-    def _handle_retrieval_action(self, action_type: str, intent: dict, original_query: str) -> str:
-        """Handle data retrieval actions by generating SQL and analyzing results."""
-        # Step 1: Generate SQL query using LLM
-        sql_query = self._generate_sql_for_action(action_type, intent, original_query)
+    async def _handle_retrieval_action(
+        self, action_type: str, intent: dict, original_query: str, procedures: "asyncio.Task"
+    ) -> str:
+        """Handle data retrieval actions by generating SQL and analyzing results.
+
+        `procedures` is the pending procedures search; it keeps running while
+        the SQL is generated and executed.
+        """
+        # Step 1: Use a ready-made query when one fits the request, else the
+        # SQL from intent analysis, else generate it using LLM
+        sql_query = (
+            self._template_sql(action_type, original_query)
+            or intent.get("sql")
+            or await asyncio.to_thread(self._generate_sql_for_action, action_type, intent, original_query)
+        )
         
         try:
             # Step 2: Execute the query
-            rows = self.sql.read(sql_query)
+            rows = await self.sql.aread(sql_query)
             
             # Step 3: Use LLM to analyze results and provide intelligent response
-            return self._analyze_results_and_respond(rows, action_type, original_query, intent)
+            return await self._analyze_results_and_respond(rows, action_type, original_query, intent, procedures)
         except Exception as e:
             return f"I encountered an error while retrieving the data: {str(e)}"
 
     def _generate_sql_for_action(self, action_type: str, intent: dict, original_query: str) -> str:
         """Generate SQL query using LLM understanding of the request."""
-        # Database schema information for the LLM
-        schema_info = """
-        Available tables and columns:
-        - customers: id, name, email, phone, created_at
-        - orders: id, customer_id, total, status, created_at (JOIN with customers for customer_name)
-        - order_items: id, order_id, product_id, quantity, price
-        - products: id, sku, name, price, description
-        - leads: id, customer_name, contact_email, message, score, status, created_at
-        - tickets: id, customer_id, subject, message, status, priority, created_at
-        """
-        
         prompt = f"""
-You are a Sales & CRM agent generating SQL queries for a SQLite database.
-
 User query: "{original_query}"
 Action type: {action_type}
 Filters mentioned: {intent.get("filters", [])}
 Context: {intent.get("context", "")}
-
-{schema_info}
-
-Generate a SQL query to fulfill this request. Requirements:
-- Select appropriate columns for the action type
-- Use JOINs when needed (especially orders with customers)
-- Apply filters based on user intent (cancelled, recent, high_value, etc.)
-- Sort by most relevant field
-- Use ONLY SQLite-compatible syntax
-- For LIMIT values, use only integer numbers, not expressions
-- For "recent" or "latest" queries: Simply ORDER BY created_at DESC with LIMIT - do NOT use date filters
-- Only use date filters when user specifically mentions timeframes like "last week", "this month", etc.
-- Use appropriate LIMIT based on the request:
-  * "all" or "every" = no LIMIT
-  * "recent" or "latest" = LIMIT 10
-  * "top" or "best" = LIMIT 10
-  * "show me" = LIMIT 20
-  * specific count mentioned = use that exact number
-  * default = LIMIT 20
-
-Important: Respond with ONLY a valid SQL query, no backticks, no explanation, no formatting.
-Example formats:
-- Recent orders: SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 10
-- Show orders: SELECT o.id, c.name FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 20
 """
         
         try:
-            sql_query = call_gemini_prompt(prompt).strip()
-            
-            # Clean up the response
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query[6:-3].strip()
-            elif sql_query.startswith("```"):
-                sql_query = sql_query[3:-3].strip()
-            return sql_query
+            sql_query = call_gemini_prompt(prompt, system=_SQL_SYSTEM)
+            return _strip_fence(sql_query)
         except Exception as e:
             # Fallback to basic query based on action type
-            fallback_queries = {
-                "retrieve_orders": "SELECT o.id, c.name AS customer_name, o.total, o.status, o.created_at FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.created_at DESC LIMIT 20",
-                "retrieve_customers": "SELECT id, name, email, phone, created_at FROM customers ORDER BY created_at DESC LIMIT 20",
-                "retrieve_products": "SELECT id, name, price, description FROM products ORDER BY price DESC LIMIT 20",
-                "retrieve_leads": "SELECT id, customer_name, contact_email, score, status, created_at FROM leads ORDER BY created_at DESC LIMIT 20"
-            }
-            return fallback_queries.get(action_type, fallback_queries["retrieve_orders"])
+            return _SQL_FALLBACK_BY_ACTION.get(action_type, _SQL_FALLBACK_BY_ACTION["retrieve_orders"])
 
-    def _analyze_results_and_respond(self, rows: list, action_type: str, original_query: str, intent: dict) -> str:
+    @staticmethod
+    def _template_sql(action_type: str, original_query: str) -> Optional[str]:
+        """Return the `SQL_TEMPLATES` query for this request, if one fits.
+
+        The filters are read from the query words themselves rather than the
+        LLM's filter list, so a template never drops a stated constraint.
+        """
+        filters = set()
+        for word in _QUERY_WORD_RE.findall(original_query.lower()):
+            if word in _TEMPLATE_FILTER_WORDS:
+                filters.add(_TEMPLATE_FILTER_WORDS[word])
+            elif word not in _GENERIC_QUERY_WORDS:
+                return None
+        return SQL_TEMPLATES.get((action_type, frozenset(filters)))
+
+    async def _analyze_results_and_respond(
+        self, rows: list, action_type: str, original_query: str, intent: dict, procedures: "asyncio.Task"
+    ) -> str:
         """Use LLM to analyze results and provide intelligent, contextual response with RAG context."""
         if not rows:
             return f"I couldn't find any data matching your criteria for: {original_query}"
         
+        # Totals and distributions cover every row, not just the sample
+        aggregates = ""
+        if len(rows) > 3:
+            stats = await asyncio.to_thread(summarise_rows, rows)
+            aggregates = f"Aggregates over all records: {dumps(stats)}\n"
+        
         # Get contextual information from RAG as specified in requirements
         rag_context = ""
-        if self.sales_rag:
-            try:
-                rag_results = self.sales_rag.search_procedures(original_query, k=2)
-                if rag_results:
-                    rag_context = f"\n\nRelevant procedures and context:\n"
-                    for result in rag_results:
-                        rag_context += f"- {result['excerpt']}\n"
-            except Exception as e:
-                print(f"Warning: RAG search failed: {e}")
+        rag_results = await procedures
+        if rag_results:
+            rag_context = f"\n\nRelevant procedures and context:\n"
+            rag_context += "".join(f"- {result['excerpt']}\n" for result in rag_results)
         
-        prompt = f"""
-You are a Sales & CRM expert analyzing data for a business user.
-
-User query: "{original_query}"
-Action performed: {action_type}
-Data found: {len(rows)} records
-Sample data: {rows[:3] if len(rows) > 3 else rows}
-{rag_context}
-
-Provide a professional response that:
-1. Directly answers their question
-2. Summarizes key findings from the data
-3. Highlights important business insights
-4. Mentions any notable patterns or trends
-5. Uses appropriate sales/CRM terminology
-6. Incorporates relevant context from procedures when available
-
-Be conversational, helpful, and business-focused.
-"""
+        prompt = _ANALYSIS_PROMPT.format(
+            query=original_query,
+            action_type=action_type,
+            count=len(rows),
+            aggregates=aggregates,
+            sample=_rows_to_prompt(rows, max_rows=3),
+            rag_context=rag_context,
+        )
         
-        return call_gemini_prompt(prompt)
+        return await acall_gemini_prompt(prompt, stream=True)
 
-    def _handle_rag_query(self, query: str) -> str:
+    async def _handle_rag_query(self, query: str) -> str:
         """Handle RAG queries for procedures, policies, definitions."""
         try:
             # Try domain-specific RAG first
-            if self.sales_rag:
-                rag_results = self.sales_rag.search(query, k=3)
+            sales_rag = await asyncio.to_thread(getattr, self, "sales_rag")
+            if sales_rag:
+                rag_results = await sales_rag.asearch(query, k=3)
                 if rag_results:
-                    return self._summarise_rag_results(rag_results, query, "sales procedures")
+                    return await self._summarise_rag_results(rag_results, query, "sales procedures")
             
             # Fallback to general RAG
-            rag_results = self.rag.search(query, k=3)
+            rag = await asyncio.to_thread(getattr, self, "rag")
+            rag_results = await rag.asearch(query, k=3)
             if rag_results:
-                return self._summarise_rag_results(rag_results, query, "documentation")
+                return await self._summarise_rag_results(rag_results, query, "documentation")
             
             return f"I couldn't find any relevant information about '{query}' in our sales documentation. You might want to contact your sales manager for specific procedures."
             
@@ -261,15 +573,14 @@ Be conversational, helpful, and business-focused.
             print(f"Warning: RAG search failed: {e}")
             return f"I'm having trouble accessing the documentation for '{query}'. Please try again or contact support."
 
-    def _summarise_rag_results(self, results: list, query: str, source_type: str) -> str:
-        """Summarize RAG results into a helpful response."""
+    async def _summarise_rag_results(self, results: list, query: str, source_type: str) -> str:
+        """Summarize RAG results into a helpful response, streamed to a streaming caller."""
         if not results:
             return f"I couldn't find information about '{query}' in our {source_type}."
         
         # Build context from results
-        context = ""
-        for i, result in enumerate(results[:3], 1):
-            context += f"{i}. {result.get('excerpt', '')}\n"
+        parts = [f"{i}. {result.get('excerpt', '')}" for i, result in enumerate(results[:3], 1)]
+        context = "\n".join(parts) + "\n"
         
         # Use LLM to provide a structured response
         prompt = f"""
@@ -282,7 +593,7 @@ Provide a clear, helpful response that addresses the user's question. Be profess
 """
         
         try:
-            response = call_gemini_prompt(prompt)
+            response = await acall_gemini_prompt(prompt, stream=True)
             return response.strip()
         except Exception as e:
             # Fallback to simple concatenation
@@ -309,56 +620,16 @@ Provide a clear, helpful response that addresses the user's question. Be profess
                 rag_results = self.sales_rag.search_procedures("lead qualification scoring", k=2)
                 if rag_results:
                     rag_context = f"\n\nRelevant lead management procedures:\n"
-                    for result in rag_results:
-                        rag_context += f"- {result['excerpt']}\n"
+                    rag_context += "".join(f"- {result['excerpt']}\n" for result in rag_results)
             except Exception as e:
                 print(f"Warning: RAG search failed: {e}")
         
-        prompt = f"""
-Extract lead information from this request:
-"{original_query}"
-{rag_context}
-
-Carefully extract the specific details mentioned:
-- Look for person names (first name + last name)
-- Look for company names (often "at [Company]" or "[Company] Inc/LLC/Ltd")
-- Look for email addresses (format: name@domain.com) - these are often after "email" or contain @
-- Extract any message or description
-
-Pay special attention to email addresses - they are critical for lead creation.
-
-If specific details are provided, extract them exactly. If not provided, use reasonable defaults.
-Consider the lead scoring criteria from procedures when available.
-
-IMPORTANT: Respond with ONLY valid JSON, no explanations or markdown formatting.
-
-JSON format:
-{{
-    "customer_name": "extracted full name (first last) or Company Name",
-    "contact_email": "extracted email or reasonable default", 
-    "message": "extracted message or description of the lead request",
-    "score": 0.5
-}}
-
-Examples:
-- "John Smith at TechCorp" -> customer_name: "John Smith", contact_email: "john.smith@techcorp.com"
-- "Create lead for Jane Doe, email jane@example.com" -> customer_name: "Jane Doe", contact_email: "jane@example.com"
-- "John Smith at TechCorp, email john@techcorp.com" -> customer_name: "John Smith", contact_email: "john@techcorp.com"
-"""
+        prompt = _LEAD_EXTRACTION_PROMPT.format(query=original_query, rag_context=rag_context)
         
         try:
             response = call_gemini_prompt(prompt)
             # Parse the lead info and create the lead
-            import json
-            
-            # Clean up the response to extract JSON
-            response_clean = response.strip()
-            if response_clean.startswith("```json"):
-                response_clean = response_clean[7:-3].strip()
-            elif response_clean.startswith("```"):
-                response_clean = response_clean[3:-3].strip()
-            
-            lead_info = json.loads(response_clean)
+            lead_info = extract_json(response)
             
             customer_name = lead_info.get("customer_name", f"Lead {random.randint(1000, 9999)}")
             contact_email = lead_info.get("contact_email", f"lead{random.randint(1000,9999)}@example.com")
@@ -369,11 +640,7 @@ Examples:
             ml_score = scoring_result.get("score", 0.5)
             
             # Create the lead in database
-            sql = """
-                INSERT INTO leads (customer_name, contact_email, message, score, status, created_at) 
-                VALUES (?, ?, ?, ?, 'new', datetime('now'))
-            """
-            lead_id = self.sql.write(sql, (
+            lead_id = self.sql.write(_SQL_INSERT_LEAD, (
                 customer_name,
                 contact_email,
                 message,
@@ -393,6 +660,32 @@ Examples:
             # Fallback to simple lead creation
             return self._create_dummy_lead(original_query)
 
+    def create_leads_bulk(self, leads: Iterable[Dict[str, Any]]) -> List[int]:
+        """Score and insert many leads at once, e.g. from a CSV import.
+
+        `leads` are mappings with `customer_name`, `contact_email` and an
+        optional `message`.  Scores come from the vectorised
+        `LeadScoringTool.score_leads` instead of one LLM call per lead, and
+        all rows are inserted with one `executemany` in a single transaction,
+        sharing one `created_at` timestamp.  Returns the new lead IDs.
+        """
+        leads = list(leads)
+        if not leads:
+            return []
+        names = np.array([str(lead.get("customer_name") or "") for lead in leads])
+        emails = np.array([str(lead.get("contact_email") or "") for lead in leads])
+        messages = np.array([str(lead.get("message") or "") for lead in leads])
+        scores = LeadScoringTool.score_leads(names, emails, messages)
+        created_at = database.utc_now()
+        with self.sql.transaction() as tx:
+            count = tx.write_many(
+                _SQL_INSERT_LEAD_AT,
+                zip(names.tolist(), emails.tolist(), messages.tolist(), scores.tolist(), [created_at] * len(leads)),
+            )
+            # The write lock is held, so the new rowids are consecutive
+            last_id = tx.read("SELECT last_insert_rowid() AS id")[0]["id"]
+        return list(range(last_id - count + 1, last_id + 1))
+
     def _create_intelligent_order(self, original_query: str, intent: dict) -> str:
         """Create an order using LLM to understand requirements."""
         # For now, use the existing dummy order creation
@@ -401,21 +694,11 @@ Examples:
 
     def _create_support_ticket(self, original_query: str, intent: dict) -> str:
         """Create a support ticket from the query."""
-        prompt = f"""
-Extract support ticket information from: "{original_query}"
-
-Create JSON with:
-{{
-    "subject": "brief subject line",
-    "message": "detailed message",
-    "priority": "low|medium|high"
-}}
-"""
+        prompt = _TICKET_EXTRACTION_PROMPT.format(query=original_query)
         
         try:
             response = call_gemini_prompt(prompt)
-            import json
-            ticket_info = json.loads(response.strip())
+            ticket_info = extract_json(response)
             
             # Create ticket (using customer_id = 1 as default)
             sql = """
@@ -434,188 +717,19 @@ Create JSON with:
         except Exception as e:
             return f"I've created a support ticket for your request: '{original_query}'. Our team will follow up with you soon."
 
-    def _understand_intent(self, query: str) -> dict:
-        """Use LLM to understand the user's intent and determine what they want."""
-        prompt = f"""
-        You are a sales domain expert. Analyze this user query and determine their intent.
-        
-        User query: "{query}"
-        
-        Available sales data includes: customers, leads, orders, order_items, products, tickets
-        
-        Determine:
-        1. What action they want (query_data, create_record, or other)
-        2. What entity they're interested in (customers, orders, products, leads, etc.)
-        3. What specific information they need
-        4. Any filters or conditions they mentioned
-        
-        Respond in JSON format:
-        {{
-            "action": "query_data|create_record|other",
-            "entity": "customers|orders|products|leads|tickets",
-            "information_needed": "description of what they want to know",
-            "filters": ["list of any conditions or filters mentioned"],
-            "limit": number or null
-        }}
-        """
-        
-        try:
-            response = call_gemini_prompt(prompt)
-            # Parse the JSON response
-            import json
-            return json.loads(response)
-        except Exception as e:
-            # Fallback to simple parsing
-            return {
-                "action": "query_data",
-                "entity": "orders",
-                "information_needed": "general information",
-                "filters": [],
-                "limit": 5
-            }
-
-    def _execute_data_query(self, intent: dict, original_query: str) -> str:
-        """Execute a data query based on the understood intent."""
-        entity = intent.get("entity", "orders")
-        filters = intent.get("filters", [])
-        limit = intent.get("limit", 5)
-        
-        # Generate SQL query based on intent
-        sql_query = self._generate_sql_query(entity, filters, limit)
-        
-        try:
-            # Execute the query
-            rows = self.sql.read(sql_query)
-            
-            # Process and analyze the results intelligently
-            return self._analyze_and_respond(rows, entity, original_query, intent)
-        except Exception as e:
-            return f"I encountered an error while retrieving the data: {str(e)}"
-
-    def _generate_sql_query(self, entity: str, filters: list, limit: int) -> str:
-        """Generate appropriate SQL query based on entity and filters."""
-        base_queries = {
-            "customers": """
-                SELECT id, name, email, phone, created_at 
-                FROM customers 
-                ORDER BY created_at DESC
-            """,
-            "orders": """
-                SELECT o.id, c.name AS customer_name, o.total, o.status, o.created_at
-                FROM orders o 
-                JOIN customers c ON o.customer_id = c.id
-                ORDER BY o.created_at DESC
-            """,
-            "products": """
-                SELECT id, name, price, description, sku
-                FROM products
-                ORDER BY price DESC
-            """,
-            "leads": """
-                SELECT id, customer_name, contact_email, score, status, created_at
-                FROM leads
-                ORDER BY created_at DESC
-            """,
-            "tickets": """
-                SELECT id, customer_id, subject, status, priority, created_at
-                FROM tickets
-                ORDER BY created_at DESC
-            """
-        }
-        
-        query = base_queries.get(entity, base_queries["orders"])
-        
-        # Apply filters if any
-        if filters:
-            # This is simplified - in a real system you'd parse filters more intelligently
-            if "cancelled" in filters:
-                query = query.replace("ORDER BY", "WHERE status = 'cancelled' ORDER BY")
-            elif "recent" in filters:
-                query = query.replace("ORDER BY", "WHERE created_at >= date('now', '-30 days') ORDER BY")
-        
-        # Add limit
-        query += f" LIMIT {limit}"
-        
-        return query
-
-    def _analyze_and_respond(self, rows: list, entity: str, original_query: str, intent: dict) -> str:
-        """Intelligently analyze the data and provide a meaningful response."""
-        if not rows:
-            return f"I couldn't find any {entity} matching your criteria."
-        
-        # Create a summary of the data for the LLM to analyze
-        data_summary = {
-            "entity": entity,
-            "count": len(rows),
-            "data": rows[:10],  # Limit to first 10 rows for analysis
-            "original_query": original_query,
-            "intent": intent
-        }
-        
-        prompt = f"""
-        You are a sales analyst. The user asked: "{original_query}"
-        
-        Here is the data I found ({len(rows)} records):
-        {data_summary}
-        
-        Provide a clear, helpful response that directly answers their question.
-        Highlight key insights, trends, or important information.
-        Be conversational and professional.
-        """
-        
-        return call_gemini_prompt(prompt)
-
-    def _execute_create_action(self, intent: dict, original_query: str) -> str:
-        """Handle record creation actions."""
-        # For now, use the existing dummy creation methods
-        if "lead" in intent.get("entity", ""):
-            return self._create_dummy_lead(original_query)
-        elif "order" in intent.get("entity", ""):
-            return self._create_dummy_order(original_query)
-        else:
-            return "I can help you create leads or orders. Could you be more specific about what you'd like to create?"
-
     # Helper methods
-    def _summarise(self, raw_response: str, query: str) -> str:
-        """Call the LLM to summarise a raw response string.
+    def _summarise(self, raw_response: Any, query: str) -> str:
+        """Call the LLM to summarise a raw response.
 
         Prepend a short instruction asking the model to present the data in
-        a clear narrative.  Raises LLMError if the call fails.
+        a clear narrative.  Non-string data (e.g. query rows) is serialised to
+        JSON first.  Raises LLMError if the call fails.
         """
-        prompt = (
-            "You are an assistant summarising sales data for a user.  "
-            "Given the following raw information and the user's query, "
-            "compose a concise and friendly reply.\n\n"
-            f"User query: {query}\n"
-            f"Raw information: {raw_response}"
-        )
-        return call_gemini_prompt(prompt)
-
-    def _list_customers(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT id, name, email, phone FROM customers ORDER BY created_at DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _list_leads(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT id, customer_name, contact_email, score, status FROM leads ORDER BY created_at DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _list_orders(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT orders.id, customers.name AS customer_name, orders.total, orders.status, orders.created_at "
-            "FROM orders JOIN customers ON orders.customer_id = customers.id "
-            "ORDER BY orders.created_at DESC LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
-
-    def _list_products(self, query: str) -> str:
-        rows = self.sql.read(
-            "SELECT id, sku, name, price FROM products ORDER BY id LIMIT 5"
-        )
-        return self._summarise(str(rows), query)
+        if isinstance(raw_response, list):
+            raw_response = _rows_to_prompt(raw_response)
+        elif not isinstance(raw_response, str):
+            raw_response = dumps(raw_response)
+        return call_gemini_prompt(_SUMMARY_PROMPT + f"User query: {query}\nRaw information: {raw_response}")
 
     def _create_dummy_lead(self, query: str) -> str:
         """Insert a dummy lead to demonstrate write operations.
@@ -639,7 +753,7 @@ Create JSON with:
             "lead_message": message,
         }
         return self._summarise(
-            f"New lead created: {raw_resp}", query
+            f"New lead created: {dumps(raw_resp)}", query
         )
 
     def _create_dummy_order(self, query: str) -> str:
@@ -650,30 +764,32 @@ Create JSON with:
         from the database to create an example order.  Returns a summarised
         confirmation message.
         """
-        # Pick a random customer
-        customers = self.sql.read("SELECT id FROM customers")
-        if not customers:
-            raise RuntimeError("No customers available to create an order")
-        customer_id = random.choice(customers)["id"]
-        # Pick a random product
-        products = self.sql.read("SELECT id, price FROM products")
-        if not products:
-            raise RuntimeError("No products available to create an order")
-        product = random.choice(products)
-        product_id = product["id"]
-        price = product["price"]
-        quantity = 1
-        total = price * quantity
-        # Create order header
-        order_id = self.sql.write(
-            "INSERT INTO orders (customer_id, total, status, created_at) VALUES (?, ?, 'pending', datetime('now'))",
-            (customer_id, total),
-        )
-        # Create order item
-        self.sql.write(
-            "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
-            (order_id, product_id, quantity, price),
-        )
+        # Header and line are written in one transaction, with one commit
+        with self.sql.transaction() as tx:
+            # Pick a random customer
+            customers = tx.read(_SQL_RANDOM_CUSTOMER)
+            if not customers:
+                raise RuntimeError("No customers available to create an order")
+            customer_id = customers[0]["id"]
+            # Pick a random product
+            products = tx.read(_SQL_RANDOM_PRODUCT)
+            if not products:
+                raise RuntimeError("No products available to create an order")
+            product = products[0]
+            product_id = product["id"]
+            price = product["price"]
+            quantity = 1
+            total = price * quantity
+            # Create order header
+            order_id = tx.write(
+                "INSERT INTO orders (customer_id, total, status, created_at) VALUES (?, ?, 'pending', datetime('now'))",
+                (customer_id, total),
+            )
+            # Create order item
+            tx.write(
+                "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+                (order_id, product_id, quantity, price),
+            )
         raw_resp = {
             "order_id": order_id,
             "customer_id": customer_id,
@@ -681,4 +797,4 @@ Create JSON with:
             "quantity": quantity,
             "total": total,
         }
-        return self._summarise(f"New order created: {raw_resp}", query)
+        return self._summarise(f"New order created: {dumps(raw_resp)}", query)
@@ -10,7 +10,12 @@ using the LLM.
 
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Tuple
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from agents import (
     RouterAgent,
@@ -19,12 +24,24 @@ from agents import (
     InventoryAgent,
     AnalyticsAgent,
 )
-from models.common import ChatRequest, ChatResponse, ListOrdersResponse, CreateOrderRequest, CreateOrderResponse
+from models.common import (
+    ChatRequest,
+    ChatResponse,
+    ListOrdersResponse,
+    CreateOrderRequest,
+    CreateOrderResponse,
+    BulkLeadsRequest,
+    BulkLeadsResponse,
+)
 from tools.sql_tool import SQLTool
 from tools.memory_manager import conversation_manager
 from tools.audit_logger import GlobalState
+from tools.saved_reports import SavedReportsManager
 
 
+# Every JSON endpoint declares a response model, so FastAPI serialises the
+# result straight to bytes with pydantic-core; a custom response class such
+# as ORJSONResponse (deprecated in current FastAPI) would only add a step.
 app = FastAPI(title="Agent‑Driven ERP API")
 
 
@@ -44,7 +61,7 @@ router_agent = RouterAgent(
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(req: ChatRequest) -> ChatResponse:
+async def chat_endpoint(req: ChatRequest) -> ChatResponse:
     """Entry point for conversational interactions with the ERP system.
 
     The router selects the appropriate domain agent based on the user
@@ -55,39 +72,143 @@ def chat_endpoint(req: ChatRequest) -> ChatResponse:
         # Get or create conversation ID
         conversation_id = req.conversation_id
         if not conversation_id:
-            conversation_id = conversation_manager.start_conversation()
-        
-        # Add user message to conversation buffer
-        conversation_manager.add_user_message(conversation_id, req.message)
+            conversation_id = await asyncio.to_thread(conversation_manager.start_conversation)
         
-        # Get conversation context for the router
-        context = conversation_manager.get_context_for_agent(conversation_id)
+        # Route the query
+        result = await router_agent.handle_chat(req.message, conversation_id)
         
-        # Route the query with enhanced context
-        result = router_agent.handle_chat(req.message, conversation_id, context)
-        
-        # Add agent response to conversation buffer
-        conversation_manager.add_agent_response(conversation_id, result["response"], "system")
+        # Add the user message and the agent response to the conversation buffer
+        await asyncio.to_thread(conversation_manager.add_turn, conversation_id, req.message, result["response"], "system")
         
         # Update global state
-        GlobalState.set_last_module("router")
+        await asyncio.to_thread(GlobalState.set_last_module, "router")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return ChatResponse(conversation_id=result["conversation_id"], response=result["response"])
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest) -> StreamingResponse:
+    """Streaming variant of `/chat`.
+
+    The reply is sent as plain text while the agent's LLM summary is being
+    generated, so clients can render the first words right away.  The
+    conversation ID is returned in the `X-Conversation-Id` header.  Errors
+    after streaming has started are appended to the text.
+    """
+    conversation_id = req.conversation_id
+    if not conversation_id:
+        conversation_id = await asyncio.to_thread(conversation_manager.start_conversation)
+
+    async def reply() -> AsyncIterator[str]:
+        parts = []
+        try:
+            async for chunk in router_agent.handle_chat_stream(req.message, conversation_id):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield f"\n\nError: {e}"
+            return
+        await asyncio.to_thread(conversation_manager.add_turn, conversation_id, req.message, "".join(parts), "system")
+        await asyncio.to_thread(GlobalState.set_last_module, "router")
+
+    return StreamingResponse(
+        reply(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Conversation-Id": str(conversation_id)},
+    )
+
+
+_MAX_ORDERS_LIMIT = 500
+_SQL_LIST_ORDERS = (
+    "SELECT orders.id, customers.name AS customer_name, orders.total, orders.status, orders.created_at "
+    "FROM orders JOIN customers ON orders.customer_id = customers.id "
+    "ORDER BY orders.created_at DESC LIMIT ?"
+)
+
+
 @app.get("/orders", response_model=ListOrdersResponse)
-def list_orders(limit: int = 10) -> ListOrdersResponse:
-    """List the most recent sales orders."""
+def list_orders(limit: int = Query(10, ge=1, le=_MAX_ORDERS_LIMIT)) -> ListOrdersResponse:
+    """List the most recent sales orders.
+
+    Results come from SQLTool's read cache, which is invalidated by any write
+    to `orders` or `customers` (e.g. `create_order`); `limit` is capped so a
+    single request cannot fill the cache with an arbitrarily large result.
+    """
     sql = SQLTool("api")
-    rows = sql.read(
-        "SELECT orders.id, customers.name AS customer_name, orders.total, orders.status, orders.created_at "
-        "FROM orders JOIN customers ON orders.customer_id = customers.id "
-        "ORDER BY orders.created_at DESC LIMIT ?",
-        (limit,),
-    )
-    return ListOrdersResponse(orders=rows)
+    rows = sql.read(_SQL_LIST_ORDERS, (limit,))
+    # Rows are plain dicts already; FastAPI validates the response model once
+    # more when serialising, so constructing it unvalidated skips a pass
+    return ListOrdersResponse.model_construct(orders=rows)
+
+
+# Orders with at least this many items are priced entirely in SQL
+_SQL_PRICING_MIN_ITEMS = 5
+
+# The id and item lists are bound as one JSON parameter, so each query text
+# stays the same for any order size and its prepared statement is reused from
+# the connection's statement cache.  Both queries also check that the
+# customer exists, so pricing an order takes a single read.
+_SQL_PRODUCT_PRICES = (
+    "SELECT 'p' AS kind, id, price FROM products WHERE id IN (SELECT value FROM json_each(?)) "
+    "UNION ALL SELECT 'c', id, NULL FROM customers WHERE id = ?"
+)
+_SQL_PRICE_ITEMS = (
+    "WITH items(pid, qty) AS ("
+    "SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)) "
+    "SELECT EXISTS(SELECT 1 FROM customers WHERE id = ?) AS customer_exists, "
+    "TOTAL(p.price * items.qty) AS total, "
+    "json_group_array(json_array(p.id, p.price)) AS prices "
+    "FROM items JOIN products p ON p.id = items.pid"
+)
+
+
+def _normalise_items(items: List[dict]) -> List[dict]:
+    """Return `items` with integer `product_id` and `quantity` values.
+
+    Ids are compared with the integer keys read from SQLite, so "1" must
+    become 1.  Raises a 422 HTTPException for items that lack either key or
+    whose values are not integers.
+    """
+    try:
+        return [
+            {**item, "product_id": int(item["product_id"]), "quantity": int(item["quantity"])}
+            for item in items
+        ]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="Each item needs an integer product_id and quantity")
+
+
+def _price_order(sql: SQLTool, customer_id: int, items: List[dict]) -> Tuple[float, Dict[int, float]]:
+    """Return the order total and a product id -> price map for `items`.
+
+    Small orders look the prices up with one IN query and sum in Python;
+    larger ones are joined with `products` in SQL, so SQLite computes the
+    total and returns all prices as one JSON array.
+    `items` must already be normalised by `_normalise_items`.
+    Raises a 404 HTTPException if the customer or any product is unknown.
+    """
+    ids = [item["product_id"] for item in items]
+    if len(items) < _SQL_PRICING_MIN_ITEMS:
+        rows = sql.read(_SQL_PRODUCT_PRICES, (json.dumps(ids), customer_id))
+        customer_exists = any(row["kind"] == "c" for row in rows)
+        prices = {row["id"]: row["price"] for row in rows if row["kind"] == "p"}
+        total = None
+    else:
+        pairs = [[item["product_id"], item["quantity"]] for item in items]
+        row = sql.read(_SQL_PRICE_ITEMS, (json.dumps(pairs), customer_id))[0]
+        customer_exists = bool(row["customer_exists"])
+        prices = {pid: price for pid, price in json.loads(row["prices"])}
+        total = row["total"]
+    if not customer_exists:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    for product_id in ids:
+        if product_id not in prices:
+            raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
+    if total is None:
+        total = sum(prices[item["product_id"]] * item["quantity"] for item in items)
+    return total, prices
 
 
 @app.post("/orders", response_model=CreateOrderResponse)
@@ -100,29 +221,45 @@ def create_order(req: CreateOrderRequest) -> CreateOrderResponse:
     the product price.  Returns the new order ID.
     """
     sql = SQLTool("api")
-    # Validate customer
-    customer = sql.read("SELECT id FROM customers WHERE id = ?", (req.customer_id,))
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    # Compute total
-    total = 0.0
-    for item in req.items:
-        product = sql.read("SELECT price FROM products WHERE id = ?", (item["product_id"],))
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item['product_id']} not found")
-        price = product[0]["price"]
-        total += price * item["quantity"]
-    # Insert order
-    order_id = sql.write(
-        "INSERT INTO orders (customer_id, total, status, created_at) VALUES (?, ?, 'pending', datetime('now'))",
-        (req.customer_id, total),
-    )
-    # Insert line items
-    for item in req.items:
-        product = sql.read("SELECT price FROM products WHERE id = ?", (item["product_id"],))
-        price = product[0]["price"]
-        sql.write(
+    items = _normalise_items(req.items)
+    # Validate the customer and price the items
+    total, prices = _price_order(sql, req.customer_id, items)
+    # Insert the order and its line items with a single commit
+    with sql.transaction() as tx:
+        order_id = tx.write(
+            "INSERT INTO orders (customer_id, total, status, created_at) VALUES (?, ?, 'pending', datetime('now'))",
+            (req.customer_id, total),
+        )
+        tx.write_many(
             "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
-            (order_id, item["product_id"], item["quantity"], price),
+            [(order_id, item["product_id"], item["quantity"], prices[item["product_id"]]) for item in items],
         )
     return CreateOrderResponse(order_id=order_id, message="Order created successfully")
+
+
+@app.post("/leads/bulk", response_model=BulkLeadsResponse)
+def create_leads_bulk(req: BulkLeadsRequest) -> BulkLeadsResponse:
+    """Import many leads at once, e.g. the rows of a CSV upload.
+
+    Leads are scored with the vectorised rule-based scorer and inserted in a
+    single transaction, instead of one chat-driven LLM call and write each.
+    """
+    lead_ids = sales_agent.create_leads_bulk(lead.model_dump() for lead in req.leads)
+    return BulkLeadsResponse(lead_ids=lead_ids, message=f"Created {len(lead_ids)} leads")
+
+
+@app.get("/reports/{report_id}/csv")
+def export_report_csv(report_id: int) -> StreamingResponse:
+    """Download a saved report's result as CSV.
+
+    Rows are streamed from the database cursor in chunks rather than
+    collected into a list and serialised at once.
+    """
+    chunks = SavedReportsManager.export_csv(report_id)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="report_{report_id}.csv"'},
+    )
@@ -2,23 +2,106 @@
 Database helper module.
 
 This module centralises access to the SQLite database.  It lazily opens a
-singleton connection and provides helper functions for executing queries and
-returning results as dictionaries.  The database path defaults to the
+single writer connection plus a small pool of read-only connections and
+provides helper functions for executing queries and returning results as
+dictionaries.  Writes are serialised on the writer connection, so threads
+never compete for SQLite's write lock; reads run in parallel on the pool
+(WAL mode lets them proceed while a write is in progress).  The database path defaults to the
 `project_data/erp.db` in the repository root, but you can override it by
 setting the `ERP_DB_PATH` environment variable.
 """
 
 from __future__ import annotations
 
+import atexit
 import os
+import queue
+import re
 import sqlite3
 import threading
+import urllib.parse
 from contextlib import contextmanager
-from typing import Any, Iterable, List, Optional, Tuple, Union
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 _connection: Optional[sqlite3.Connection] = None
 _lock = threading.Lock()
 
+# Held for every statement and transaction on the writer connection.  It is
+# re-entrant so that helpers can be called inside `transaction()`.
+_write_lock = threading.RLock()
+# Depth of `transaction()` blocks open on the current thread
+_write_state = threading.local()
+
+# Read-only connections, checked out by `query()`.  SQLite reads mostly hit
+# the page cache, so the pool is sized to the CPU count (like
+# ThreadPoolExecutor's default); `ERP_DB_READERS` overrides it.
+_READER_POOL_SIZE = int(os.environ.get("ERP_DB_READERS") or min(32, (os.cpu_count() or 1) + 4))
+_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+_reader_count = 0
+
+# Per-table write generations used by read caches to detect stale results.
+# Statements whose target table cannot be determined bump `_write_epoch`,
+# which invalidates every table at once.
+_WRITE_TARGET_RE = re.compile(
+    r"^\s*(?:insert(?:\s+or\s+\w+)?\s+into|replace\s+into|update(?:\s+or\s+\w+)?|delete\s+from)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+_table_generations: Dict[str, int] = {}
+_write_epoch = 0
+_generation_lock = threading.Lock()
+
+# Connection settings applied on first connection.  WAL lets readers and the
+# writer proceed concurrently and, with synchronous=NORMAL, only syncs at
+# checkpoints instead of on every commit; busy_timeout makes a blocked writer
+# wait instead of failing with "database is locked".  The page cache and
+# memory map are per connection, so readers get them too (`_READER_PRAGMAS`).
+_READER_PRAGMAS = [
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+]
+_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+] + _READER_PRAGMAS
+
+# Prepared statements kept per connection (sqlite3's LRU keyed on the SQL
+# text).  Every hot query is a fixed, parameterised string, so repeated calls
+# reuse the compiled statement instead of re-parsing it; the cache is sized
+# well above the number of distinct statements so one-off generated SQL
+# (text-to-SQL) does not evict them.
+_STATEMENT_CACHE_SIZE = 256
+
+# Indexes created on first connection.  Expression indexes must use exactly
+# the same expressions as the queries they serve (see AnalyticsAgent).
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_orders_day ON orders(date(created_at), status, total, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_month ON orders(strftime('%Y-%m', created_at), status, total, created_at)",
+    # /orders lists the newest orders: ORDER BY created_at DESC LIMIT ?; the
+    # total also covers the revenue reports' WHERE created_at >= ? ranges.
+    # It supersedes the plain created_at index.
+    "CREATE INDEX IF NOT EXISTS idx_orders_created_total ON orders(created_at, total)",
+    "DROP INDEX IF EXISTS idx_orders_created_at",
+    "CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders(customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)",
+    # Key lookups, and the unique key INSERT OR REPLACE relies on in memory_manager
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_customer_kv_ck ON customer_kv(customer_id, key)",
+    # ApprovalSystem.get_pending_approvals: WHERE status = ? ORDER BY created_at
+    "CREATE INDEX IF NOT EXISTS idx_approvals_status_created ON approvals(status, created_at)",
+    # Saved report templates (tools/saved_reports.py); each covers the
+    # columns its report reads
+    "CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_month ON invoices(strftime('%Y-%m', issue_date), status, total_amount, issue_date)",
+    "CREATE INDEX IF NOT EXISTS idx_stock_quantity ON stock(quantity, location, product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at, status, priority)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_created_at ON customers(created_at)",
+    # Conversation history and its trim: WHERE conversation_id = ?
+    # ORDER BY created_at DESC, id DESC, answered from the index alone
+    "CREATE INDEX IF NOT EXISTS idx_messages_conv_created ON messages(conversation_id, created_at)",
+]
+
 
 def get_db_path() -> str:
     """Return the path to the SQLite database.
@@ -34,24 +117,162 @@ def get_db_path() -> str:
 
 
 def get_connection() -> sqlite3.Connection:
-    """Get or create a global SQLite connection.
+    """Get or create the global SQLite writer connection.
 
     SQLite connections are not thread‑safe by default.  We reuse a single
-    connection with `check_same_thread=False` and protect all operations with
-    a lock.  Each row is returned as a `sqlite3.Row` object so that columns
-    can be accessed by name or index.
+    connection with `check_same_thread=False` and protect all writes with
+    `_write_lock`.  Each row is returned as a `sqlite3.Row` object so that
+    columns can be accessed by name or index.
     """
     global _connection
     if _connection is None:
         with _lock:
             if _connection is None:
                 db_path = get_db_path()
-                conn = sqlite3.connect(db_path, check_same_thread=False)
+                conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=_STATEMENT_CACHE_SIZE)
                 conn.row_factory = sqlite3.Row
+                _apply_pragmas(conn)
+                _apply_indexes(conn)
                 _connection = conn
     return _connection
 
 
+def _open_reader() -> Optional[sqlite3.Connection]:
+    """Open a read-only connection, or return None if that is not possible."""
+    get_connection()  # make sure the database exists and is in WAL mode
+    db_path = get_db_path()
+    if db_path == ":memory:":
+        return None
+    uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+    try:
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=_STATEMENT_CACHE_SIZE)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open read-only connection: {e}")
+        return None
+    _apply_pragmas(conn, _READER_PRAGMAS)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def close_all() -> None:
+    """Close the pooled read-only connections and the writer connection.
+
+    Registered with `atexit`.  Closing the last connection lets SQLite
+    checkpoint the WAL file back into the database.
+    """
+    global _connection, _reader_count
+    with _lock:
+        while True:
+            try:
+                _readers.get_nowait().close()
+            except queue.Empty:
+                break
+            _reader_count -= 1
+    with _write_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+
+atexit.register(close_all)
+
+
+@contextmanager
+def _reader() -> Iterable[sqlite3.Connection]:
+    """Check out a connection for reading.
+
+    Inside `transaction()` the writer connection is used so that the
+    transaction's own uncommitted changes are visible.  Otherwise a pooled
+    read-only connection is used, opening up to `_READER_POOL_SIZE` of them.
+    """
+    global _reader_count
+    if getattr(_write_state, "depth", 0):
+        with _write_lock:
+            yield get_connection()
+        return
+    try:
+        conn = _readers.get_nowait()
+    except queue.Empty:
+        with _lock:
+            can_open = _reader_count < _READER_POOL_SIZE
+            if can_open:
+                _reader_count += 1
+        if can_open:
+            conn = _open_reader()
+            if conn is None:
+                with _lock:
+                    _reader_count -= 1
+                # No read-only connection available: read through the writer
+                with _write_lock:
+                    yield get_connection()
+                return
+        else:
+            conn = _readers.get()
+    try:
+        yield conn
+    finally:
+        _readers.put(conn)
+
+
+def utc_now() -> str:
+    """Return the current UTC time formatted like SQLite's `datetime('now')`.
+
+    Binding this as a parameter instead of calling `datetime('now')` in SQL
+    lets related rows share one timestamp and be inserted in batches.
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _apply_pragmas(conn: sqlite3.Connection, pragmas: Sequence[str] = _PRAGMAS) -> None:
+    """Apply the connection settings in `pragmas` (default `_PRAGMAS`)."""
+    for statement in pragmas:
+        try:
+            conn.execute(statement)
+        except sqlite3.DatabaseError as e:
+            print(f"Warning: Could not apply {statement}: {e}")
+
+
+def _apply_indexes(conn: sqlite3.Connection) -> None:
+    """Create any missing indexes from `_INDEXES`.
+
+    Failures (e.g. a table that does not exist yet, or duplicate rows that
+    prevent a unique index) are reported and skipped so that an incomplete
+    database can still be opened.
+    """
+    for statement in _INDEXES:
+        try:
+            conn.execute(statement)
+        except (sqlite3.OperationalError, sqlite3.IntegrityError) as e:
+            print(f"Warning: Could not create index: {e}")
+    conn.commit()
+
+
+def note_write(sql: str) -> None:
+    """Record that `sql` modified the database.
+
+    Bumps the write generation of the statement's target table so cached
+    reads of that table are treated as stale.
+    """
+    global _write_epoch
+    match = _WRITE_TARGET_RE.match(sql)
+    with _generation_lock:
+        if match:
+            table = match.group(1).lower()
+            _table_generations[table] = _table_generations.get(table, 0) + 1
+        else:
+            _write_epoch += 1
+
+
+def table_generations(tables: Sequence[str]) -> Tuple[int, ...]:
+    """Return the current write generations for `tables`.
+
+    The first element is the global write epoch; two equal tuples mean none
+    of the tables has been written to in between.
+    """
+    with _generation_lock:
+        return (_write_epoch,) + tuple(_table_generations.get(t, 0) for t in tables)
+
+
 @contextmanager
 def transaction() -> Iterable[sqlite3.Cursor]:
     """Context manager for executing a series of SQL statements in a transaction.
@@ -65,18 +286,54 @@ def transaction() -> Iterable[sqlite3.Cursor]:
     ```
     
     Any exception raised inside the block will roll back the transaction.
-    Otherwise the transaction is committed when the block exits.
+    Otherwise the transaction is committed when the block exits.  The writer
+    connection is held for the whole block.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        yield cur
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        cur.close()
+    with _write_lock:
+        conn = get_connection()
+        cur = conn.cursor()
+        _write_state.depth = getattr(_write_state, "depth", 0) + 1
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            _write_state.depth -= 1
+            cur.close()
+
+
+@contextmanager
+def borrow_conn() -> Iterable[sqlite3.Connection]:
+    """Borrow a read connection from the pool for several statements.
+
+    Saves a pool checkout per statement in loops that issue many small
+    reads; use :func:`snapshot` when the reads must also see one consistent
+    state.  The connection is returned to the pool when the block exits.
+    """
+    with _reader() as conn:
+        yield conn
+
+
+@contextmanager
+def snapshot() -> Iterable[sqlite3.Connection]:
+    """Context manager for running several SELECTs against one snapshot.
+
+    Checks out a read connection (see `_reader`) and holds a read
+    transaction for the block, so every query sees the same committed state
+    and the statements share one connection instead of one checkout each.
+    Inside `transaction()` the writer's open transaction is used as is.
+    """
+    with _reader() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
 
 
 def execute(sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None) -> sqlite3.Cursor:
@@ -88,33 +345,85 @@ def execute(sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None) ->
     statements in one transaction, use the :func:`transaction` context manager
     instead.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(sql, params or [])
-        conn.commit()
-        return cur
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        cur.close()
+    with _write_lock:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params or [])
+            conn.commit()
+            note_write(sql)
+            return cur
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
 
 
 def query(sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None) -> List[sqlite3.Row]:
     """Execute a SELECT statement and return a list of rows.
 
     Each row is a `sqlite3.Row` object, supporting both numeric and named
-    indexing.
+    indexing.  The query runs on a pooled read-only connection (see
+    `_reader`), so statements that modify data must use :func:`execute`.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(sql, params or [])
-        rows = cur.fetchall()
-        return rows
-    finally:
-        cur.close()
+    with _reader() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params or [])
+            rows = cur.fetchall()
+            return rows
+        finally:
+            cur.close()
+
+
+def iter_query(
+    sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None, batch_size: int = 500
+) -> Iterator[sqlite3.Row]:
+    """Execute a SELECT statement and yield its rows as they are fetched.
+
+    Rows are `sqlite3.Row` objects read `batch_size` at a time, so a large
+    result is never held in memory at once.  The read connection stays
+    checked out until the generator is exhausted or closed, so consume it
+    promptly (or close it early).
+    """
+    with _reader() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params or [])
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+
+
+def query_tuples(
+    sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None
+) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Execute a SELECT statement and return `(column_names, rows)`.
+
+    Rows are plain tuples instead of `sqlite3.Row` objects, which saves an
+    allocation per row on large results; callers that need dicts can zip
+    them with the column names once.
+    """
+    with _reader() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        try:
+            cur.execute(sql, params or [])
+            rows = cur.fetchall()
+            columns = [d[0] for d in cur.description] if cur.description else []
+            return columns, rows
+        finally:
+            cur.close()
+
+
+def tuples_to_dicts(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[dict]:
+    """Convert `query_tuples` output to a list of dicts."""
+    return [dict(zip(columns, row)) for row in rows]
 
 
 def query_one(sql: str, params: Union[Tuple[Any, ...], List[Any], None] = None) -> Optional[sqlite3.Row]:
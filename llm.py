@@ -9,15 +9,49 @@ localhost:1234 by default.
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import functools
 import os
 import json
+import threading
+import time
 import requests
-from typing import Any, Dict, Iterable, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Receiver for streamed LLM output in the current context (see `stream_to`)
+_stream_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("llm_stream_sink", default=None)
+# Conversation whose LLM calls are being made (see `for_conversation`)
+_conversation_id: ContextVar[Optional[int]] = ContextVar("llm_conversation_id", default=None)
+
+@functools.lru_cache(maxsize=None)
+def _session() -> requests.Session:
+    """Shared HTTP session for LM Studio requests.
+
+    Reusing pooled keep-alive connections avoids a TCP (and, for remote
+    servers, TLS) handshake on every call.  The pool is sized for the
+    concurrent chats and batched classification calls made from worker
+    threads.  Failed connection attempts (e.g. while LM Studio restarts its
+    server) are retried twice with a short backoff; requests that reached
+    the server are never resent.
+    """
+    session = requests.Session()
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.1)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=64, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    atexit.register(session.close)
+    return session
+
+
 def get_lm_studio_url() -> str:
     """Get the LM Studio API URL from environment or use default."""
     return os.environ.get("LM_STUDIO_URL", "http://localhost:1234/v1/chat/completions")
@@ -34,47 +68,84 @@ class LLMError(RuntimeError):
     """
 
 
+# Last availability probe result as (monotonic time, url, available)
+_AVAILABILITY_TTL_SECONDS = 10.0
+_availability: Optional[Tuple[float, str, bool]] = None
+_availability_lock = threading.Lock()
+
+
 def check_lm_studio_availability() -> bool:
     """Check if LM Studio is available and ready to accept requests.
     
+    The result of the `/v1/models` probe is reused for
+    `_AVAILABILITY_TTL_SECONDS`, so frequent checks do not add a round trip
+    each; concurrent callers wait for a single probe.
+
     Returns:
         True if LM Studio is available, False otherwise.
     """
-    try:
-        lm_studio_url = get_lm_studio_url()
-        models_url = lm_studio_url.replace("/v1/chat/completions", "/v1/models")
-        response = requests.get(models_url, timeout=5)
-        return response.status_code == 200
-    except:
-        return False
-
+    global _availability
+    lm_studio_url = get_lm_studio_url()
+    with _availability_lock:
+        cached = _availability
+        if (
+            cached is not None
+            and cached[1] == lm_studio_url
+            and time.monotonic() - cached[0] < _AVAILABILITY_TTL_SECONDS
+        ):
+            return cached[2]
+        try:
+            models_url = lm_studio_url.replace("/v1/chat/completions", "/v1/models")
+            response = _session().get(models_url, timeout=5)
+            available = response.status_code == 200
+        except Exception:
+            available = False
+        _availability = (time.monotonic(), lm_studio_url, available)
+        return available
 
-def call_lm_studio(messages: List[Dict[str, Any]]) -> str:
-    """Send a list of messages to LM Studio and return the response text.
 
-    The `messages` parameter should be a list of dictionaries in OpenAI chat format.
-    Each message has a `role` (one of "user", "assistant", "system") and a `content` field.
+def _chat_payload(messages: List[Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+    """Build a chat-completions payload with the shared sampling settings.
 
-    Raises:
-        LLMError: if the request fails.
+    `cache_prompt` asks the server to keep the KV cache of the prompt so a
+    following request that shares its prefix (the system prompt, earlier
+    turns) only prefills the new tokens.  llama.cpp's server honours it and
+    LM Studio ignores it (it reuses prefixes on its own).  When
+    `LLM_SLOTS` is set (llama-server started with `--parallel N`), calls
+    made for a conversation are pinned to slot `conversation_id % N` so its
+    cached prefix is not evicted by other conversations.
     """
-    headers = {"Content-Type": "application/json"}
-    payload = {
+    payload: Dict[str, Any] = {
         "messages": messages,
         "temperature": 0.1,
         "max_tokens": 1024,
         "top_p": 0.9,
-        "stream": False
+        "stream": stream,
+        "cache_prompt": True,
     }
-    
+    slots = int(os.environ.get("LLM_SLOTS") or 0)
+    conversation_id = _conversation_id.get()
+    if slots > 0 and conversation_id is not None:
+        payload["id_slot"] = conversation_id % slots
+    return payload
+
+
+def _post_lm_studio(payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+    """POST a chat-completions payload to LM Studio and return the response.
+
+    Connection problems and non-200 replies are translated into `LLMError`
+    with a hint on how to fix the LM Studio setup.
+    """
+    headers = {"Content-Type": "application/json"}
     lm_studio_url = get_lm_studio_url()
     
     try:
-        response = requests.post(
+        response = _session().post(
             lm_studio_url,
             headers=headers,
             json=payload,
             timeout=60,  # Local LLM might need more time
+            stream=stream,
         )
     except requests.exceptions.ConnectionError as exc:
         raise LLMError(
@@ -125,6 +196,29 @@ def call_lm_studio(messages: List[Dict[str, Any]]) -> str:
         else:
             raise LLMError(f"LM Studio API returned status {response.status_code}: {message}")
 
+    return response
+
+
+def call_lm_studio(
+    messages: List[Dict[str, Any]],
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Send a list of messages to LM Studio and return the response text.
+
+    The `messages` parameter should be a list of dictionaries in OpenAI chat format.
+    Each message has a `role` (one of "user", "assistant", "system") and a `content` field.
+    An optional OpenAI-style `response_format` constrains the output, e.g. to
+    a JSON schema.
+
+    Raises:
+        LLMError: if the request fails.
+    """
+    payload = _chat_payload(messages, stream=False)
+    if response_format is not None:
+        payload["response_format"] = response_format
+    
+    response = _post_lm_studio(payload)
+
     try:
         data = response.json()
         choices = data.get("choices", [])
@@ -141,6 +235,38 @@ def call_lm_studio(messages: List[Dict[str, Any]]) -> str:
         raise LLMError(f"Failed to parse LM Studio response: {e}")
 
 
+def call_lm_studio_stream(messages: List[Dict[str, Any]]) -> Iterator[str]:
+    """Stream a chat completion from LM Studio, yielding text chunks.
+
+    Uses the OpenAI-compatible server-sent events API (`stream: true`) and
+    yields each `delta.content` as soon as it arrives.
+
+    Raises:
+        LLMError: if the request fails.
+    """
+    payload = _chat_payload(messages, stream=True)
+    response = _post_lm_studio(payload, stream=True)
+    with response:
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                choices = chunk.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        except requests.RequestException as exc:
+            raise LLMError(f"LM Studio stream was interrupted: {exc}") from exc
+
+
 def call_gemini(messages: List[Dict[str, Any]]) -> str:
     """Compatibility wrapper - converts Gemini format to OpenAI format and calls LM Studio.
     
@@ -169,16 +295,153 @@ def call_gemini(messages: List[Dict[str, Any]]) -> str:
     return call_lm_studio(openai_messages)
 
 
-def call_gemini_prompt(prompt: str) -> str:
+async def acall_gemini(messages: List[Dict[str, Any]]) -> str:
+    """Async counterpart of :func:`call_gemini`.
+
+    The blocking HTTP request runs on a worker thread, so concurrent chats
+    overlap their LLM round trips instead of holding the event loop.
+    """
+    return await asyncio.to_thread(call_gemini, messages)
+
+
+def _prompt_messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Wrap a prompt into chat messages, preceded by an optional system prompt.
+
+    Keeping a fixed system prompt in front lets LM Studio reuse the cached
+    prefix between calls, so only the variable user message is prefilled.
+    """
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def call_gemini_prompt(prompt: str, system: Optional[str] = None) -> str:
     """Convenience wrapper for calling LM Studio with a single prompt.
 
-    The prompt is wrapped into a single user message and sent to LM Studio.
-    Returns the plain text response.
+    The prompt is wrapped into a single user message (after the optional
+    `system` prompt) and sent to LM Studio.  Returns the plain text response.
+    """
+    return call_lm_studio(_prompt_messages(prompt, system))
+
+
+def call_gemini_json(
+    prompt: str,
+    schema: Dict[str, Any],
+    name: str = "response",
+    system: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Call LM Studio with structured output constrained to `schema`.
+
+    Returns the parsed JSON object.
+
+    Raises:
+        LLMError: if the request fails or the reply is not valid JSON.
+    """
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema},
+    }
+    text = call_lm_studio(_prompt_messages(prompt, system), response_format=response_format)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise LLMError(f"LM Studio returned invalid JSON: {exc}") from exc
+    if not isinstance(data, dict):
+        raise LLMError("LM Studio returned JSON that is not an object")
+    return data
+
+
+async def acall_gemini_json(
+    prompt: str,
+    schema: Dict[str, Any],
+    name: str = "response",
+    system: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async counterpart of :func:`call_gemini_json`."""
+    return await asyncio.to_thread(call_gemini_json, prompt, schema, name, system)
+
+
+@contextmanager
+def stream_to(sink: Callable[[str], None]):
+    """Send streamed LLM output produced in this context to `sink`.
+
+    Calls made with ``acall_gemini_prompt(..., stream=True)`` inside the block
+    (including in tasks and threads started from it) pass each text chunk to
+    `sink` as it arrives.
+    """
+    token = _stream_sink.set(sink)
+    try:
+        yield
+    finally:
+        _stream_sink.reset(token)
+
+
+@contextmanager
+def for_conversation(conversation_id: Optional[int]):
+    """Attribute LLM calls made in this context to `conversation_id`.
+
+    Used to pin a conversation's requests to one server slot (see
+    `_chat_payload`); like `stream_to`, it carries over into tasks and
+    worker threads started from the block.
+    """
+    token = _conversation_id.set(conversation_id)
+    try:
+        yield
+    finally:
+        _conversation_id.reset(token)
+
+
+def is_streaming() -> bool:
+    """Return True if streamed LLM output is being collected in this context."""
+    return _stream_sink.get() is not None
+
+
+async def stream_gemini(prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+    """Async iterator over the streamed response to a single prompt.
+
+    The blocking SSE read runs on a worker thread and hands chunks to the
+    event loop as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def produce() -> None:
+        try:
+            for chunk in call_lm_studio_stream(_prompt_messages(prompt, system)):
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as exc:
+            loop.call_soon_threadsafe(queue.put_nowait, exc)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+    await producer
+
+
+async def acall_gemini_prompt(prompt: str, stream: bool = False, system: Optional[str] = None) -> str:
+    """Async counterpart of :func:`call_gemini_prompt`.
+
+    The blocking HTTP request runs on a worker thread so that the event loop
+    can overlap it with database reads and other LLM calls.  With
+    ``stream=True`` and an active :func:`stream_to` sink, the response is
+    streamed and each chunk is forwarded to the sink; the full text is
+    returned either way.
     """
-    messages = [
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
-    return call_lm_studio(messages)
+    sink = _stream_sink.get()
+    if stream and sink is not None:
+        parts = []
+        async for chunk in stream_gemini(prompt, system):
+            sink(chunk)
+            parts.append(chunk)
+        return "".join(parts).strip()
+    return await asyncio.to_thread(call_gemini_prompt, prompt, system)
@@ -1,6 +1,8 @@
+import argparse
 import time
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
 class LLMBenchmark:
@@ -8,6 +10,9 @@ class LLMBenchmark:
     
     def __init__(self, lm_studio_url: str = "http://localhost:1234/v1/chat/completions"):
         self.lm_studio_url = lm_studio_url
+        # Keep-alive connection reused by every call, so timings measure the
+        # LLM rather than a new TCP handshake per request
+        self.session = requests.Session()
         
     def call_llm(self, prompt: str) -> tuple[str, float]:
         """Call the LLM and return response + timing."""
@@ -22,7 +27,7 @@ class LLMBenchmark:
         
         start_time = time.time()
         try:
-            response = requests.post(self.lm_studio_url, headers=headers, json=payload, timeout=30)
+            response = self.session.post(self.lm_studio_url, headers=headers, json=payload, timeout=30)
             end_time = time.time()
             
             if response.status_code == 200:
@@ -36,8 +41,14 @@ class LLMBenchmark:
             end_time = time.time()
             return f"Exception: {str(e)}", end_time - start_time
     
-    def run_benchmark(self):
-        """Run benchmark tests with simple, medium, and complex queries."""
+    def run_benchmark(self, parallel: bool = False):
+        """Run benchmark tests with simple, medium, and complex queries.
+
+        With `parallel=True` the three queries are sent at once, so the total
+        wall time is that of the slowest query rather than the sum (LM Studio
+        serves concurrent requests from its slots).  Per-query durations then
+        include any time spent waiting for a free slot.
+        """
         
         # Test queries of increasing complexity
         test_queries = {
@@ -51,11 +62,24 @@ class LLMBenchmark:
         
         results = {}
         
+        wall_start = time.time()
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(test_queries)) as executor:
+                futures = {
+                    complexity: executor.submit(self.call_llm, query)
+                    for complexity, query in test_queries.items()
+                }
+                responses = {complexity: future.result() for complexity, future in futures.items()}
+        wall_time = time.time() - wall_start
+        
         for complexity, query in test_queries.items():
             print(f"\n📊 Testing {complexity} Query...")
             print(f"Query: {query[:100]}{'...' if len(query) > 100 else ''}")
             
-            response, duration = self.call_llm(query)
+            if parallel:
+                response, duration = responses[complexity]
+            else:
+                response, duration = self.call_llm(query)
             
             results[complexity] = {
                 "duration": duration,
@@ -73,6 +97,10 @@ class LLMBenchmark:
         print("=" * 50)
         for complexity, result in results.items():
             print(f"{complexity:8}: {result['duration']:.2f}s | {result['response_length']} chars")
+        if parallel:
+            print(f"Total wall time (parallel): {wall_time:.2f}s")
+        else:
+            print(f"Total time (serial): {sum(r['duration'] for r in results.values()):.2f}s")
         
         # Performance analysis
         simple_time = results["Simple"]["duration"]
@@ -87,5 +115,8 @@ class LLMBenchmark:
         return results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LM Studio response times.")
+    parser.add_argument("--parallel", action="store_true", help="send the test queries concurrently")
+    args = parser.parse_args()
     benchmark = LLMBenchmark()
-    benchmark.run_benchmark()
+    benchmark.run_benchmark(parallel=args.parallel)
@@ -44,3 +44,20 @@ class CreateOrderRequest(BaseModel):
 class CreateOrderResponse(BaseModel):
     order_id: int
     message: str
+
+
+class LeadRecord(BaseModel):
+    customer_name: str
+    contact_email: str
+    message: str = ""
+
+
+class BulkLeadsRequest(BaseModel):
+    """Request body for the `/leads/bulk` endpoint, e.g. rows of a CSV import."""
+
+    leads: List[LeadRecord]
+
+
+class BulkLeadsResponse(BaseModel):
+    lead_ids: List[int]
+    message: str
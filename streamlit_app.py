@@ -3,11 +3,13 @@ Streamlit front‑end for the agent‑driven ERP system.
 
 This script provides a minimal chat interface.  It maintains a
 conversation ID across messages and sends user input to the FastAPI
-back‑end.  Responses are displayed in a simple chat log.
+back‑end.  Responses are streamed into a simple chat log as the agent
+generates them.
 """
 
 import os
 import json
+from typing import Iterator
 
 import streamlit as st
 import requests
@@ -16,14 +18,36 @@ import requests
 API_URL = os.environ.get("ERP_API_URL", "http://localhost:8000")
 
 
+@st.cache_resource
+def _session() -> requests.Session:
+    """HTTP session shared across reruns, so messages reuse one keep-alive connection."""
+    return requests.Session()
+
+
 def send_message(message: str, conversation_id: int | None) -> dict:
     """Send a chat message to the back‑end and return the JSON response."""
     payload = {"message": message, "conversation_id": conversation_id}
-    resp = requests.post(f"{API_URL}/chat", json=payload)
+    resp = _session().post(f"{API_URL}/chat", json=payload)
     resp.raise_for_status()
     return resp.json()
 
 
+def stream_message(message: str, conversation_id: int | None) -> Iterator[str]:
+    """Send a chat message to `/chat/stream` and yield the reply as it arrives.
+
+    The conversation ID from the response header is stored in the session
+    state before the first chunk is yielded.
+    """
+    payload = {"message": message, "conversation_id": conversation_id}
+    with _session().post(f"{API_URL}/chat/stream", json=payload, stream=True) as resp:
+        resp.raise_for_status()
+        st.session_state.conversation_id = int(resp.headers["X-Conversation-Id"])
+        resp.encoding = "utf-8"
+        for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
+
+
 def main() -> None:
     st.set_page_config(page_title="ERP Chat", page_icon="💬")
     st.title("Agent‑Driven ERP Chat")
@@ -31,23 +55,27 @@ def main() -> None:
         st.session_state.conversation_id = None
     if "history" not in st.session_state:
         st.session_state.history = []  # list of (sender, message)
+    # Display history
+    for sender, msg in st.session_state.history:
+        if sender == "user":
+            st.write(f"**You:** {msg}")
+        else:
+            st.write(f"**Agent:** {msg}")
     # Chat input
     user_input = st.chat_input("Ask me about sales, finance, inventory, or analytics…")
     if user_input:
         # Append user message to history
         st.session_state.history.append(("user", user_input))
+        st.write(f"**You:** {user_input}")
         try:
-            result = send_message(user_input, st.session_state.conversation_id)
-            st.session_state.conversation_id = result["conversation_id"]
-            st.session_state.history.append(("agent", result["response"]))
+            st.write("**Agent:**")
+            response = st.write_stream(stream_message(user_input, st.session_state.conversation_id))
+            if not isinstance(response, str):
+                response = "".join(str(part) for part in response)
+            st.session_state.history.append(("agent", response))
         except Exception as e:
+            st.write(f"Error: {e}")
             st.session_state.history.append(("agent", f"Error: {e}"))
-    # Display history
-    for sender, msg in st.session_state.history:
-        if sender == "user":
-            st.write(f"**You:** {msg}")
-        else:
-            st.write(f"**Agent:** {msg}")
 
 
 if __name__ == "__main__":
@@ -7,27 +7,172 @@ capabilities for the analytics agent.
 
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from llm import call_gemini_prompt
+from llm import call_gemini_json, call_gemini_prompt, LLMError
 import database
+from tools.fast_json import dumps, extract_json, loads
+from tools.row_stats import summarise_rows
+from tools.semantic_cache import SemanticCache
 
 
-class TextToSQLTool:
-    """Converts natural language queries to SQL."""
-    
-    @staticmethod
-    def generate_sql(
-        query: str,
-        domain: str = "general",
-        schema_context: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """Generate SQL from natural language query."""
-        
-        # Default schema context
-        if not schema_context:
-            schema_context = """
+# Number of LLM replies remembered by `_call_llm_json`
+_LLM_CACHE_SIZE = 512
+_llm_cache: "OrderedDict[str, str]" = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+# Generated SQL for paraphrased questions ("top 10 customers by revenue",
+# "show me the 10 highest-grossing customers").  Numbers in the question are
+# part of the cache context, so "top 5" never reuses the SQL for "top 10".
+sql_semantic_cache = SemanticCache(threshold=0.93, ttl_seconds=24 * 60 * 60)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+# Results with at least this many rows get column statistics in the chart prompt
+_CHART_STATS_MIN_ROWS = 20
+
+# Chart spec fields that depend only on the result's columns, not its rows;
+# they can be reused for later results of the same query
+_CHART_LAYOUT_KEYS = ("type", "title", "x_axis", "y_axis", "x_label", "y_label")
+_CHART_FALLBACK_INSIGHT = "Data visualization failed, showing raw table"
+
+# LLM calls in flight at once for `aquick_analysis_many`
+_ANALYSIS_CONCURRENCY = 4
+
+
+# Shape of the JSON replies.  The SQL schema is also sent to the LLM as a
+# structured-output constraint; the chart spec carries free-form data, so it
+# is only checked after parsing.
+_SQL_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sql": {"type": "string"},
+        "explanation": {"type": "string"},
+        "confidence": {"type": "string", "enum": ["low", "medium", "high"]},
+        "tables_used": {"type": "array", "items": {"type": "string"}},
+        "potential_issues": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["sql", "explanation", "confidence", "tables_used", "potential_issues"],
+}
+_CHART_SPEC_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "enum": ["bar", "line", "pie", "table", "scatter"]},
+        "title": {"type": "string"},
+        "x_axis": {"type": "string"},
+        "y_axis": {"type": "string"},
+        "x_label": {"type": "string"},
+        "y_label": {"type": "string"},
+        "data": {"type": "array"},
+        "summary": {"type": "string"},
+        "insights": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["type"],
+}
+
+_JSON_TYPES = {
+    "string": (str,),
+    "array": (list,),
+    "object": (dict,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+}
+
+
+def _compile_validator(schema: Dict[str, Any], required: Optional[List[str]] = None) -> Callable[[Any], None]:
+    """Build a checker for the top-level fields of a JSON-schema object.
+
+    The schema is turned into a flat list of `(key, types, enum)` checks
+    once; the returned function raises ValueError naming the first field
+    that is missing or has the wrong type or value.  Optional fields may be
+    null.
+    """
+    required = list(schema.get("required", ())) if required is None else required
+    checks = [
+        (key, _JSON_TYPES[spec["type"]], frozenset(spec["enum"]) if "enum" in spec else None, spec["type"])
+        for key, spec in schema["properties"].items()
+    ]
+
+    def validate(data: Any) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("reply is not a JSON object")
+        for key in required:
+            if data.get(key) in (None, ""):
+                raise ValueError(f"reply has no {key!r}")
+        for key, types, enum, type_name in checks:
+            value = data.get(key)
+            if value is None:
+                continue
+            if not isinstance(value, types) or isinstance(value, bool) and bool not in types:
+                raise ValueError(f"{key!r} should be of type {type_name}, got {type(value).__name__}")
+            if enum is not None and value not in enum:
+                raise ValueError(f"{key!r} should be one of {sorted(enum)}, got {value!r}")
+
+    return validate
+
+
+# Only `sql` is needed; the other fields are informational
+_validate_sql_response = _compile_validator(_SQL_RESPONSE_SCHEMA, required=["sql"])
+_validate_chart_spec = _compile_validator(_CHART_SPEC_SCHEMA)
+
+
+def _call_llm_json(
+    prompt: str,
+    validate: Callable[[Any], None],
+    schema: Optional[Dict[str, Any]] = None,
+    name: str = "response",
+    system: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Send `prompt` to the LLM and return its reply parsed as a JSON object.
+
+    `system` is sent ahead of the prompt as a system message.
+
+    With `schema` the reply is constrained with structured output, falling
+    back to a free-text reply (optionally in a code fence) if the server
+    rejects it.  The parsed reply must pass `validate`.
+
+    Replies are cached by a SHA-256 of the prompt, so repeating the same
+    request (same question, domain and schema, or the same chart data) is
+    answered without another LLM call.  Only valid replies are cached.  Each
+    call returns a fresh dict.
+    """
+    digest = hashlib.sha256(prompt.encode("utf-8"))
+    if system:
+        digest.update(b"\0" + system.encode("utf-8"))
+    key = digest.hexdigest()
+    with _llm_cache_lock:
+        text = _llm_cache.get(key)
+        if text is not None:
+            _llm_cache.move_to_end(key)
+            return loads(text)
+    result = None
+    if schema is not None:
+        try:
+            result = call_gemini_json(prompt, schema, name, system)
+        except LLMError as e:
+            print(f"Warning: Structured {name} reply failed, retrying as text: {e}")
+    if result is None:
+        result = extract_json(call_gemini_prompt(prompt, system))
+    validate(result)
+    with _llm_cache_lock:
+        _llm_cache[key] = dumps(result)
+        if len(_llm_cache) > _LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+    return result
+
+
+# The fixed instructions of each prompt are sent as a system message that is
+# identical byte for byte on every call, so the LLM server can reuse its cached
+# prefix (see `cache_prompt` in llm.py) and only the short question or data
+# summary in the user message is processed anew.
+_DEFAULT_SCHEMA_CONTEXT = """
 Available tables and key columns:
 - customers: id, name, email, phone, created_at
 - orders: id, customer_id, total, status, created_at
@@ -37,12 +182,9 @@ Available tables and key columns:
 - leads: id, customer_name, contact_email, score, status, created_at
 - stock: product_id, quantity, location
 """
-        
-        prompt = f"""
-You are an expert SQL query generator. Convert this natural language query to SQL:
 
-Query: "{query}"
-Domain: {domain}
+_SQL_SYSTEM_TEMPLATE = """
+You are an expert SQL query generator. Convert the user's natural language query to SQL.
 
 Database Schema:
 {schema_context}
@@ -66,15 +208,69 @@ Respond with JSON:
 
 Confidence levels: low, medium, high
 """
+
+
+def _sql_system_prompt(schema_context: str) -> str:
+    """System prompt for text-to-SQL with the given schema description."""
+    return _SQL_SYSTEM_TEMPLATE.format(schema_context=schema_context)
+
+
+_SQL_SYSTEM_PROMPT = _sql_system_prompt(_DEFAULT_SCHEMA_CONTEXT)
+
+_CHART_SYSTEM_PROMPT = """
+You are a data visualization expert. Analyze the user's data and create a chart specification.
+
+Create a chart specification that best represents this data. Consider:
+- Data types (numerical, categorical, dates)
+- Number of data points
+- Relationships in the data
+- Best visualization type for the query context
+
+Respond with JSON:
+{
+    "type": "bar|line|pie|table|scatter",
+    "title": "Chart Title",
+    "x_axis": "column_name",
+    "y_axis": "column_name", 
+    "x_label": "X Axis Label",
+    "y_label": "Y Axis Label",
+    "data": [prepared data for chart],
+    "summary": "Brief description of what the chart shows",
+    "insights": ["Key insight 1", "Key insight 2"]
+}
+
+Chart Types:
+- bar: categorical data, comparisons
+- line: time series, trends
+- pie: proportions, percentages  
+- table: detailed data, multiple columns
+- scatter: correlations, relationships
+"""
+
+
+class TextToSQLTool:
+    """Converts natural language queries to SQL."""
+    
+    @staticmethod
+    def generate_sql(
+        query: str,
+        domain: str = "general",
+        schema_context: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate SQL from natural language query."""
         
+        system = _SQL_SYSTEM_PROMPT if not schema_context else _sql_system_prompt(schema_context)
+        schema_context = schema_context or _DEFAULT_SCHEMA_CONTEXT
+        prompt = f'Query: "{query}"\nDomain: {domain}\n'
+        
+        cache_context = f"{domain}|{schema_context}|{_NUMBER_RE.findall(query)}"
         try:
-            response = call_gemini_prompt(prompt)
-            result = json.loads(response.strip())
-            
+            cached = sql_semantic_cache.get(query, cache_context)
+            if cached is not None:
+                return loads(cached)
             # Validate SQL is present
-            if not result.get("sql"):
-                raise ValueError("No SQL generated")
-            
+            result = _call_llm_json(prompt, _validate_sql_response, _SQL_RESPONSE_SCHEMA, "sql_query", system)
+            sql_semantic_cache.put(query, dumps(result), cache_context)
             return result
             
         except Exception as e:
@@ -107,6 +303,25 @@ Confidence levels: low, medium, high
             }
 
 
+    @staticmethod
+    def execute_many(sql_results: List[Dict[str, Any]]) -> List[Tuple[List[Any], Dict[str, Any]]]:
+        """Execute several `generate_sql` results on one database snapshot.
+
+        Returns `(data, sql_info)` per result, like `execute_generated_sql`;
+        a statement that fails only affects its own entry.
+        """
+        results = []
+        with database.snapshot() as conn:
+            for sql_result in sql_results:
+                try:
+                    data = conn.execute(sql_result["sql"]).fetchall()
+                    results.append((data, sql_result))
+                except sqlite3.Error as e:
+                    print(f"Warning: SQL execution failed: {e}")
+                    results.append(([], {**sql_result, "execution_error": str(e), "confidence": "low"}))
+        return results
+
+
 class AnalyticsReportingTool:
     """Generates chart specifications and formatted reports."""
     
@@ -133,49 +348,19 @@ class AnalyticsReportingTool:
         
         # Prepare data summary for LLM
         data_summary = f"Data has {len(data)} rows with columns: {', '.join(columns)}\n"
-        data_summary += f"Sample row: {sample_row}\n"
+        data_summary += f"Sample row: {dict(sample_row)}\n"
         
         if len(data) > 1:
-            data_summary += f"Last row: {data[-1]}\n"
+            data_summary += f"Last row: {dict(data[-1])}\n"
+        if len(data) >= _CHART_STATS_MIN_ROWS:
+            # Two rows say little about a large result; add column aggregates
+            # computed with NumPy over every row
+            data_summary += f"Column statistics: {dumps(summarise_rows(data))}\n"
         
-        prompt = f"""
-You are a data visualization expert. Analyze this data and create a chart specification:
-
-Query Context: {query_context}
-{data_summary}
-
-Chart Type Preference: {chart_type}
-
-Create a chart specification that best represents this data. Consider:
-- Data types (numerical, categorical, dates)
-- Number of data points
-- Relationships in the data
-- Best visualization type for the query context
-
-Respond with JSON:
-{{
-    "type": "bar|line|pie|table|scatter",
-    "title": "Chart Title",
-    "x_axis": "column_name",
-    "y_axis": "column_name", 
-    "x_label": "X Axis Label",
-    "y_label": "Y Axis Label",
-    "data": [prepared data for chart],
-    "summary": "Brief description of what the chart shows",
-    "insights": ["Key insight 1", "Key insight 2"]
-}}
-
-Chart Types:
-- bar: categorical data, comparisons
-- line: time series, trends
-- pie: proportions, percentages  
-- table: detailed data, multiple columns
-- scatter: correlations, relationships
-"""
+        prompt = f"Query Context: {query_context}\n{data_summary}\nChart Type Preference: {chart_type}\n"
         
         try:
-            response = call_gemini_prompt(prompt)
-            result = json.loads(response.strip())
+            result = _call_llm_json(prompt, _validate_chart_spec, system=_CHART_SYSTEM_PROMPT)
             
             # Ensure we have the original data
             result["raw_data"] = data
@@ -199,9 +384,31 @@ Chart Types:
                 "raw_data": data,
                 "row_count": len(data),
                 "summary": f"Table view of {len(data)} records",
-                "insights": ["Data visualization failed, showing raw table"]
+                "insights": [_CHART_FALLBACK_INSIGHT]
             }
     
+    @staticmethod
+    def chart_template(chart_spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the layout part of a chart spec, or None for the fallback table.
+
+        The template can be stored and turned back into a spec for new data
+        of the same shape with :meth:`apply_chart_template`, skipping the LLM.
+        """
+        if _CHART_FALLBACK_INSIGHT in chart_spec.get("insights", ()):
+            return None
+        return {key: chart_spec[key] for key in _CHART_LAYOUT_KEYS if key in chart_spec}
+    
+    @staticmethod
+    def apply_chart_template(template: Dict[str, Any], data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build a chart spec for `data` from a stored layout template."""
+        return {
+            **template,
+            "data": data,
+            "raw_data": data,
+            "row_count": len(data),
+            "summary": f"{template.get('type', 'table').capitalize()} chart of {len(data)} records",
+        }
+    
     @staticmethod
     def create_report(
         query: str,
@@ -212,6 +419,7 @@ Chart Types:
         
         # Generate and execute SQL
         data, sql_info = TextToSQLTool.execute_generated_sql(query, domain)
+        fetched_at = database.utc_now()
         
         # Create chart if requested and data is available
         chart_spec = None
@@ -225,13 +433,56 @@ Chart Types:
         # Generate narrative summary
         narrative = AnalyticsReportingTool._generate_narrative(query, data, sql_info)
         
+        return AnalyticsReportingTool._report(query, sql_info, data, chart_spec, narrative, fetched_at)
+    
+    @staticmethod
+    async def acreate_report(
+        query: str,
+        domain: str = "general",
+        include_chart: bool = True
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`create_report`.
+
+        The chart-spec LLM call runs on a worker thread while the narrative
+        is composed, and reports for several queries can be built
+        concurrently with `asyncio.gather`.
+        """
+        data, sql_info = await asyncio.to_thread(TextToSQLTool.execute_generated_sql, query, domain)
+        fetched_at = database.utc_now()
+        chart_task = None
+        if include_chart and data:
+            chart_task = asyncio.ensure_future(asyncio.to_thread(
+                AnalyticsReportingTool.generate_chart_spec,
+                data,
+                title=f"Analysis: {query}",
+                query_context=query
+            ))
+        narrative = AnalyticsReportingTool._generate_narrative(query, data, sql_info)
+        chart_spec = await chart_task if chart_task is not None else None
+        return AnalyticsReportingTool._report(query, sql_info, data, chart_spec, narrative, fetched_at)
+    
+    @staticmethod
+    def _report(
+        query: str,
+        sql_info: Dict[str, Any],
+        data: List[Dict[str, Any]],
+        chart_spec: Optional[Dict[str, Any]],
+        narrative: str,
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """Assemble a report dict.
+
+        `timestamp` is taken in Python right after the data was fetched, so
+        it describes the data rather than the end of the chart LLM call and
+        costs no extra query.
+        """
         return {
             "query": query,
             "sql_info": sql_info,
             "data": data,
             "chart": chart_spec,
             "narrative": narrative,
-            "timestamp": database.query("SELECT datetime('now') as now", None)[0]["now"]
+            "timestamp": timestamp
         }
     
     @staticmethod
@@ -273,6 +524,45 @@ def quick_analysis(query: str, domain: str = "general") -> Dict[str, Any]:
     return AnalyticsReportingTool.create_report(query, domain, include_chart=True)
 
 
+async def aquick_analysis_many(queries: List[str], domain: str = "general") -> List[Dict[str, Any]]:
+    """Build a charted report for each of `queries`, e.g. a dashboard.
+
+    All SQL generation calls run concurrently, then every statement runs on
+    one database snapshot, then all chart-spec calls run concurrently; at
+    most `_ANALYSIS_CONCURRENCY` LLM calls are in flight at a time.
+    """
+    limit = asyncio.Semaphore(_ANALYSIS_CONCURRENCY)
+
+    async def limited(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        async with limit:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    sql_results = await asyncio.gather(*(limited(TextToSQLTool.generate_sql, q, domain) for q in queries))
+    executed = await asyncio.to_thread(TextToSQLTool.execute_many, sql_results)
+    fetched_at = database.utc_now()
+
+    async def chart(query: str, data: List[Any]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return None
+        return await limited(
+            AnalyticsReportingTool.generate_chart_spec, data, title=f"Analysis: {query}", query_context=query
+        )
+
+    charts = await asyncio.gather(*(chart(q, data) for q, (data, _) in zip(queries, executed)))
+    return [
+        AnalyticsReportingTool._report(
+            query, sql_info, data, chart_spec,
+            AnalyticsReportingTool._generate_narrative(query, data, sql_info), fetched_at
+        )
+        for query, (data, sql_info), chart_spec in zip(queries, executed, charts)
+    ]
+
+
+def quick_analysis_many(queries: List[str], domain: str = "general") -> List[Dict[str, Any]]:
+    """Synchronous wrapper for :func:`aquick_analysis_many`."""
+    return asyncio.run(aquick_analysis_many(queries, domain))
+
+
 def table_only_analysis(query: str, domain: str = "general") -> List[Dict[str, Any]]:
     """Quick analysis returning just the data table."""
     data, _ = TextToSQLTool.execute_generated_sql(query, domain)
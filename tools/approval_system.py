@@ -7,12 +7,34 @@ and other operations that require management approval.
 
 from __future__ import annotations
 
-import json
-from datetime import datetime
+import sqlite3
 from typing import Any, Dict, Optional
 
 import database
 from tools.audit_logger import GlobalState
+from tools.memory_manager import note_kv_write
+from tools.fast_json import dumps, loads
+
+
+_SQL_INSERT_APPROVAL = (
+    "INSERT INTO approvals (module, payload_json, status, requested_by, created_at) "
+    "VALUES (?, ?, 'pending', ?, datetime('now'))"
+)
+
+_SQL_PENDING_APPROVALS = (
+    "SELECT id, module, requested_by, created_at, payload_json "
+    "FROM approvals WHERE status = 'pending' ORDER BY created_at ASC"
+)
+
+
+def _parse_payload(payload_json: Optional[str]) -> Dict[str, Any]:
+    """Parse a stored approval payload; unreadable payloads become `{}`."""
+    if not payload_json:
+        return {}
+    try:
+        return loads(payload_json)
+    except ValueError:
+        return {}
 
 
 class ApprovalSystem:
@@ -42,20 +64,21 @@ class ApprovalSystem:
     ) -> int:
         """Request approval for an operation."""
         try:
-            # Create approval request
-            cursor = database.execute(
-                "INSERT INTO approvals (module, payload_json, status, requested_by, created_at) "
-                "VALUES (?, ?, 'pending', ?, ?)",
-                (module, json.dumps(payload), requested_by, datetime.now().isoformat())
-            )
-            approval_id = cursor.lastrowid
-            
-            # Track in global state
-            GlobalState.add_pending_approval(approval_id)
+            # Create the approval request and track it in global state with
+            # a single commit
+            with database.transaction() as cur:
+                cur.execute(
+                    _SQL_INSERT_APPROVAL,
+                    (module, dumps(payload), requested_by)
+                )
+                approval_id = cur.lastrowid
+                GlobalState.add_pending_approval(approval_id, cur)
+            database.note_write(_SQL_INSERT_APPROVAL)
+            note_kv_write()
             
             return approval_id
             
-        except Exception as e:
+        except (sqlite3.Error, TypeError) as e:
             print(f"Warning: Failed to request approval: {e}")
             return 0
     
@@ -68,7 +91,7 @@ class ApprovalSystem:
                 (approval_id,)
             )
             return result[0]["status"] if result else None
-        except Exception:
+        except sqlite3.Error:
             return None
     
     @staticmethod
@@ -76,11 +99,11 @@ class ApprovalSystem:
         """Approve a pending request."""
         try:
             database.execute(
-                "UPDATE approvals SET status = 'approved', decided_by = ?, decided_at = ? WHERE id = ?",
-                (decided_by, datetime.now().isoformat(), approval_id)
+                "UPDATE approvals SET status = 'approved', decided_by = ?, decided_at = datetime('now') WHERE id = ?",
+                (decided_by, approval_id)
             )
             return True
-        except Exception as e:
+        except sqlite3.Error as e:
             print(f"Warning: Failed to approve request: {e}")
             return False
     
@@ -89,11 +112,11 @@ class ApprovalSystem:
         """Reject a pending request."""
         try:
             database.execute(
-                "UPDATE approvals SET status = 'rejected', decided_by = ?, decided_at = ? WHERE id = ?",
-                (decided_by, datetime.now().isoformat(), approval_id)
+                "UPDATE approvals SET status = 'rejected', decided_by = ?, decided_at = datetime('now') WHERE id = ?",
+                (decided_by, approval_id)
             )
             return True
-        except Exception as e:
+        except sqlite3.Error as e:
             print(f"Warning: Failed to reject request: {e}")
             return False
     
@@ -101,50 +124,50 @@ class ApprovalSystem:
     def get_pending_approvals() -> list[Dict[str, Any]]:
         """Get all pending approval requests."""
         try:
-            results = database.query(
-                "SELECT id, module, payload_json, requested_by, created_at "
-                "FROM approvals WHERE status = 'pending' ORDER BY created_at ASC",
-                None
-            )
-            
-            approvals = []
-            for result in results:
-                approval = dict(result)
-                # Parse the JSON payload
-                try:
-                    approval["payload"] = json.loads(approval["payload_json"])
-                except:
-                    approval["payload"] = {}
-                del approval["payload_json"]
-                approvals.append(approval)
-            
-            return approvals
-        except Exception as e:
+            _, rows = database.query_tuples(_SQL_PENDING_APPROVALS)
+        except sqlite3.Error as e:
             print(f"Warning: Failed to get pending approvals: {e}")
             return []
+        return [
+            {
+                "id": approval_id,
+                "module": module,
+                "requested_by": requested_by,
+                "created_at": created_at,
+                "payload": _parse_payload(payload_json),
+            }
+            for approval_id, module, requested_by, created_at, payload_json in rows
+        ]
     
-    @staticmethod
-    def format_approval_message(operation_type: str, amount: float, details: Dict[str, Any]) -> str:
+    # Message templates by operation type; None is the fallback
+    _APPROVAL_MESSAGES = {
+        "invoice": (
+            "This invoice creation for ${amount:.2f} requires management approval "
+            "(threshold: ${threshold:.2f}). "
+            "Your request has been submitted and is pending approval. "
+            "You will be notified once a decision is made."
+        ),
+        "payment": (
+            "This payment of ${amount:.2f} requires management approval "
+            "(threshold: ${threshold:.2f}). "
+            "Your request has been submitted and is pending approval."
+        ),
+        None: (
+            "This {operation_type} operation requires management approval. "
+            "Your request has been submitted and is pending review."
+        ),
+    }
+    
+    @classmethod
+    def format_approval_message(cls, operation_type: str, amount: float, details: Dict[str, Any]) -> str:
         """Format a user-friendly approval message."""
-        if operation_type == "invoice":
-            return (
-                f"This invoice creation for ${amount:.2f} requires management approval "
-                f"(threshold: ${ApprovalSystem.INVOICE_APPROVAL_THRESHOLD:.2f}). "
-                f"Your request has been submitted and is pending approval. "
-                f"You will be notified once a decision is made."
-            )
-        elif operation_type == "payment":
-            return (
-                f"This payment of ${amount:.2f} requires management approval "
-                f"(threshold: ${ApprovalSystem.PAYMENT_APPROVAL_THRESHOLD:.2f}). "
-                f"Your request has been submitted and is pending approval."
-            )
-        else:
-            return (
-                f"This {operation_type} operation requires management approval. "
-                f"Your request has been submitted and is pending review."
-            )
-
+        template = cls._APPROVAL_MESSAGES.get(operation_type, cls._APPROVAL_MESSAGES[None])
+        threshold = (
+            cls.INVOICE_APPROVAL_THRESHOLD if operation_type == "invoice"
+            else cls.PAYMENT_APPROVAL_THRESHOLD if operation_type == "payment"
+            else 0.0
+        )
+        return template.format(amount=amount, threshold=threshold, operation_type=operation_type)
 
 def check_and_handle_approval(module: str, operation_type: str, amount: float = 0.0, **operation_data) -> tuple[bool, Optional[str]]:
     """
@@ -7,12 +7,100 @@ to the database for audit trails and compliance requirements.
 
 from __future__ import annotations
 
-import json
+import atexit
 import functools
-from datetime import datetime
-from typing import Any, Callable, Dict, Optional
+import inspect
+import os
+import queue
+import random
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
 
 import database
+from tools.fast_json import dumps
+from tools.memory_manager import kv_get, kv_upsert
+
+
+class ToolCallLogger:
+    """Writes `tool_calls` rows from a background thread.
+
+    Audit rows are not needed to answer the user, so callers only enqueue
+    them.  A single worker thread collects up to `max_batch` rows (waiting at
+    most `flush_interval` seconds for more) and inserts them with one
+    `executemany` in one transaction.  Pending rows are flushed at exit.
+    """
+
+    _SQL = (
+        "INSERT INTO tool_calls (agent, tool_name, input_json, output_json, created_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    _STOP = object()
+
+    def __init__(self, max_batch: int = 256, flush_interval: float = 0.05) -> None:
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def log(self, agent: str, tool_name: str, input_json: str, output_json: str, created_at: str) -> None:
+        """Queue one row for insertion; never blocks on the database."""
+        self._ensure_worker()
+        self._queue.put_nowait((agent, tool_name, input_json, output_json, created_at))
+
+    def flush(self) -> None:
+        """Block until every row queued so far has been written."""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write the remaining rows and stop the worker thread."""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put_nowait(self._STOP)
+            self._worker.join(timeout)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="tool-call-logger", daemon=True)
+                    self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            stop = first is self._STOP
+            while not stop and len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                stop = item is self._STOP
+            rows = [item for item in batch if item is not self._STOP]
+            try:
+                if rows:
+                    self._write(rows)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, rows: list[Tuple[Any, ...]]) -> None:
+        try:
+            with database.transaction() as cur:
+                cur.executemany(self._SQL, rows)
+            database.note_write(self._SQL)
+        except Exception as e:
+            # Don't let audit logging break the main functionality
+            print(f"Warning: Failed to log {len(rows)} tool call(s): {e}")
+
+
+tool_call_logger = ToolCallLogger()
+atexit.register(tool_call_logger.close)
 
 
 class AuditLogger:
@@ -24,127 +112,148 @@ class AuditLogger:
         tool_name: str,
         input_data: Dict[str, Any],
         output_data: Any,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        sync: bool = False
     ) -> None:
-        """Log a tool call to the database."""
+        """Queue a tool call for the audit log (see `ToolCallLogger`).
+
+        With `sync=True` the call returns only once the row (and everything
+        queued before it) has been committed, for callers that must not lose
+        the entry if the process dies right after.
+        """
         try:
             # Prepare data for storage
-            input_json = json.dumps(input_data, default=str)
+            input_json = dumps(input_data)
             
             if error:
-                output_json = json.dumps({"error": error}, default=str)
+                output_json = dumps({"error": error})
             else:
-                output_json = json.dumps({"result": output_data}, default=str)
+                output_json = dumps({"result": output_data})
             
-            # Insert into tool_calls table
-            database.execute(
-                "INSERT INTO tool_calls (agent, tool_name, input_json, output_json, created_at) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (agent, tool_name, input_json, output_json, datetime.now().isoformat())
-            )
+            tool_call_logger.log(agent, tool_name, input_json, output_json, database.utc_now())
+            if sync:
+                tool_call_logger.flush()
             
         except Exception as e:
             # Don't let audit logging break the main functionality
             print(f"Warning: Failed to log tool call: {e}")
 
 
-def audit_tool_call(agent_name: str, tool_name: str):
-    """Decorator to automatically audit tool calls."""
+# Auditing of decorated tools can be turned off (`ERP_AUDIT_ENABLED=0`) or
+# sampled (`ERP_AUDIT_SAMPLE_RATE=0.01` logs about 1% of successful calls).
+# Failed calls and tools marked `critical=True` are always logged.
+_AUDIT_ENABLED = os.environ.get("ERP_AUDIT_ENABLED", "1") != "0"
+_AUDIT_SAMPLE_RATE = float(os.environ.get("ERP_AUDIT_SAMPLE_RATE", "1"))
+
+
+def audit_tool_call(agent_name: str, tool_name: str, critical: bool = False):
+    """Decorator to automatically audit tool calls.
+
+    Works for both plain functions and coroutine functions.  Audit rows are
+    written in the background, so neither kind waits for the database.  The
+    arguments are only captured for calls that are actually logged; when
+    auditing is disabled, non-critical functions are returned unwrapped.
+    """
     def decorator(func: Callable) -> Callable:
+        if not (_AUDIT_ENABLED or critical):
+            return func
+        sample_rate = 1.0 if critical else _AUDIT_SAMPLE_RATE
+
+        def log(args: tuple, kwargs: dict, result: Any = None, error: Optional[str] = None) -> None:
+            AuditLogger.log_tool_call(
+                agent=agent_name,
+                tool_name=tool_name,
+                input_data={"args": args, "kwargs": kwargs},
+                output_data=result,
+                error=error
+            )
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    log(args, kwargs, error=str(e))
+                    raise
+                if sample_rate >= 1.0 or random.random() < sample_rate:
+                    log(args, kwargs, result)
+                return result
+
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Capture input
-            input_data = {
-                "args": args,
-                "kwargs": kwargs
-            }
-            
             try:
                 # Execute the function
                 result = func(*args, **kwargs)
-                
-                # Log successful call
-                AuditLogger.log_tool_call(
-                    agent=agent_name,
-                    tool_name=tool_name,
-                    input_data=input_data,
-                    output_data=result
-                )
-                
-                return result
-                
             except Exception as e:
-                # Log failed call
-                AuditLogger.log_tool_call(
-                    agent=agent_name,
-                    tool_name=tool_name,
-                    input_data=input_data,
-                    output_data=None,
-                    error=str(e)
-                )
-                
-                # Re-raise the exception
+                # Log failed call and re-raise
+                log(args, kwargs, error=str(e))
                 raise
+            # Log successful call (sampled)
+            if sample_rate >= 1.0 or random.random() < sample_rate:
+                log(args, kwargs, result)
+            return result
                 
         return wrapper
     return decorator
 
 
-def audit_agent_method(agent_name: str):
+def audit_agent_method(agent_name: str, critical: bool = False):
     """Decorator to audit agent methods."""
     def decorator(func: Callable) -> Callable:
         method_name = func.__name__
-        return audit_tool_call(agent_name, method_name)(func)
+        return audit_tool_call(agent_name, method_name, critical)(func)
     return decorator
 
 
 # Global state tracking
 class GlobalState:
-    """Track global system state."""
+    """Track global system state.
+
+    Values are stored in `customer_kv` under customer 0.
+    """
+    
+    # Last module written by this process; every chat turn sets the same
+    # value, so repeats are not written again
+    _last_module: Optional[str] = None
     
     @staticmethod
     def set_last_module(module_name: str) -> None:
         """Set the last used module globally."""
+        if GlobalState._last_module == module_name:
+            return
         try:
-            # Use a simple key-value approach in customer_kv table for global state
-            database.execute(
-                "INSERT OR REPLACE INTO customer_kv (customer_id, key, value) VALUES (0, 'last_module', ?)",
-                (module_name,)
-            )
-        except Exception as e:
+            kv_upsert(0, "last_module", module_name)
+            GlobalState._last_module = module_name
+        except sqlite3.Error as e:
             print(f"Warning: Failed to set last module: {e}")
     
     @staticmethod
     def get_last_module() -> Optional[str]:
         """Get the last used module."""
         try:
-            result = database.query(
-                "SELECT value FROM customer_kv WHERE customer_id = 0 AND key = 'last_module'",
-                None
-            )
-            return result[0]["value"] if result else None
-        except Exception:
+            return kv_get(0, "last_module")
+        except sqlite3.Error:
             return None
     
     @staticmethod
-    def add_pending_approval(approval_id: int) -> None:
-        """Track a pending approval."""
+    def add_pending_approval(approval_id: int, cur: Optional[sqlite3.Cursor] = None) -> None:
+        """Track a pending approval, inside the transaction of `cur` if given.
+
+        With `cur`, call `note_kv_write()` after the transaction commits.
+        """
         try:
-            database.execute(
-                "INSERT OR REPLACE INTO customer_kv (customer_id, key, value) VALUES (0, 'pending_approval', ?)",
-                (str(approval_id),)
-            )
-        except Exception as e:
+            kv_upsert(0, "pending_approval", str(approval_id), cur)
+        except sqlite3.Error as e:
             print(f"Warning: Failed to track pending approval: {e}")
     
     @staticmethod
     def get_pending_approvals() -> list[int]:
         """Get all pending approval IDs."""
         try:
-            results = database.query(
-                "SELECT value FROM customer_kv WHERE customer_id = 0 AND key = 'pending_approval'",
-                None
-            )
-            return [int(result["value"]) for result in results]
-        except Exception:
+            value = kv_get(0, "pending_approval")
+            return [int(value)] if value is not None else []
+        except (sqlite3.Error, ValueError):
             return []
@@ -0,0 +1,125 @@
+"""
+BM25 keyword index over the document corpus.
+
+Dense embeddings are weak at exact tokens such as invoice numbers, SKUs or
+rare product names.  `BM25Index` scores the same document chunks that are
+stored in the vector database with Okapi BM25 so that `VectorRAGTool` can
+fuse keyword and vector rankings (see `reciprocal_rank_fusion`).
+
+The tokenised corpus is persisted as JSON next to the vector store together
+with a signature of the source documents, and rebuilt when they change.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for both documents and queries."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a list of text chunks with per-chunk metadata."""
+
+    def __init__(
+        self,
+        chunks: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        self.chunks = list(chunks)
+        self.metadatas = list(metadatas)
+        self.k1 = k1
+        self.b = b
+
+        term_docs: Dict[str, List[int]] = {}
+        term_freqs: Dict[str, List[int]] = {}
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for i, chunk in enumerate(self.chunks):
+            counts: Dict[str, int] = {}
+            for token in tokenize(chunk):
+                counts[token] = counts.get(token, 0) + 1
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                term_docs.setdefault(term, []).append(i)
+                term_freqs.setdefault(term, []).append(tf)
+
+        n = len(self.chunks)
+        avgdl = float(lengths.mean()) if n else 0.0
+        # Length normalisation depends only on the document, so precompute it
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / avgdl) if avgdl else lengths
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, docs in term_docs.items():
+            df = len(docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            self._postings[term] = (
+                np.asarray(docs, dtype=np.int32),
+                np.asarray(term_freqs[term], dtype=np.float32),
+                idf,
+            )
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return up to `k` `(chunk_index, score)` pairs, best first.
+
+        `predicate` can restrict results by chunk metadata (module, tags).
+        """
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs, idf = posting
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+        results = []
+        for i in np.argsort(-scores):
+            if scores[i] <= 0 or len(results) >= k:
+                break
+            if predicate is None or predicate(self.metadatas[i]):
+                results.append((int(i), float(scores[i])))
+        return results
+
+    def save(self, path: str, signature: str) -> None:
+        """Persist the corpus so the index can be rebuilt without re-reading files."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "chunks": self.chunks, "metadatas": self.metadatas}, f)
+
+    @classmethod
+    def load(cls, path: str, signature: str) -> Optional["BM25Index"]:
+        """Load a persisted index, or return None if missing or out of date."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("signature") != signature:
+            return None
+        return cls(data["chunks"], data["metadatas"])
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]], k: int = 60
+) -> List[Tuple[Hashable, float]]:
+    """Fuse several rankings with RRF: score(d) = sum(1 / (k + rank_i(d)))."""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
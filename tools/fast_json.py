@@ -0,0 +1,60 @@
+"""
+JSON serialisation helpers.
+
+Uses orjson when it is installed, which serialises rows, numbers and NumPy
+arrays in C into a single buffer, and falls back to the standard library
+otherwise.  Objects JSON cannot represent (dates, Decimals, sqlite3 rows,
+...) are converted with `str()` or `dict()` in both cases.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+from typing import Any
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# A JSON object wrapped in a Markdown code fence, as LLMs often reply
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.S)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(obj: Any) -> str:
+    """Serialise `obj` to a compact JSON string."""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(
+                obj,
+                default=_default,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            ).decode()
+        except TypeError:
+            # e.g. integers wider than 64 bits; let the stdlib handle them
+            pass
+    return json.dumps(obj, default=_default, separators=(",", ":"))
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from a `str` or `bytes` value."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def extract_json(text: str) -> Any:
+    """Parse an LLM reply that is JSON, optionally inside a code fence."""
+    match = _FENCED_JSON_RE.search(text)
+    return loads(match.group(1) if match else text.strip())
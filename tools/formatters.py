@@ -0,0 +1,165 @@
+"""
+Client-side rendering of agent responses.
+
+Plain listings (recent invoices, stock levels, suppliers, ...) have a fully
+known shape, so they are rendered from a per-intent template instead of
+asking the LLM to turn a Python `repr` of the rows into prose.  Responses
+that do need narrative are requested from the LLM as a small JSON object
+(`SUMMARY_SCHEMA`) and rendered here with `render_summary`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Any, Dict, Iterable, List
+
+from llm import acall_gemini_json, acall_gemini_prompt, is_streaming, LLMError
+from tools.fast_json import dumps
+from tools.semantic_cache import summary_cache
+
+
+# JSON schema for narrative summaries returned by the LLM
+SUMMARY_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "headline": {"type": "string"},
+        "bullets": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["headline", "bullets"],
+}
+
+SUMMARY_INSTRUCTIONS = (
+    "Respond with a JSON object with a one-sentence \"headline\" answering the "
+    "query and a list of short \"bullets\" with the supporting details."
+)
+
+
+@functools.lru_cache(maxsize=None)
+def summary_system_prompt(role: str, structured: bool = False) -> str:
+    """Shared system prompt for the agents' `_summarise` calls.
+
+    The text is identical for every call made by an agent, so it is built once
+    and sent as the system message; the per-call query and raw data follow in
+    the user message.  With `structured=True` the JSON instructions are part
+    of the prefix as well.
+    """
+    prompt = (
+        f"You are the {role} assistant of an ERP system, summarising data for a "
+        "user.  Given the user's query and the raw information in the next "
+        "message, compose a concise and professional reply."
+    )
+    if structured:
+        prompt += f"\n\n{SUMMARY_INSTRUCTIONS}"
+    return prompt
+
+
+async def summarise(role: str, raw_response: Any, query: str) -> str:
+    """Summarise `raw_response` for `query` as the `role` agent.
+
+    The shared body of the agents' `_summarise` methods.  Replies are cached
+    in `summary_cache` per role and raw data; otherwise a `SUMMARY_SCHEMA`
+    object is requested and rendered with `render_summary`.
+    """
+    if not isinstance(raw_response, str):
+        raw_response = dumps(raw_response)
+    prompt = f"User query: {query}\nRaw information: {raw_response}"
+    context = f"{role}|{raw_response}"
+    cached = await asyncio.to_thread(summary_cache.get, query, context)
+    if cached is not None:
+        return cached
+    if is_streaming():
+        # A streaming caller gets prose as it is generated
+        response = await acall_gemini_prompt(prompt, stream=True, system=summary_system_prompt(role))
+    else:
+        try:
+            data = await acall_gemini_json(
+                prompt, SUMMARY_SCHEMA, "summary", system=summary_system_prompt(role, structured=True)
+            )
+            response = render_summary(data)
+        except LLMError:
+            response = ""
+        if not response:
+            # Model without structured-output support: fall back to free text
+            response = await acall_gemini_prompt(prompt, system=summary_system_prompt(role))
+    await asyncio.to_thread(summary_cache.put, query, response, context)
+    return response
+
+
+# intent -> title, line template, fields rendered as currency, empty message
+_LIST_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "list_invoices": {
+        "title": "Most recent invoices:",
+        "line": "{invoice_number} for {customer_name}: {total_amount} ({status}, issued {issue_date})",
+        "money": ("total_amount",),
+        "empty": "No invoices found.",
+    },
+    "list_payments": {
+        "title": "Most recent payments:",
+        "line": "Payment #{id} from {customer_name}: {amount} via {method} on {received_at}",
+        "money": ("amount",),
+        "empty": "No payments found.",
+    },
+    "list_stock": {
+        "title": "Lowest stock levels:",
+        "line": "{product_name}: {qty_on_hand} on hand (reorder point {reorder_point})",
+        "money": (),
+        "empty": "No stock records found.",
+    },
+    "list_products": {
+        "title": "Products by price:",
+        "line": "{name}: {price}, {qty_on_hand} in stock",
+        "money": ("price",),
+        "empty": "No products found.",
+    },
+    "list_suppliers": {
+        "title": "Suppliers:",
+        "line": "{name} ({email}, {phone})",
+        "money": (),
+        "empty": "No suppliers found.",
+    },
+    "list_saved_reports": {
+        "title": "Saved reports:",
+        "line": "Report {id}: {title}",
+        "money": (),
+        "empty": "No saved reports found.",
+    },
+}
+
+
+class _Row(dict):
+    """Row mapping that renders missing or NULL columns as 'n/a'."""
+
+    def __missing__(self, key: str) -> str:
+        return "n/a"
+
+
+def _money(value: Any) -> str:
+    try:
+        return f"${float(value):,.2f}"
+    except (TypeError, ValueError):
+        return "n/a"
+
+
+def render_rows(intent: str, rows: Iterable[Dict[str, Any]]) -> str:
+    """Render query rows for a listing intent as a bulleted text block."""
+    template = _LIST_TEMPLATES[intent]
+    lines: List[str] = []
+    for row in rows:
+        values = _Row((k, "n/a" if v is None else v) for k, v in row.items())
+        for field in template["money"]:
+            if field in row:
+                values[field] = _money(row[field])
+        lines.append("- " + template["line"].format_map(values))
+    if not lines:
+        return template["empty"]
+    return "\n".join([template["title"], *lines])
+
+
+def render_summary(data: Dict[str, Any]) -> str:
+    """Render a `SUMMARY_SCHEMA` object as a headline followed by bullets."""
+    headline = str(data.get("headline", "")).strip()
+    bullets = [str(b).strip() for b in data.get("bullets", []) or [] if str(b).strip()]
+    lines = [headline] if headline else []
+    lines.extend(f"- {b}" for b in bullets)
+    return "\n".join(lines)
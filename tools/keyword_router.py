@@ -0,0 +1,64 @@
+"""
+Keyword-based intent dispatch for domain agents.
+
+Agents map queries to handlers with rules such as "contains 'invoices' and
+('list' or 'show')".  Evaluating those as chains of `in` checks rescans the
+query once per keyword.  `KeywordRouter` compiles every keyword of a rule
+table into a single regular expression, collects all hits in one pass as a
+bitmask and then picks the first rule whose keyword groups are satisfied.
+
+Matching keeps plain substring semantics: a hit on a keyword also counts as
+a hit on every other keyword it contains (e.g. "invoices" implies "invoice").
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class KeywordRouter:
+    """Dispatch table of `(handler, keyword groups)` rules.
+
+    A rule matches when the query contains at least one keyword from every
+    one of its groups.  Rules are tried in order and the handler of the first
+    matching rule is returned.
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, Sequence[Sequence[str]]]]) -> None:
+        keywords = sorted(
+            {kw for _, groups in rules for group in groups for kw in group},
+            key=len,
+            reverse=True,
+        )
+        bits = {kw: 1 << i for i, kw in enumerate(keywords)}
+        # Longest-first alternation inside a lookahead finds the longest
+        # keyword starting at every position; shorter keywords contained in it
+        # are covered by the implied mask.
+        self._implied: Dict[str, int] = {
+            kw: sum(bit for other, bit in bits.items() if other in kw) for kw in keywords
+        }
+        self._pattern = re.compile(
+            "(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))"
+        ) if keywords else None
+        self._rules: List[Tuple[str, Tuple[int, ...]]] = [
+            (handler, tuple(sum(bits[kw] for kw in group) for group in groups))
+            for handler, groups in rules
+        ]
+
+    def scan(self, text: str) -> int:
+        """Return the bitmask of keywords occurring in `text`."""
+        hits = 0
+        if self._pattern is not None:
+            implied = self._implied
+            for match in self._pattern.finditer(text):
+                hits |= implied[match.group(1)]
+        return hits
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the handler of the first rule satisfied by `text`, if any."""
+        hits = self.scan(text)
+        for handler, masks in self._rules:
+            if all(hits & mask for mask in masks):
+                return handler
+        return None
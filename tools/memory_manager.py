@@ -8,79 +8,171 @@ and other memory-related functionality for the agent system.
 from __future__ import annotations
 
 import json
+import sqlite3
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import database
 
 
+# Statements used by ConversationBuffer
+# Timestamps come from SQLite's clock, in the same format as `database.utc_now()`
+_SQL_INSERT_MESSAGE = "INSERT INTO messages (conversation_id, sender, content, created_at) VALUES (?, ?, ?, datetime('now'))"
+_SQL_INSERT_CONVERSATION = "INSERT INTO conversations (user_id, started_at) VALUES (?, datetime('now'))"
+# Newest `limit` messages of a conversation, and one page of its full
+# history after a (created_at, id) position, oldest first
+_SQL_LATEST_MESSAGES = (
+    "SELECT sender, content, created_at FROM messages WHERE conversation_id = ? "
+    "ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+_SQL_MESSAGES_PAGE = (
+    "SELECT sender, content, created_at, id FROM messages "
+    "WHERE conversation_id = ? AND (created_at, id) > (?, ?) "
+    "ORDER BY created_at, id LIMIT ?"
+)
+_SQL_TRIM_MESSAGES = """DELETE FROM messages WHERE conversation_id = ? AND id NOT IN (
+    SELECT id FROM messages WHERE conversation_id = ?
+    ORDER BY created_at DESC, id DESC LIMIT ?
+)"""
+
+# Key-value statements shared by EntityMemory and GlobalState.  Customer 0
+# holds system-wide values.
+_SQL_KV_UPSERT = "INSERT OR REPLACE INTO customer_kv (customer_id, key, value) VALUES (?, ?, ?)"
+_SQL_KV_GET = "SELECT value FROM customer_kv WHERE customer_id = ? AND key = ?"
+_SQL_KV_ALL = "SELECT key, value FROM customer_kv WHERE customer_id = ?"
+_SQL_KV_ALL_MANY = (
+    "SELECT customer_id, key, value FROM customer_kv "
+    "WHERE customer_id IN (SELECT value FROM json_each(?))"
+)
+
+
+def kv_upsert(customer_id: int, key: str, value: str, cur: Optional[sqlite3.Cursor] = None) -> None:
+    """Set `key` to `value` for `customer_id` in `customer_kv`.
+
+    Pass the cursor of an open `database.transaction()` as `cur` to make the
+    write part of that transaction instead of committing it on its own.  The
+    caller then calls `note_kv_write()` once the transaction has committed;
+    noting it earlier would let a concurrent read cache the old rows as
+    current.
+    """
+    if cur is None:
+        database.execute(_SQL_KV_UPSERT, (customer_id, key, value))
+    else:
+        cur.execute(_SQL_KV_UPSERT, (customer_id, key, value))
+
+
+def note_kv_write() -> None:
+    """Invalidate cached reads of `customer_kv` after a committed `kv_upsert(cur=...)`."""
+    database.note_write(_SQL_KV_UPSERT)
+
+
+def kv_get(customer_id: int, key: str) -> Optional[str]:
+    """Return the value of `key` for `customer_id`, or None."""
+    row = database.query_one(_SQL_KV_GET, (customer_id, key))
+    return row["value"] if row else None
+
+
 class ConversationBuffer:
-    """Manages conversation history with a sliding window buffer."""
+    """Manages conversation history with a sliding window buffer.
+
+    Old messages are deleted once every `trim_every` added messages rather
+    than after each one; readers only ever look at the newest
+    `max_messages`, so the few extra rows in between are never seen.
+    """
     
-    def __init__(self, max_messages: int = 5):
+    def __init__(self, max_messages: int = 5, trim_every: int = 4):
         self.max_messages = max_messages
+        self.trim_every = trim_every
+        # conversation id -> messages added since its last trim
+        self._untrimmed: Dict[int, int] = {}
+        self._lock = threading.Lock()
     
     def add_message(self, conversation_id: int, sender: str, content: str) -> None:
         """Add a message to the conversation buffer."""
+        self.add_messages(conversation_id, [(sender, content)])
+    
+    def add_messages(self, conversation_id: int, messages: List[Tuple[str, str]]) -> None:
+        """Add several `(sender, content)` messages in one transaction.
+
+        The inserts and, when due, the trim to `max_messages` share a single
+        commit.
+        """
+        with self._lock:
+            added = self._untrimmed.get(conversation_id, 0) + len(messages)
+            trim = added >= self.trim_every
+            if trim:
+                self._untrimmed.pop(conversation_id, None)
+            else:
+                self._untrimmed[conversation_id] = added
         try:
-            # Insert the new message
-            database.execute(
-                "INSERT INTO messages (conversation_id, sender, content, created_at) VALUES (?, ?, ?, ?)",
-                (conversation_id, sender, content, datetime.now().isoformat())
-            )
-            
-            # Keep only the last max_messages for this conversation
-            self._trim_conversation(conversation_id)
-            
-        except Exception as e:
-            print(f"Warning: Failed to add message to buffer: {e}")
-    
-    def _trim_conversation(self, conversation_id: int) -> None:
-        """Keep only the last N messages for a conversation."""
-        try:
-            # Get message count for this conversation
-            count_result = database.query(
-                "SELECT COUNT(*) as count FROM messages WHERE conversation_id = ?",
-                (conversation_id,)
-            )
-            
-            if count_result and count_result[0]["count"] > self.max_messages:
-                # Delete oldest messages, keeping only the last max_messages
-                database.execute(
-                    """DELETE FROM messages WHERE conversation_id = ? AND id NOT IN (
-                        SELECT id FROM messages WHERE conversation_id = ? 
-                        ORDER BY created_at DESC LIMIT ?
-                    )""",
-                    (conversation_id, conversation_id, self.max_messages)
+            with database.transaction() as cur:
+                cur.executemany(
+                    _SQL_INSERT_MESSAGE,
+                    [(conversation_id, sender, content) for sender, content in messages]
                 )
-        except Exception as e:
-            print(f"Warning: Failed to trim conversation: {e}")
+                if trim:
+                    # Keep only the last max_messages for this conversation
+                    cur.execute(_SQL_TRIM_MESSAGES, (conversation_id, conversation_id, self.max_messages))
+            database.note_write(_SQL_INSERT_MESSAGE)
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to add messages to buffer: {e}")
+    
+    def iter_history(
+        self,
+        conversation_id: int,
+        limit: Optional[int] = None,
+        page_size: int = 50
+    ) -> Iterator[Tuple[str, str, str]]:
+        """Yield `(sender, content, created_at)` for a conversation, oldest first.
+
+        With `limit`, only the newest `limit` messages are read, in a single
+        query.  Without it, the full history is fetched `page_size` rows at a
+        time, each page continuing after the last (created_at, id) seen, so
+        callers that stop early never load the rest.
+        """
+        if limit is not None:
+            _, rows = database.query_tuples(_SQL_LATEST_MESSAGES, (conversation_id, limit))
+            yield from reversed(rows)
+            return
+        after: Tuple[str, int] = ("", 0)
+        while True:
+            _, rows = database.query_tuples(_SQL_MESSAGES_PAGE, (conversation_id, *after, page_size))
+            for sender, content, created_at, _id in rows:
+                yield sender, content, created_at
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][2], rows[-1][3])
     
     def get_conversation_history(self, conversation_id: int) -> List[Dict[str, Any]]:
-        """Get the conversation history for a conversation ID."""
+        """Get the last `max_messages` messages of a conversation, oldest first."""
         try:
-            messages = database.query(
-                "SELECT sender, content, created_at FROM messages WHERE conversation_id = ? "
-                "ORDER BY created_at ASC",
-                (conversation_id,)
-            )
-            return messages or []
-        except Exception as e:
+            return [
+                {"sender": sender, "content": content, "created_at": created_at}
+                for sender, content, created_at in self.iter_history(conversation_id, self.max_messages)
+            ]
+        except sqlite3.Error as e:
             print(f"Warning: Failed to get conversation history: {e}")
             return []
     
     def get_conversation_context(self, conversation_id: int) -> str:
         """Get formatted conversation context for LLM prompts."""
-        messages = self.get_conversation_history(conversation_id)
+        # The header is the first line, so the context is built with a
+        # single join and no further concatenation
+        lines = ["Previous conversation:"]
+        try:
+            lines.extend(
+                f"{sender}: {content}"
+                for sender, content, _ in self.iter_history(conversation_id, self.max_messages)
+            )
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to get conversation history: {e}")
+            del lines[1:]
         
-        if not messages:
+        if len(lines) == 1:
             return "No previous conversation context."
         
-        context_lines = []
-        for msg in messages:
-            context_lines.append(f"{msg['sender']}: {msg['content']}")
-        
-        return "Previous conversation:\n" + "\n".join(context_lines)
+        return "\n".join(lines)
 
 
 class EntityMemory:
@@ -90,23 +182,16 @@ class EntityMemory:
     def set_customer_attribute(customer_id: int, key: str, value: str) -> None:
         """Set an attribute for a customer."""
         try:
-            database.execute(
-                "INSERT OR REPLACE INTO customer_kv (customer_id, key, value) VALUES (?, ?, ?)",
-                (customer_id, key, value)
-            )
-        except Exception as e:
+            kv_upsert(customer_id, key, value)
+        except sqlite3.Error as e:
             print(f"Warning: Failed to set customer attribute: {e}")
     
     @staticmethod
     def get_customer_attribute(customer_id: int, key: str) -> Optional[str]:
         """Get an attribute for a customer."""
         try:
-            result = database.query(
-                "SELECT value FROM customer_kv WHERE customer_id = ? AND key = ?",
-                (customer_id, key)
-            )
-            return result[0]["value"] if result else None
-        except Exception as e:
+            return kv_get(customer_id, key)
+        except sqlite3.Error as e:
             print(f"Warning: Failed to get customer attribute: {e}")
             return None
     
@@ -114,14 +199,27 @@ class EntityMemory:
     def get_customer_profile(customer_id: int) -> Dict[str, str]:
         """Get all attributes for a customer."""
         try:
-            results = database.query(
-                "SELECT key, value FROM customer_kv WHERE customer_id = ?",
-                (customer_id,)
-            )
-            return {result["key"]: result["value"] for result in results} if results else {}
-        except Exception as e:
+            _, rows = database.query_tuples(_SQL_KV_ALL, (customer_id,))
+        except sqlite3.Error as e:
             print(f"Warning: Failed to get customer profile: {e}")
             return {}
+        return dict(rows)
+    
+    @staticmethod
+    def get_customer_profiles(customer_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """Get all attributes for several customers with a single query.
+
+        Customers without attributes map to an empty dict.
+        """
+        profiles: Dict[int, Dict[str, str]] = {customer_id: {} for customer_id in customer_ids}
+        try:
+            _, rows = database.query_tuples(_SQL_KV_ALL_MANY, (json.dumps(list(profiles)),))
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to get customer profiles: {e}")
+            return profiles
+        for customer_id, key, value in rows:
+            profiles[customer_id][key] = value
+        return profiles
     
     @staticmethod
     def update_last_contact(customer_id: int) -> None:
@@ -152,12 +250,9 @@ class ConversationManager:
     def start_conversation(self, user_id: int = 1) -> int:
         """Start a new conversation and return its ID."""
         try:
-            cursor = database.execute(
-                "INSERT INTO conversations (user_id, started_at) VALUES (?, ?)",
-                (user_id, datetime.now().isoformat())
-            )
+            cursor = database.execute(_SQL_INSERT_CONVERSATION, (user_id,))
             return cursor.lastrowid
-        except Exception as e:
+        except sqlite3.Error as e:
             print(f"Warning: Failed to start conversation: {e}")
             return 1  # Fallback to conversation ID 1
     
@@ -169,6 +264,10 @@ class ConversationManager:
         """Add an agent response to the conversation."""
         self.buffer.add_message(conversation_id, agent_name, response)
     
+    def add_turn(self, conversation_id: int, message: str, response: str, agent_name: str = "system") -> None:
+        """Add a user message and the agent's response with a single commit."""
+        self.buffer.add_messages(conversation_id, [("user", message), (agent_name, response)])
+    
     def get_context_for_agent(self, conversation_id: int) -> str:
         """Get formatted context for agent processing."""
         return self.buffer.get_conversation_context(conversation_id)
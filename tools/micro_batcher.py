@@ -0,0 +1,89 @@
+"""
+Micro-batching of concurrent async requests.
+
+`MicroBatcher` collects items submitted from concurrent coroutines and hands
+them to a batch handler together: a background task waits for the first item,
+keeps collecting until `max_batch` items are queued or `max_wait` seconds have
+passed, and then dispatches the batch.  The router uses it to classify the
+queries of concurrent chats with one LLM request instead of one each.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+
+class MicroBatcher:
+    """Group concurrent `submit()` calls into batches for `handler`.
+
+    `handler` receives a list of items and must return a list of the same
+    length with one result per item.  A result that is an exception instance
+    is raised to that item's caller only; an exception raised by `handler`
+    itself is raised to every caller in the batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        max_batch: int = 16,
+        max_wait: float = 0.02,
+    ) -> None:
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch and return its result."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues and tasks belong to one event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._collect())
+        future = loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch in the background so the next batch can form meanwhile
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        # Callers that have gone away (e.g. a disconnected client) are dropped
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -7,38 +7,134 @@ instead of traditional machine learning models for simplicity.
 
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from llm import call_gemini_prompt
+import numpy as np
 
+from llm import acall_gemini_prompt, call_gemini_prompt
+from tools.fast_json import extract_json
 
-class LeadScoringTool:
-    """LLM-based lead scoring tool."""
-    
-    @staticmethod
-    def score_lead(
-        customer_name: str,
-        contact_email: str,
-        message: str = "",
-        company_info: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Score a lead using LLM analysis."""
-        
-        # Prepare context for LLM
-        context = f"""
-Lead Information:
-- Customer Name: {customer_name}
-- Email: {contact_email}
-- Message/Inquiry: {message or "No message provided"}
-"""
-        
-        if company_info:
-            context += f"\nCompany Information:\n"
-            for key, value in company_info.items():
-                context += f"- {key}: {value}\n"
-        
-        prompt = f"""
+
+# LLM calls in flight at once for the batch helpers; matches the number of
+# server slots when `LLM_SLOTS` is set (see llm._chat_payload)
+_LLM_CONCURRENCY = int(os.environ.get("LLM_SLOTS") or 4)
+
+
+# LLM replies remembered by `_call_cached`, keyed by a SHA-256 of the prompt:
+# re-scoring the same lead or re-forecasting the same history (e.g. on a
+# dashboard refresh) is answered without another LLM call
+_LLM_CACHE_SIZE = 1024
+_llm_cache: "OrderedDict[str, str]" = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+def _cache_lookup(prompt: str) -> Tuple[str, Optional[str]]:
+    """Return the cache key of `prompt` and its cached reply, if any."""
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    with _llm_cache_lock:
+        text = _llm_cache.get(key)
+        if text is not None:
+            _llm_cache.move_to_end(key)
+    return key, text
+
+
+def _cache_store(key: str, text: str) -> None:
+    with _llm_cache_lock:
+        _llm_cache[key] = text
+        if len(_llm_cache) > _LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+
+
+def _call_cached(prompt: str, parse: Callable[[str], T]) -> T:
+    """Send `prompt` to the LLM and return `parse` of the reply.
+
+    Replies are only cached once `parse` accepts them, so a malformed reply
+    is never served again.  Cached replies are parsed anew on each call, so
+    callers may modify the result.
+    """
+    key, text = _cache_lookup(prompt)
+    if text is not None:
+        return parse(text)
+    text = call_gemini_prompt(prompt)
+    result = parse(text)
+    _cache_store(key, text)
+    return result
+
+
+async def _acall_cached(prompt: str, parse: Callable[[str], T]) -> T:
+    """Async counterpart of :func:`_call_cached`."""
+    key, text = _cache_lookup(prompt)
+    if text is not None:
+        return parse(text)
+    text = await acall_gemini_prompt(prompt)
+    result = parse(text)
+    _cache_store(key, text)
+    return result
+
+
+async def _gather_limited(calls: List[Awaitable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Await `calls` concurrently, at most `_LLM_CONCURRENCY` at a time."""
+    limit = asyncio.Semaphore(_LLM_CONCURRENCY)
+
+    async def limited(call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        async with limit:
+            return await call
+
+    return await asyncio.gather(*(limited(call) for call in calls))
+
+
+# Items per LLM call for the packed batch helpers
+_PACKED_CHUNK_SIZE = 20
+
+
+async def _acall_packed(instructions: str, items: Dict[str, str], chunk_size: int) -> Dict[str, Dict[str, Any]]:
+    """Ask the LLM about many items with one call per `chunk_size` of them.
+
+    Each call sends `instructions` once followed by the items, each under
+    its `[key]` heading, and expects a JSON object mapping every key to its
+    result object.  The shared instructions are paid for once per chunk
+    instead of once per item.  Keys missing from a reply, or from a chunk
+    whose call failed, are missing from the returned dict.
+    """
+    keys = list(items)
+
+    async def call(chunk: List[str]) -> Dict[str, Any]:
+        prompt = instructions + "\n\n" + "\n\n".join(f"[{key}]\n{items[key]}" for key in chunk)
+        try:
+            reply = await _acall_cached(prompt, extract_json)
+        except Exception as e:
+            print(f"Warning: Packed LLM call failed: {e}")
+            return {}
+        if not isinstance(reply, dict):
+            return {}
+        return {key: reply[key] for key in chunk if isinstance(reply.get(key), dict)}
+
+    results = await _gather_limited([call(keys[i:i + chunk_size]) for i in range(0, len(keys), chunk_size)])
+    merged: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+# Rule-based features for bulk lead scoring, following the LLM rubric below
+_GENERIC_EMAIL_DOMAINS = np.array([
+    "gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "aol.com",
+    "icloud.com", "live.com", "protonmail.com", "example.com",
+])
+_COMPANY_MARKERS = (" inc", " llc", " ltd", " corp", " co.", " gmbh", " group", " solutions", " technologies")
+_INTENT_MARKERS = ("quote", "pricing", "price", "demo", "order", "purchase", "budget", "contract", "units", "licen")
+
+
+# Prompt bodies, filled in with str.format (literal braces are doubled)
+_LEAD_PROMPT_TMPL = """
 You are a lead scoring expert. Analyze the following lead and provide a score from 0.0 to 1.0 based on these criteria:
 
 {context}
@@ -59,52 +155,8 @@ Provide your analysis in JSON format:
     "next_actions": ["Schedule follow-up call", "Send product information"]
 }}
 """
-        
-        try:
-            response = call_gemini_prompt(prompt)
-            # Try to parse JSON response
-            result = json.loads(response.strip())
-            
-            # Ensure score is within bounds
-            score = max(0.0, min(1.0, result.get("score", 0.5)))
-            result["score"] = score
-            
-            return result
-            
-        except Exception as e:
-            print(f"Warning: Lead scoring failed: {e}")
-            # Fallback scoring
-            return {
-                "score": 0.5,
-                "confidence": "low",
-                "reasoning": "Unable to analyze lead automatically",
-                "risk_factors": ["Analysis failed"],
-                "next_actions": ["Manual review required"]
-            }
-
 
-class AnomalyDetectionTool:
-    """LLM-based anomaly detection for financial transactions."""
-    
-    @staticmethod
-    def detect_anomalies(
-        transaction_data: List[Dict[str, Any]],
-        context: str = "financial_transaction"
-    ) -> Dict[str, Any]:
-        """Detect anomalies in transaction patterns using LLM analysis."""
-        
-        if not transaction_data:
-            return {"anomalies": [], "risk_level": "low", "summary": "No data to analyze"}
-        
-        # Prepare transaction summary for LLM
-        transactions_text = "Recent Transactions:\n"
-        for i, tx in enumerate(transaction_data[:10], 1):  # Limit to 10 most recent
-            amount = tx.get("amount", tx.get("total", 0))
-            date = tx.get("created_at", tx.get("date", "Unknown"))
-            customer = tx.get("customer_name", tx.get("customer", "Unknown"))
-            transactions_text += f"{i}. ${amount:.2f} - {customer} - {date}\n"
-        
-        prompt = f"""
+_ANOMALY_PROMPT_TMPL = """
 You are a financial fraud detection expert. Analyze these transaction patterns for anomalies:
 
 {transactions_text}
@@ -134,49 +186,8 @@ Provide analysis in JSON format:
 Risk levels: low, medium, high
 Anomaly types: unusual_amount, suspicious_timing, duplicate_transaction, round_amount, customer_anomaly
 """
-        
-        try:
-            response = call_gemini_prompt(prompt)
-            result = json.loads(response.strip())
-            return result
-            
-        except Exception as e:
-            print(f"Warning: Anomaly detection failed: {e}")
-            return {
-                "anomalies": [],
-                "risk_level": "unknown",
-                "summary": "Analysis failed",
-                "recommendations": ["Manual review required"]
-            }
 
-
-class ForecastingTool:
-    """LLM-based demand forecasting tool."""
-    
-    @staticmethod
-    def forecast_demand(
-        product_id: int,
-        historical_data: List[Dict[str, Any]],
-        forecast_period: int = 30
-    ) -> Dict[str, Any]:
-        """Forecast demand for a product using LLM analysis."""
-        
-        if not historical_data:
-            return {
-                "forecast": 0,
-                "confidence": "low",
-                "trend": "unknown",
-                "reasoning": "No historical data available"
-            }
-        
-        # Prepare historical data for LLM
-        history_text = f"Historical demand data for Product ID {product_id}:\n"
-        for i, record in enumerate(historical_data[-12:], 1):  # Last 12 records
-            quantity = record.get("quantity", record.get("demand", 0))
-            date = record.get("date", record.get("created_at", f"Period {i}"))
-            history_text += f"{i}. {quantity} units - {date}\n"
-        
-        prompt = f"""
+_FORECAST_PROMPT_TMPL = """
 You are a demand forecasting expert. Analyze this historical demand data and predict future demand:
 
 {history_text}
@@ -203,40 +214,628 @@ Provide forecast in JSON format:
 Confidence levels: low, medium, high
 Trends: increasing, decreasing, stable, volatile
 """
+
+_PACKED_LEAD_INSTRUCTIONS = """
+You are a lead scoring expert. Score each of the following leads from 0.0 to 1.0 based on these criteria:
+- Email quality (professional domain vs generic): 0.0-0.2
+- Company name/type (established vs individual): 0.0-0.2
+- Message quality (specific inquiry vs generic): 0.0-0.3
+- Contact information completeness: 0.0-0.1
+- Overall business potential: 0.0-0.2
+
+Respond with one JSON object mapping each lead's key to its analysis, for example:
+{"L0": {"score": 0.75, "confidence": "high", "reasoning": "...", "risk_factors": ["..."], "next_actions": ["..."]}}
+"""
+
+_PACKED_FORECAST_INSTRUCTIONS = """
+You are a demand forecasting expert. For each product below, a statistical model has forecast its total demand
+over the next {forecast_period} days from its historical demand data.  Explain each forecast, considering seasonal
+patterns, trends, recent changes and stability.
+
+Respond with one JSON object mapping each product's key to its explanation, for example:
+{{"P7": {{"seasonal_factor": 1.1, "reasoning": "...", "risk_factors": ["..."], "recommendations": ["..."]}}}}
+"""
+
+
+class LeadScoringTool:
+    """LLM-based lead scoring tool."""
+    
+    @staticmethod
+    def _lead_context(
+        customer_name: str,
+        contact_email: str,
+        message: str = "",
+        company_info: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Describe a lead for the scoring prompts."""
+        
+        # Prepare context for LLM
+        context = f"""
+Lead Information:
+- Customer Name: {customer_name}
+- Email: {contact_email}
+- Message/Inquiry: {message or "No message provided"}
+"""
+        
+        if company_info:
+            context += "\nCompany Information:\n" + "".join(
+                f"- {key}: {value}\n" for key, value in company_info.items()
+            )
+        
+        return context
+    
+    @staticmethod
+    def _build_prompt(
+        customer_name: str,
+        contact_email: str,
+        message: str = "",
+        company_info: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Build the lead scoring prompt."""
+        context = LeadScoringTool._lead_context(customer_name, contact_email, message, company_info)
+        return _LEAD_PROMPT_TMPL.format(context=context)
+    
+    @staticmethod
+    def _parse_response(response: str) -> Dict[str, Any]:
+        """Parse an LLM scoring reply, clamping the score to [0, 1]."""
+        result = extract_json(response)
+        
+        # Ensure score is within bounds
+        score = max(0.0, min(1.0, result.get("score", 0.5)))
+        result["score"] = score
+        
+        return result
+    
+    @staticmethod
+    def _fallback(e: Exception) -> Dict[str, Any]:
+        print(f"Warning: Lead scoring failed: {e}")
+        return {
+            "score": 0.5,
+            "confidence": "low",
+            "reasoning": "Unable to analyze lead automatically",
+            "risk_factors": ["Analysis failed"],
+            "next_actions": ["Manual review required"]
+        }
+    
+    @staticmethod
+    def score_lead(
+        customer_name: str,
+        contact_email: str,
+        message: str = "",
+        company_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Score a lead using LLM analysis."""
+        prompt = LeadScoringTool._build_prompt(customer_name, contact_email, message, company_info)
+        try:
+            return _call_cached(prompt, LeadScoringTool._parse_response)
+        except Exception as e:
+            return LeadScoringTool._fallback(e)
+    
+    @staticmethod
+    async def ascore_lead(
+        customer_name: str,
+        contact_email: str,
+        message: str = "",
+        company_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`score_lead`."""
+        prompt = LeadScoringTool._build_prompt(customer_name, contact_email, message, company_info)
+        try:
+            return await _acall_cached(prompt, LeadScoringTool._parse_response)
+        except Exception as e:
+            return LeadScoringTool._fallback(e)
+    
+    @staticmethod
+    async def ascore_leads_batch(leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score several leads with concurrent LLM calls.
+
+        Each lead is a dict with `customer_name`, `contact_email` and
+        optionally `message` and `company_info`.  Results are in the order
+        of `leads`; a failed call yields the usual fallback result.
+        """
+        return await _gather_limited([
+            LeadScoringTool.ascore_lead(
+                lead.get("customer_name", ""),
+                lead.get("contact_email", ""),
+                lead.get("message", ""),
+                lead.get("company_info"),
+            )
+            for lead in leads
+        ])
+
+    @staticmethod
+    async def ascore_leads_packed(
+        leads: List[Dict[str, Any]],
+        chunk_size: int = _PACKED_CHUNK_SIZE
+    ) -> List[Dict[str, Any]]:
+        """Score many leads with one LLM call per `chunk_size` leads.
+
+        Cheaper than `ascore_leads_batch` for large, non-interactive runs
+        such as scoring every new lead overnight, since the rubric is sent
+        once per chunk.  Leads the LLM gives no result for get the
+        rule-based score of `score_leads` with low confidence.
+        """
+        items = {
+            f"L{i}": LeadScoringTool._lead_context(
+                lead.get("customer_name", ""),
+                lead.get("contact_email", ""),
+                lead.get("message", ""),
+                lead.get("company_info"),
+            )
+            for i, lead in enumerate(leads)
+        }
+        replies = await _acall_packed(_PACKED_LEAD_INSTRUCTIONS, items, chunk_size)
+        rule_scores = LeadScoringTool.score_leads(
+            [lead.get("customer_name", "") for lead in leads],
+            [lead.get("contact_email", "") for lead in leads],
+            [lead.get("message", "") for lead in leads],
+        ) if len(replies) < len(leads) else None
+        results = []
+        for i in range(len(leads)):
+            reply = replies.get(f"L{i}")
+            if reply is not None:
+                try:
+                    reply["score"] = max(0.0, min(1.0, float(reply.get("score", 0.5))))
+                    results.append(reply)
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            results.append({
+                "score": float(rule_scores[i]) if rule_scores is not None else 0.5,
+                "confidence": "low",
+                "reasoning": "Rule-based score; no LLM result for this lead",
+                "risk_factors": ["Analysis failed"],
+                "next_actions": ["Manual review required"]
+            })
+        return results
+
+    @staticmethod
+    def score_leads(names: np.ndarray, emails: np.ndarray, messages: np.ndarray) -> np.ndarray:
+        """Score many leads at once with vectorised rule-based features.
+
+        Used for bulk imports, where one LLM call per lead is too slow.  The
+        weights follow the `score_lead` rubric: email quality 0.2, company
+        name 0.2, message quality 0.3, completeness 0.1 and business
+        potential 0.2.  Returns a float array of scores in [0, 1].
+        """
+        names = np.char.lower(np.char.strip(np.asarray(names, dtype=str)))
+        emails = np.char.lower(np.char.strip(np.asarray(emails, dtype=str)))
+        messages = np.char.lower(np.asarray(messages, dtype=str))
+
+        domains = np.char.partition(emails, "@")[:, 2]
+        valid_email = (np.char.find(emails, "@") > 0) & (np.char.find(domains, ".") > 0)
+        email_score = 0.1 * valid_email + 0.1 * (valid_email & ~np.isin(domains, _GENERIC_EMAIL_DOMAINS))
+
+        padded = np.char.add(" ", names)
+        company = np.zeros(names.shape, dtype=bool)
+        for marker in _COMPANY_MARKERS:
+            company |= np.char.find(padded, marker) >= 0
+        multi_word = np.char.count(names, " ") > 0
+        name_score = np.where(company, 0.2, np.where(multi_word, 0.1, 0.0))
+
+        intent = np.zeros(messages.shape, dtype=bool)
+        for marker in _INTENT_MARKERS:
+            intent |= np.char.find(messages, marker) >= 0
+        has_number = np.zeros(messages.shape, dtype=bool)
+        for digit in "0123456789":
+            has_number |= np.char.find(messages, digit) >= 0
+        message_score = 0.2 * np.minimum(np.char.str_len(messages) / 200.0, 1.0) + 0.1 * intent
+
+        completeness = 0.05 * (np.char.str_len(names) > 0) + 0.05 * valid_email
+        potential = 0.1 * intent + 0.1 * has_number
+
+        scores = email_score + name_score + message_score + completeness + potential
+        return np.round(np.clip(scores, 0.0, 1.0), 2)
+
+
+# Thresholds of the statistical anomaly screen: modified z-score (median and
+# MAD based, robust to the outliers it is looking for) and the smallest amount
+# whose roundness is worth flagging
+_ANOMALY_Z_THRESHOLD = 3.5
+_ROUND_AMOUNT_MIN = 1000.0
+# Currency symbols, thousands separators and spaces in text amounts ("$1,200"),
+# and the number a text value starts with ("12units" once spaces are gone)
+_AMOUNT_NOISE_RE = re.compile(r"[$€£,\s]")
+_LEADING_NUMBER_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def _parse_number(value: Any) -> float:
+    """Read a number from a record field.
+
+    Text such as "$1,200" or "12 units" is parsed, None and "" count as 0,
+    and anything else unreadable is NaN.
+    """
+    value = value or 0
+    if isinstance(value, str):
+        value = _AMOUNT_NOISE_RE.sub("", value) or 0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        match = _LEADING_NUMBER_RE.match(value) if isinstance(value, str) else None
+        return float(match.group()) if match else float("nan")
+
+
+class AnomalyDetectionTool:
+    """Anomaly detection for financial transactions.
+
+    Transactions are screened statistically with NumPy; the LLM is only
+    asked to review the flagged ones when `explain=True`.
+    """
+    
+    @staticmethod
+    def _build_prompt(transaction_data: List[Dict[str, Any]]) -> str:
+        """Build the anomaly detection prompt for non-empty `transaction_data`."""
+        
+        # Prepare transaction summary for LLM
+        lines = ["Recent Transactions:"]
+        for i, tx in enumerate(transaction_data[:10], 1):  # Limit to 10 most recent
+            amount = AnomalyDetectionTool._amount(tx)
+            date = tx.get("created_at", tx.get("date", "Unknown"))
+            customer = tx.get("customer_name", tx.get("customer", "Unknown"))
+            lines.append(f"{i}. ${amount:.2f} - {customer} - {date}")
+        transactions_text = "\n".join(lines) + "\n"
+        
+        return _ANOMALY_PROMPT_TMPL.format(transactions_text=transactions_text)
+    
+    @staticmethod
+    def _amount(tx: Dict[str, Any]) -> float:
+        """The transaction's amount (see `_parse_number`), NaN if unreadable."""
+        return _parse_number(tx.get("amount", tx.get("total", 0)))
+    
+    @staticmethod
+    def _screen(transaction_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Flag unusual, duplicate and round amounts in `transaction_data`.
+
+        Returns the same structure the LLM analysis does; `transaction_index`
+        is 1-based into `transaction_data`.  Transactions whose amount cannot
+        be read are left out of the screen.
+        """
+        amounts = np.fromiter(
+            (AnomalyDetectionTool._amount(tx) for tx in transaction_data),
+            dtype=np.float64,
+            count=len(transaction_data),
+        )
+        anomalies: List[Dict[str, Any]] = []
+
+        valid = amounts[~np.isnan(amounts)]
+        median = np.median(valid) if len(valid) else 0.0
+        mad = np.median(np.abs(valid - median)) if len(valid) else 0.0
+        if mad > 0:
+            z = 0.6745 * (amounts - median) / mad
+            for i in np.flatnonzero(np.abs(z) > _ANOMALY_Z_THRESHOLD):
+                anomalies.append({
+                    "transaction_index": int(i) + 1,
+                    "type": "unusual_amount",
+                    "severity": "high" if abs(z[i]) > 2 * _ANOMALY_Z_THRESHOLD else "medium",
+                    "description": f"Amount ${amounts[i]:.2f} is far from the typical ${median:.2f}",
+                })
+
+        customers = [str(tx.get("customer_name", tx.get("customer", ""))) for tx in transaction_data]
+        seen: Dict[Tuple[str, float], int] = {}
+        for i, key in enumerate(zip(customers, amounts.tolist())):
+            if np.isnan(key[1]):
+                continue
+            if key in seen:
+                anomalies.append({
+                    "transaction_index": i + 1,
+                    "type": "duplicate_transaction",
+                    "severity": "medium",
+                    "description": f"Same customer and amount ${key[1]:.2f} as transaction {seen[key] + 1}",
+                })
+            else:
+                seen[key] = i
+
+        for i in np.flatnonzero((amounts >= _ROUND_AMOUNT_MIN) & (amounts % 1000 == 0)):
+            anomalies.append({
+                "transaction_index": int(i) + 1,
+                "type": "round_amount",
+                "severity": "low",
+                "description": f"Round amount ${amounts[i]:.2f}",
+            })
+
+        anomalies.sort(key=lambda anomaly: anomaly["transaction_index"])
+        severities = {anomaly["severity"] for anomaly in anomalies}
+        risk_level = "high" if "high" in severities else "medium" if "medium" in severities else "low"
+        return {
+            "anomalies": anomalies,
+            "risk_level": risk_level,
+            "summary": (
+                f"{len(anomalies)} potential anomalies detected requiring review" if anomalies
+                else f"No anomalies detected in {len(transaction_data)} transactions"
+            ),
+            "recommendations": (
+                ["Review the flagged transactions"] if anomalies else ["No action required"]
+            ),
+        }
+    
+    @staticmethod
+    def _flagged(transaction_data: List[Dict[str, Any]], screen: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The flagged transactions, in order, for the LLM review prompt."""
+        indices = sorted({anomaly["transaction_index"] for anomaly in screen["anomalies"]})
+        return [transaction_data[i - 1] for i in indices]
+    
+    @staticmethod
+    def _merge_review(response: str, screen: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the LLM's summary and recommendations to the screen result."""
+        review = extract_json(response)
+        result = dict(screen)
+        for key in ("summary", "recommendations"):
+            if review.get(key):
+                result[key] = review[key]
+        return result
+    
+    @staticmethod
+    def detect_anomalies(
+        transaction_data: List[Dict[str, Any]],
+        context: str = "financial_transaction",
+        explain: bool = False
+    ) -> Dict[str, Any]:
+        """Detect anomalies in transaction patterns.
+
+        With `explain=True` and anything flagged, the flagged transactions
+        are sent to the LLM for a summary and recommendations.
+        """
         
+        if not transaction_data:
+            return {"anomalies": [], "risk_level": "low", "summary": "No data to analyze"}
+        
+        screen = AnomalyDetectionTool._screen(transaction_data)
+        if not (explain and screen["anomalies"]):
+            return screen
+        prompt = AnomalyDetectionTool._build_prompt(AnomalyDetectionTool._flagged(transaction_data, screen))
         try:
-            response = call_gemini_prompt(prompt)
-            result = json.loads(response.strip())
-            
-            # Ensure forecast is non-negative
-            forecast = max(0, result.get("forecast", 0))
-            result["forecast"] = forecast
-            
-            return result
-            
+            return _call_cached(prompt, lambda response: AnomalyDetectionTool._merge_review(response, screen))
         except Exception as e:
-            print(f"Warning: Demand forecasting failed: {e}")
-            # Simple fallback: average of recent demand
-            try:
-                recent_quantities = [
-                    record.get("quantity", record.get("demand", 0)) 
-                    for record in historical_data[-5:]
-                ]
-                avg_demand = sum(recent_quantities) / len(recent_quantities) if recent_quantities else 0
-                
-                return {
-                    "forecast": int(avg_demand),
-                    "confidence": "low",
-                    "trend": "stable",
-                    "reasoning": "Fallback to recent average due to analysis failure"
-                }
-            except:
-                return {
-                    "forecast": 0,
-                    "confidence": "low",
-                    "trend": "unknown",
-                    "reasoning": "Unable to generate forecast"
-                }
+            print(f"Warning: Anomaly review failed: {e}")
+            return screen
+    
+    @staticmethod
+    async def adetect_anomalies(
+        transaction_data: List[Dict[str, Any]],
+        context: str = "financial_transaction",
+        explain: bool = False
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`detect_anomalies`."""
+        
+        if not transaction_data:
+            return {"anomalies": [], "risk_level": "low", "summary": "No data to analyze"}
+        
+        screen = AnomalyDetectionTool._screen(transaction_data)
+        if not (explain and screen["anomalies"]):
+            return screen
+        prompt = AnomalyDetectionTool._build_prompt(AnomalyDetectionTool._flagged(transaction_data, screen))
+        try:
+            return await _acall_cached(prompt, lambda response: AnomalyDetectionTool._merge_review(response, screen))
+        except Exception as e:
+            print(f"Warning: Anomaly review failed: {e}")
+            return screen
+
+
+# Smoothing factors of the Holt forecaster used by ForecastingTool
+_HOLT_ALPHA = 0.5
+_HOLT_BETA = 0.3
+# Trend damping, so a short-lived rise or fall is not projected indefinitely
+_HOLT_PHI = 0.9
+
+
+class ForecastingTool:
+    """Demand forecasting tool.
+
+    Forecasts are computed locally with Holt's linear exponential smoothing;
+    the LLM is only asked to explain a forecast when `explain=True`.
+    """
+    
+    @staticmethod
+    def _history_text(product_id: int, historical_data: List[Dict[str, Any]]) -> str:
+        """Describe the last 12 demand records of a product."""
+        lines = [f"Historical demand data for Product ID {product_id}:"]
+        for i, record in enumerate(historical_data[-12:], 1):  # Last 12 records
+            quantity = record.get("quantity", record.get("demand", 0))
+            date = record.get("date", record.get("created_at", f"Period {i}"))
+            lines.append(f"{i}. {quantity} units - {date}")
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _build_prompt(product_id: int, historical_data: List[Dict[str, Any]], forecast_period: int) -> str:
+        """Build the demand forecasting prompt for non-empty `historical_data`."""
+        history_text = ForecastingTool._history_text(product_id, historical_data)
+        return _FORECAST_PROMPT_TMPL.format(history_text=history_text, forecast_period=forecast_period)
+    
+    @staticmethod
+    def _numeric_forecast(historical_data: List[Dict[str, Any]], forecast_period: int) -> Dict[str, Any]:
+        """Forecast total demand over the next `forecast_period` periods.
+
+        Each record is one period (a day, matching `forecast_period` in
+        days).  Holt's method tracks a level and a damped trend; the forecast
+        is the sum of the projected per-period demand, floored at zero.  Trend and
+        confidence are derived from the fitted trend and the one-step-ahead
+        errors.  A negative `forecast_period` is treated as zero periods.
+        Records whose quantity cannot be read are skipped; with none left the
+        result is `_no_history()`.
+        """
+        forecast_period = max(forecast_period, 0)
+        quantities = np.fromiter(
+            (_parse_number(record.get("quantity", record.get("demand", 0))) for record in historical_data),
+            dtype=np.float64,
+            count=len(historical_data),
+        )
+        quantities = quantities[~np.isnan(quantities)]
+        if not len(quantities):
+            return ForecastingTool._no_history()
+        level, trend = quantities[0], 0.0
+        if len(quantities) > 1:
+            trend = quantities[1] - quantities[0]
+        errors = []
+        for value in quantities[1:]:
+            predicted = level + _HOLT_PHI * trend
+            errors.append(value - predicted)
+            previous_level = level
+            level = _HOLT_ALPHA * value + (1 - _HOLT_ALPHA) * predicted
+            trend = _HOLT_BETA * (level - previous_level) + (1 - _HOLT_BETA) * _HOLT_PHI * trend
+
+        damping = np.cumsum(np.full(forecast_period, _HOLT_PHI) ** np.arange(1, forecast_period + 1))
+        forecast = int(round(float(np.maximum(level + trend * damping, 0.0).sum())))
+        # Change of the projected demand by the end of the period
+        drift = trend * float(damping[-1]) if forecast_period > 0 else 0.0
+
+        mean = float(quantities.mean())
+        scale = max(abs(mean), 1.0)
+        relative_error = float(np.sqrt(np.mean(np.square(errors)))) / scale if errors else 1.0
+        if float(quantities.std()) / scale > 0.5:
+            direction = "volatile"
+        elif drift > 0.05 * scale:
+            direction = "increasing"
+        elif drift < -0.05 * scale:
+            direction = "decreasing"
+        else:
+            direction = "stable"
+        if len(quantities) >= 12 and relative_error < 0.2:
+            confidence = "high"
+        elif len(quantities) >= 6 and relative_error < 0.5:
+            confidence = "medium"
+        else:
+            confidence = "low"
+
+        return {
+            "forecast": forecast,
+            "confidence": confidence,
+            "trend": direction,
+            "reasoning": (
+                f"Holt exponential smoothing over {len(quantities)} periods: "
+                f"level {level:.1f} units per period, trend {trend:+.2f} per period"
+            ),
+        }
+    
+    @staticmethod
+    def _explain_prompt(
+        product_id: int,
+        historical_data: List[Dict[str, Any]],
+        forecast_period: int,
+        numeric: Dict[str, Any]
+    ) -> str:
+        """Build the prompt asking the LLM to explain a computed forecast."""
+        return ForecastingTool._build_prompt(product_id, historical_data, forecast_period) + (
+            f"\nA statistical model forecasts {numeric['forecast']} units in total "
+            f"({numeric['trend']} trend).  Use this number as \"forecast\" and explain it.\n"
+        )
+    
+    @staticmethod
+    def _merge_explanation(response: str, numeric: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine the LLM's explanation with the computed forecast, which wins."""
+        result = extract_json(response)
+        result.update(forecast=numeric["forecast"], trend=numeric["trend"], confidence=numeric["confidence"])
+        return result
+    
+    @staticmethod
+    def forecast_demand(
+        product_id: int,
+        historical_data: List[Dict[str, Any]],
+        forecast_period: int = 30,
+        explain: bool = False
+    ) -> Dict[str, Any]:
+        """Forecast demand for a product.
+
+        Each record of `historical_data` is taken to be one day's demand, and
+        "forecast" is the total demand over the next `forecast_period` days,
+        i.e. about `forecast_period` times the daily level.  Pass a period
+        of 1 for a one-record-ahead forecast when records are weekly or
+        monthly.  With `explain=True` the LLM adds reasoning, risk factors
+        and recommendations to the computed forecast.
+        """
+        
+        if not historical_data:
+            return ForecastingTool._no_history()
+        
+        numeric = ForecastingTool._numeric_forecast(historical_data, forecast_period)
+        if not explain:
+            return numeric
+        prompt = ForecastingTool._explain_prompt(product_id, historical_data, forecast_period, numeric)
+        try:
+            return _call_cached(prompt, lambda response: ForecastingTool._merge_explanation(response, numeric))
+        except Exception as e:
+            print(f"Warning: Forecast explanation failed: {e}")
+            return numeric
+    
+    @staticmethod
+    async def aforecast_demand(
+        product_id: int,
+        historical_data: List[Dict[str, Any]],
+        forecast_period: int = 30,
+        explain: bool = False
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`forecast_demand`."""
+        
+        if not historical_data:
+            return ForecastingTool._no_history()
+        
+        numeric = ForecastingTool._numeric_forecast(historical_data, forecast_period)
+        if not explain:
+            return numeric
+        prompt = ForecastingTool._explain_prompt(product_id, historical_data, forecast_period, numeric)
+        try:
+            return await _acall_cached(prompt, lambda response: ForecastingTool._merge_explanation(response, numeric))
+        except Exception as e:
+            print(f"Warning: Forecast explanation failed: {e}")
+            return numeric
+    
+    @staticmethod
+    async def aforecast_demand_batch(
+        histories: Dict[int, List[Dict[str, Any]]],
+        forecast_period: int = 30,
+        explain: bool = False
+    ) -> Dict[int, Dict[str, Any]]:
+        """Forecast several products, explaining them with concurrent LLM calls.
+
+        `histories` maps product IDs to their historical data; the result
+        maps the same IDs to their forecasts.
+        """
+        product_ids = list(histories)
+        results = await _gather_limited([
+            ForecastingTool.aforecast_demand(product_id, histories[product_id], forecast_period, explain)
+            for product_id in product_ids
+        ])
+        return dict(zip(product_ids, results))
+    
+    @staticmethod
+    async def aforecast_demand_packed(
+        histories: Dict[int, List[Dict[str, Any]]],
+        forecast_period: int = 30,
+        chunk_size: int = _PACKED_CHUNK_SIZE
+    ) -> Dict[int, Dict[str, Any]]:
+        """Forecast and explain many products with one LLM call per `chunk_size` products.
+
+        The packed counterpart of `aforecast_demand_batch(explain=True)`,
+        e.g. for the whole catalog.  Products without an LLM result keep the
+        computed forecast and its reasoning.
+        """
+        results = {
+            product_id: ForecastingTool._numeric_forecast(history, forecast_period) if history
+            else ForecastingTool._no_history()
+            for product_id, history in histories.items()
+        }
+        items = {
+            f"P{product_id}": (
+                ForecastingTool._history_text(product_id, history)
+                + f"Statistical forecast: {results[product_id]['forecast']} units ({results[product_id]['trend']} trend)\n"
+            )
+            for product_id, history in histories.items() if history
+        }
+        instructions = _PACKED_FORECAST_INSTRUCTIONS.format(forecast_period=forecast_period)
+        replies = await _acall_packed(instructions, items, chunk_size) if items else {}
+        for product_id, numeric in results.items():
+            reply = replies.get(f"P{product_id}")
+            if reply is not None:
+                results[product_id] = {**reply, **{k: numeric[k] for k in ("forecast", "trend", "confidence")}}
+        return results
+    
+    @staticmethod
+    def _no_history() -> Dict[str, Any]:
+        return {
+            "forecast": 0,
+            "confidence": "low",
+            "trend": "unknown",
+            "reasoning": "No historical data available"
+        }
 
 
 # Convenience functions for easy integration
@@ -246,6 +845,16 @@ def score_lead(customer_name: str, contact_email: str, message: str = "") -> flo
     return result.get("score", 0.5)
 
 
+def score_leads_batch(leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score several leads with concurrent LLM calls (see `LeadScoringTool.ascore_leads_batch`)."""
+    return asyncio.run(LeadScoringTool.ascore_leads_batch(leads))
+
+
+def score_leads_packed(leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score many leads with few LLM calls (see `LeadScoringTool.ascore_leads_packed`)."""
+    return asyncio.run(LeadScoringTool.ascore_leads_packed(leads))
+
+
 def detect_transaction_anomalies(transactions: List[Dict[str, Any]]) -> List[str]:
     """Quick anomaly detection returning list of anomaly descriptions."""
     result = AnomalyDetectionTool.detect_anomalies(transactions)
@@ -254,6 +863,22 @@ def detect_transaction_anomalies(transactions: List[Dict[str, Any]]) -> List[str
 
 
 def forecast_product_demand(product_id: int, history: List[Dict[str, Any]]) -> int:
-    """Quick demand forecasting returning forecasted quantity."""
+    """Quick demand forecasting returning forecasted quantity.
+
+    The quantity is the total over the next 30 days, with each `history`
+    record counted as one day (see `ForecastingTool.forecast_demand`).
+    """
     result = ForecastingTool.forecast_demand(product_id, history)
     return result.get("forecast", 0)
+
+
+def forecast_demand_batch(
+    histories: Dict[int, List[Dict[str, Any]]], forecast_period: int = 30, explain: bool = False
+) -> Dict[int, Dict[str, Any]]:
+    """Forecast several products (see `ForecastingTool.aforecast_demand_batch`)."""
+    return asyncio.run(ForecastingTool.aforecast_demand_batch(histories, forecast_period, explain))
+
+
+def forecast_demand_packed(histories: Dict[int, List[Dict[str, Any]]], forecast_period: int = 30) -> Dict[int, Dict[str, Any]]:
+    """Forecast and explain many products with few LLM calls (see `ForecastingTool.aforecast_demand_packed`)."""
+    return asyncio.run(ForecastingTool.aforecast_demand_packed(histories, forecast_period))
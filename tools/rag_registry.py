@@ -0,0 +1,49 @@
+"""
+Shared registry of RAG tool instances.
+
+Every agent searches the general `main_documents` collection and one
+domain-specific collection.  Creating a `VectorRAGTool` loads the embedding
+model and opens the vector store, so instead of each agent building its own
+copies at construction time, agents call `get_rag()` on first use and share
+one instance per collection.
+
+The shared tools are used from several worker threads at once, so their
+search paths must stay read-only: the embedding model, the ChromaDB
+collection and the BM25 index are only read after construction, and the
+BM25 index is built and swapped under its own lock.
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+
+from tools.vector_rag_tool import (
+    VectorRAGTool,
+    PolicyRAGTool,
+    DocRAGTool,
+    DefinitionRAGTool,
+    SalesRAGTool,
+)
+
+
+_DOMAIN_TOOLS = {
+    "policy_documents": PolicyRAGTool,
+    "business_documents": DocRAGTool,
+    "definition_documents": DefinitionRAGTool,
+    "sales_documents": SalesRAGTool,
+}
+
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _build(name: str) -> VectorRAGTool:
+    tool_cls = _DOMAIN_TOOLS.get(name)
+    return tool_cls() if tool_cls else VectorRAGTool(name)
+
+
+def get_rag(name: str) -> VectorRAGTool:
+    """Return the shared RAG tool for the collection `name`, creating it once."""
+    with _lock:
+        return _build(name)
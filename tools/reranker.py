@@ -0,0 +1,79 @@
+"""
+Cross-encoder reranking for RAG results.
+
+Dense retrieval alone often ranks loosely related passages highly, and every
+passage handed to the LLM costs prompt tokens.  Agents therefore oversample
+candidates from the vector store and use `rerank()` to keep only the few
+passages that a cross-encoder scores as most relevant to the query.
+
+When sentence-transformers is not installed (or the model cannot be
+loaded) the candidates keep their retrieval order and are simply truncated.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List
+
+try:
+    from sentence_transformers import CrossEncoder
+    HAS_CROSS_ENCODER = True
+except ImportError:
+    HAS_CROSS_ENCODER = False
+
+try:
+    import torch
+    HAS_TORCH = True
+except ImportError:
+    HAS_TORCH = False
+
+
+RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
+
+_model = None
+_model_failed = not HAS_CROSS_ENCODER
+_model_lock = threading.Lock()
+
+
+def _get_model():
+    """Load the cross-encoder once per process, or return None if unavailable."""
+    global _model, _model_failed
+    if _model is None and not _model_failed:
+        with _model_lock:
+            if _model is None and not _model_failed:
+                try:
+                    device = "cuda" if HAS_TORCH and torch.cuda.is_available() else "cpu"
+                    model = CrossEncoder(RERANKER_MODEL, device=device)
+                    if device == "cuda":
+                        model.model.half()
+                    _model = model
+                except Exception as e:
+                    print(f"Warning: Could not load reranker model: {e}")
+                    _model_failed = True
+    return _model
+
+
+def rerank(query: str, passages: List[Dict[str, Any]], k: int = 4) -> List[Dict[str, Any]]:
+    """Return the `k` passages most relevant to `query`.
+
+    `passages` are RAG search results as returned by `VectorRAGTool.search`;
+    each result's `excerpt` is scored against the query and the result's
+    `score` is replaced with the cross-encoder score.
+    """
+    if len(passages) <= 1:
+        return passages[:k]
+    model = _get_model()
+    if model is None:
+        return passages[:k]
+    pairs = [(query, p.get("excerpt", "")) for p in passages]
+    try:
+        if HAS_TORCH:
+            with torch.inference_mode():
+                scores = model.predict(pairs, show_progress_bar=False)
+        else:
+            scores = model.predict(pairs, show_progress_bar=False)
+    except Exception as e:
+        print(f"Warning: Reranking failed: {e}")
+        return passages[:k]
+    ranked = sorted(zip(scores, passages), key=lambda item: float(item[0]), reverse=True)
+    return [{**p, "score": float(s)} for s, p in ranked[:k]]
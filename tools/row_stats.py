@@ -0,0 +1,57 @@
+"""
+Aggregate statistics over query result rows.
+
+Retrieval answers only send a few sample rows to the LLM, so on large results
+the model cannot see totals or how records are distributed.  `summarise_rows`
+condenses all rows into a small dictionary instead: sum, min, max and mean of
+each numeric column and value counts of low-cardinality text columns such as
+`status` or `priority`.  Numeric columns are reduced with NumPy.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def summarise_rows(rows: List[Dict[str, Any]], max_categories: int = 10) -> Dict[str, Any]:
+    """Return `{"count", "numeric", "categories"}` aggregates for `rows`.
+
+    Identifier columns (`id`, `*_id`) are skipped.  A text column is only
+    counted when it has at most `max_categories` distinct values and repeats
+    at least one of them.
+    """
+    summary: Dict[str, Any] = {"count": len(rows)}
+    if not rows:
+        return summary
+    numeric: Dict[str, Dict[str, float]] = {}
+    categories: Dict[str, Dict[str, int]] = {}
+    for column in rows[0].keys():
+        if column == "id" or column.endswith("_id"):
+            continue
+        values = [row[column] for row in rows if row[column] is not None]
+        if not values:
+            continue
+        if all(_is_number(v) for v in values):
+            arr = np.fromiter(values, dtype=np.float64, count=len(values))
+            numeric[column] = {
+                "sum": round(float(arr.sum()), 2),
+                "min": round(float(arr.min()), 2),
+                "max": round(float(arr.max()), 2),
+                "mean": round(float(arr.mean()), 2),
+            }
+        elif all(isinstance(v, str) for v in values):
+            counts = Counter(values)
+            if len(counts) <= max_categories and len(counts) < len(values):
+                categories[column] = dict(counts.most_common())
+    if numeric:
+        summary["numeric"] = numeric
+    if categories:
+        summary["categories"] = categories
+    return summary
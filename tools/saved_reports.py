@@ -7,17 +7,192 @@ and provides templates for common business analytics.
 
 from __future__ import annotations
 
+import csv
+import functools
+import io
 import json
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import database
 from tools.analytics_tools import AnalyticsReportingTool, TextToSQLTool
+from tools.sql_tool import SQLTool
+
+
+# Full-text index over report titles, kept in sync with `saved_reports` by
+# triggers.  The table stores no text of its own (content='saved_reports').
+_SQL_FTS_SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS saved_reports_fts USING fts5("
+    "title, content='saved_reports', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS saved_reports_fts_ai AFTER INSERT ON saved_reports BEGIN "
+    "INSERT INTO saved_reports_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS saved_reports_fts_ad AFTER DELETE ON saved_reports BEGIN "
+    "INSERT INTO saved_reports_fts(saved_reports_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS saved_reports_fts_au AFTER UPDATE OF title ON saved_reports BEGIN "
+    "INSERT INTO saved_reports_fts(saved_reports_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+    "INSERT INTO saved_reports_fts(rowid, title) VALUES (new.id, new.title); END",
+]
+# Chart layout reused across executions (see `AnalyticsReportingTool.chart_template`)
+_SQL_ADD_CHART_TEMPLATE = "ALTER TABLE saved_reports ADD COLUMN chart_template TEXT"
+_SQL_SET_CHART_TEMPLATE = "UPDATE saved_reports SET chart_template = ? WHERE id = ?"
+_SQL_GET_REPORT = "SELECT id, title, sql, chart_template FROM saved_reports WHERE id = ?"
+_SQL_LIST_REPORTS = "SELECT id, title FROM saved_reports ORDER BY title"
+_SQL_FTS_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'saved_reports_fts'"
+_SQL_FTS_REBUILD = "INSERT INTO saved_reports_fts(saved_reports_fts) VALUES ('rebuild')"
+_SQL_SEARCH_REPORTS = (
+    "SELECT sr.id, sr.title FROM saved_reports sr "
+    "JOIN saved_reports_fts f ON f.rowid = sr.id "
+    "WHERE saved_reports_fts MATCH ? ORDER BY sr.title"
+)
+# Used when SQLite was built without FTS5
+_SQL_SEARCH_REPORTS_LIKE = "SELECT id, title FROM saved_reports WHERE title LIKE ? ORDER BY title"
+
+
+def _match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix.
+
+    Each word is quoted, so characters with a meaning in FTS5 syntax are
+    matched literally.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def _summaries(rows: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Basic report info for `(id, title)` rows, as returned by `list_all_reports`.
+
+    Each report is built as a single dict literal straight from the tuple,
+    without an intermediate `sqlite3.Row` or `dict(row)` copy.
+    """
+    return [
+        {
+            "id": report_id,
+            "title": title,
+            "name": title,
+            "description": f"Saved report: {title}",
+            "category": "general",
+            "chart_type": "table",
+        }
+        for report_id, title in rows
+    ]
+
+
+# Reports run at once by `execute_many`.  Each spends most of its time in
+# the chart LLM call and SQLite reads go through the reader pool, so the
+# threads do not wait on each other.
+_DASHBOARD_WORKERS = 8
+
+# DATE('now') and DATE('now', '<n> days') in report SQL.  They are replaced
+# with parameters bound to dates computed once per execution, so every date
+# in a report refers to the same day and the statement text stays the same
+# from day to day.
+_DATE_NOW_RE = re.compile(r"DATE\(\s*'now'\s*(?:,\s*'([+-]?\d+) days?'\s*)?\)", re.IGNORECASE)
+
+
+def _bind_dates(sql: str) -> Tuple[str, Tuple[int, ...]]:
+    """Replace DATE('now'...) calls with `?`; return the SQL and their day offsets."""
+    offsets: List[int] = []
+    
+    def placeholder(match: re.Match) -> str:
+        offsets.append(int(match.group(1) or 0))
+        return "?"
+    
+    return _DATE_NOW_RE.sub(placeholder, sql), tuple(offsets)
+
+
+def _date_params(offsets: Tuple[int, ...]) -> List[str]:
+    """Dates for `_bind_dates` offsets, relative to today in UTC like SQLite's 'now'."""
+    today = datetime.now(timezone.utc).date()
+    return [(today + timedelta(days=days)).isoformat() for days in offsets]
+
+
+# Report queries go through SQLTool's shared read cache.  With their dates
+# bound as parameters they are no longer volatile, so repeated executions
+# (dashboard refreshes) are served from memory until a table they read is
+# written to.
+_reports_sql = SQLTool("reports")
+
+# Rows written per chunk by `export_csv`
+_CSV_CHUNK_ROWS = 500
+
+# Default reports and the search index are set up on first use rather than
+# on import, so importing this module does not touch the database
+_init_done = False
+_init_lock = threading.Lock()
+
+
+def ensure_initialized() -> None:
+    """Run `SavedReportsManager.initialize_default_reports` once per process."""
+    global _init_done
+    if _init_done:
+        return
+    with _init_lock:
+        if _init_done:
+            return
+        try:
+            SavedReportsManager.initialize_default_reports()
+        except Exception as e:
+            print(f"Warning: Could not initialize saved reports: {e}")
+        _init_done = True
+
+
+@functools.lru_cache(maxsize=256)
+def _load_report(report_id: int, generation: Tuple[int, ...]) -> Optional[Dict[str, Any]]:
+    """Read a saved report; `generation` is only part of the cache key."""
+    row = database.query_one(_SQL_GET_REPORT, (report_id,))
+    if row is None:
+        return None
+    title, sql = row["title"], row["sql"]
+    bound_sql, date_offsets = _bind_dates(sql)
+    # Columns the table does not have get default values
+    return {
+        "id": row["id"],
+        "title": title,
+        "sql": sql,
+        "chart_template": row["chart_template"],
+        "name": title,
+        "description": f"Saved report: {title}",
+        "sql_template": sql,
+        "bound_sql": bound_sql,
+        "date_offsets": date_offsets,
+        "chart_type": "table",
+        "category": "general",
+        "parameters": [],
+    }
 
 
 class SavedReportsManager:
     """Manages saved reports and templates."""
     
+    @staticmethod
+    def ensure_search_index() -> None:
+        """Create the full-text search table and its triggers if missing.
+
+        A newly created index is filled from the existing reports.
+        """
+        try:
+            with database.transaction() as cur:
+                exists = cur.execute(_SQL_FTS_EXISTS).fetchone()
+                for statement in _SQL_FTS_SETUP:
+                    cur.execute(statement)
+                if not exists:
+                    cur.execute(_SQL_FTS_REBUILD)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not create report search index: {e}")
+    
+    @staticmethod
+    def ensure_chart_template_column() -> None:
+        """Add the `chart_template` column to databases created without it."""
+        try:
+            columns = {row["name"] for row in database.query("PRAGMA table_info(saved_reports)")}
+            if "chart_template" not in columns:
+                database.execute(_SQL_ADD_CHART_TEMPLATE)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not add chart_template column: {e}")
+    
     @staticmethod
     def initialize_default_reports() -> None:
         """Initialize the database with default predefined reports."""
@@ -88,83 +263,66 @@ class SavedReportsManager:
             }
         ]
         
+        SavedReportsManager.ensure_search_index()
+        SavedReportsManager.ensure_chart_template_column()
+        
         # Check if reports already exist
         existing = database.query("SELECT COUNT(*) as count FROM saved_reports", None)
         if existing and existing[0]["count"] > 0:
             print("Saved reports already initialized")
             return
         
-        # Insert default reports (using existing schema: id, title, sql)
-        for report in default_reports:
-            try:
-                # Use existing schema with title and sql columns
-                database.execute(
-                    "INSERT INTO saved_reports (title, sql) VALUES (?, ?)",
-                    (report["name"], report["sql_template"])
-                )
-            except Exception as e:
-                print(f"Warning: Failed to create report '{report['name']}': {e}")
+        # Insert default reports (using existing schema: id, title, sql) with
+        # a single commit
+        sql = "INSERT INTO saved_reports (title, sql) VALUES (?, ?)"
+        try:
+            with database.transaction() as cur:
+                cur.executemany(sql, [(report["name"], report["sql_template"]) for report in default_reports])
+            database.note_write(sql)
+        except Exception as e:
+            print(f"Warning: Failed to create default reports: {e}")
+            return
         
         print("Default saved reports initialized")
     
     @staticmethod
     def get_report_by_id(report_id: int) -> Optional[Dict[str, Any]]:
-        """Get a saved report by ID."""
+        """Get a saved report by ID.
+
+        Reports are cached until `saved_reports` is written to (see
+        `database.table_generations`); each call returns a fresh dict.
+        """
+        ensure_initialized()
         try:
-            results = database.query(
-                "SELECT id, title, sql FROM saved_reports WHERE id = ?",
-                (report_id,)
-            )
-            
-            if results:
-                report = dict(results[0])
-                # Add default values for missing columns
-                report["name"] = report["title"]
-                report["description"] = f"Saved report: {report['title']}"
-                report["sql_template"] = report["sql"]
-                report["chart_type"] = "table"  # Default chart type
-                report["category"] = "general"
-                report["parameters"] = []
-                return report
-            return None
-            
+            report = _load_report(report_id, database.table_generations(("saved_reports",)))
         except Exception as e:
             print(f"Warning: Failed to get report {report_id}: {e}")
             return None
+        return {**report, "parameters": []} if report else None
+    
+    @staticmethod
+    def invalidate_cache() -> None:
+        """Forget cached reports, e.g. after another process edited them."""
+        _load_report.cache_clear()
     
     @staticmethod
     def get_reports_by_category(category: str) -> List[Dict[str, Any]]:
-        """Get all reports in a category."""
-        try:
-            results = database.query(
-                "SELECT id, name, description, category FROM saved_reports WHERE category = ? ORDER BY name",
-                (category,)
-            )
-            return [dict(result) for result in results] if results else []
-            
-        except Exception as e:
-            print(f"Warning: Failed to get reports for category {category}: {e}")
+        """Get all reports in a category.
+
+        `saved_reports` has no category column; every report is listed as
+        "general" (see `list_all_reports`).
+        """
+        if category != "general":
             return []
+        return SavedReportsManager.list_all_reports()
     
     @staticmethod
     def list_all_reports() -> List[Dict[str, Any]]:
         """Get all saved reports with basic info."""
+        ensure_initialized()
         try:
-            results = database.query(
-                "SELECT id, title FROM saved_reports ORDER BY title",
-                None
-            )
-            
-            reports = []
-            for result in results:
-                report = dict(result)
-                report["name"] = report["title"]
-                report["description"] = f"Saved report: {report['title']}"
-                report["category"] = "general"
-                report["chart_type"] = "table"
-                reports.append(report)
-            
-            return reports
+            _, rows = database.query_tuples(_SQL_LIST_REPORTS)
+            return _summaries(rows)
             
         except Exception as e:
             print(f"Warning: Failed to list reports: {e}")
@@ -183,13 +341,8 @@ class SavedReportsManager:
             }
         
         try:
-            # Execute the SQL template
-            sql_query = report["sql_template"]
-            
-            # TODO: Parameter substitution could be added here if needed
-            # For now, we'll execute the template as-is
-            
-            data = database.query(sql_query, None)
+            # Execute the SQL template with its dates bound as parameters
+            data = _reports_sql.read(report["bound_sql"], _date_params(report["date_offsets"]))
             
             if not data:
                 return {
@@ -204,13 +357,20 @@ class SavedReportsManager:
                     "narrative": "No data found for this report at this time."
                 }
             
-            # Generate chart specification
-            chart_spec = AnalyticsReportingTool.generate_chart_spec(
-                data,
-                chart_type=report["chart_type"],
-                title=report["name"],
-                query_context=report["description"]
-            )
+            # The chart layout depends only on the report's columns, so it is
+            # generated once and reused for later executions
+            if report["chart_template"]:
+                chart_spec = AnalyticsReportingTool.apply_chart_template(
+                    json.loads(report["chart_template"]), data
+                )
+            else:
+                chart_spec = AnalyticsReportingTool.generate_chart_spec(
+                    data,
+                    chart_type=report["chart_type"],
+                    title=report["name"],
+                    query_context=report["description"]
+                )
+                SavedReportsManager._store_chart_template(report_id, chart_spec)
             
             # Generate narrative
             narrative = f"Report '{report['name']}' executed successfully. {report['description']}. Found {len(data)} records."
@@ -236,28 +396,100 @@ class SavedReportsManager:
                 "chart": None
             }
     
+    @staticmethod
+    def _store_chart_template(report_id: int, chart_spec: Dict[str, Any]) -> None:
+        """Save the layout of a generated chart spec for later executions."""
+        template = AnalyticsReportingTool.chart_template(chart_spec)
+        if template is None:
+            return
+        try:
+            database.execute(_SQL_SET_CHART_TEMPLATE, (json.dumps(template), report_id))
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save chart template for report {report_id}: {e}")
+    
+    @staticmethod
+    def execute_many(report_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Execute several saved reports concurrently, e.g. dashboard tiles.
+
+        Returns the `execute_report` result for each distinct ID, in the
+        order given.
+        """
+        ids = list(dict.fromkeys(report_ids))
+        if not ids:
+            return {}
+        ensure_initialized()
+        with ThreadPoolExecutor(max_workers=min(_DASHBOARD_WORKERS, len(ids))) as pool:
+            return dict(zip(ids, pool.map(SavedReportsManager.execute_report, ids)))
+    
+    @staticmethod
+    def export_csv(report_id: int) -> Optional[Iterator[str]]:
+        """Return the report's result as CSV text chunks, or None if it does not exist.
+
+        Rows are read with `database.iter_query` and written
+        `_CSV_CHUNK_ROWS` at a time, so a large result is never held in
+        memory as a list.  A pooled read connection stays checked out until
+        the iterator is exhausted or closed.
+        """
+        report = SavedReportsManager.get_report_by_id(report_id)
+        if not report:
+            return None
+        return _csv_chunks(report["bound_sql"], _date_params(report["date_offsets"]))
+    
     @staticmethod
     def search_reports(query: str) -> List[Dict[str, Any]]:
-        """Search reports by name or description."""
+        """Search reports by title.
+
+        Every word of `query` must start a word of the title.  The lookup
+        goes through the FTS5 index instead of scanning the table.
+        """
+        ensure_initialized()
+        match = _match_expression(query)
+        if not match:
+            return []
         try:
-            results = database.query(
-                "SELECT id, name, description, category FROM saved_reports "
-                "WHERE name LIKE ? OR description LIKE ? ORDER BY name",
-                (f"%{query}%", f"%{query}%")
-            )
-            return [dict(result) for result in results] if results else []
+            try:
+                _, rows = database.query_tuples(_SQL_SEARCH_REPORTS, (match,))
+            except sqlite3.OperationalError:
+                # No FTS5 (or no index yet): fall back to a substring scan
+                _, rows = database.query_tuples(_SQL_SEARCH_REPORTS_LIKE, (f"%{query}%",))
+            return _summaries(rows)
             
         except Exception as e:
             print(f"Warning: Failed to search reports: {e}")
             return []
 
 
+def _csv_chunks(sql: str, params: List[Any]) -> Iterator[str]:
+    """Run `sql` and yield its rows as CSV, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = database.iter_query(sql, params)
+    try:
+        for count, row in enumerate(rows, 1):
+            if count == 1:
+                writer.writerow(row.keys())
+            writer.writerow(row)
+            if count % _CSV_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        rows.close()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
 # Convenience functions
 def run_report(report_id: int) -> Dict[str, Any]:
     """Quick report execution."""
     return SavedReportsManager.execute_report(report_id)
 
 
+def run_reports(report_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Quick concurrent execution of several reports."""
+    return SavedReportsManager.execute_many(report_ids)
+
+
 def list_reports() -> List[Dict[str, Any]]:
     """Quick report listing."""
     return SavedReportsManager.list_all_reports()
@@ -266,10 +498,3 @@ def list_reports() -> List[Dict[str, Any]]:
 def find_reports(category: str) -> List[Dict[str, Any]]:
     """Quick category search."""
     return SavedReportsManager.get_reports_by_category(category)
-
-
-# Initialize reports on module import
-try:
-    SavedReportsManager.initialize_default_reports()
-except Exception as e:
-    print(f"Warning: Could not initialize saved reports: {e}")
@@ -0,0 +1,203 @@
+"""
+Semantic cache for LLM responses.
+
+Agents summarise raw query results with the LLM, and users frequently ask
+near-duplicate questions ("show invoices", "list invoices please").  This
+module keeps recent `(query embedding -> LLM response)` pairs in memory and
+looks them up with a random-projection LSH index, so a sufficiently similar
+question over the same underlying data is answered without another LLM
+round trip.  Repeats of the same question (after normalising case and
+punctuation) are found through an exact-match dictionary first, without
+computing an embedding.
+
+Embeddings come from sentence-transformers when it is installed; otherwise
+a hashed character-trigram vector is used, which still matches queries that
+differ only in casing, punctuation or small wording changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.sim_kernel import topk_cosine
+
+try:
+    from sentence_transformers import SentenceTransformer
+    HAS_ENCODER = True
+except ImportError:
+    HAS_ENCODER = False
+
+
+_FALLBACK_DIM = 512
+_WORD_RE = re.compile(r"[a-z0-9$]+")
+
+
+class SemanticCache:
+    """In-memory LLM response cache keyed by query embedding.
+
+    Each entry also stores a digest of the context (the raw data that was
+    summarised), and only entries with an identical digest can be returned,
+    so a cached answer is never served for different underlying data.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 15 * 60,
+        num_tables: int = 8,
+        num_bits: int = 16,
+        max_entries: int = 1024,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._model_failed = not HAS_ENCODER
+        self._planes: Optional[np.ndarray] = None
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(num_tables)]
+        # Vectors live in one contiguous matrix; entries refer to their row.
+        self._matrix: Optional[np.ndarray] = None
+        self._free_rows: List[int] = []
+        # entry id -> (matrix row, LSH signatures, context digest, response, created_at)
+        self._entries: Dict[int, Tuple[int, List[int], str, str, float]] = {}
+        # (normalised query, context digest) -> entry id, for exact repeats
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._exact_keys: Dict[int, Tuple[str, str]] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _normalise(text: str) -> str:
+        return " ".join(_WORD_RE.findall(text.lower()))
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalised embedding for `text`."""
+        normalised = self._normalise(text)
+        if not self._model_failed:
+            try:
+                if self._model is None:
+                    self._model = SentenceTransformer('all-MiniLM-L6-v2')
+                vector = np.asarray(self._model.encode(normalised), dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                return vector / norm if norm else vector
+            except Exception as e:
+                print(f"Warning: Semantic cache encoder unavailable, using trigram embeddings: {e}")
+                self._model_failed = True
+        vector = np.zeros(_FALLBACK_DIM, dtype=np.float32)
+        padded = f"  {normalised} "
+        for i in range(len(padded) - 2):
+            digest = hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % _FALLBACK_DIM] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _reset(self, dim: int) -> None:
+        """(Re)allocate the LSH planes and vector matrix for `dim`-d vectors."""
+        rng = np.random.default_rng(0)
+        self._planes = rng.standard_normal(
+            (self.num_tables, self.num_bits, dim)
+        ).astype(np.float32)
+        self._matrix = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+        self._tables = [{} for _ in range(self.num_tables)]
+        self._entries.clear()
+        self._exact.clear()
+        self._exact_keys.clear()
+
+    def _signatures(self, vector: np.ndarray) -> List[int]:
+        """Hash a vector into one `num_bits` bucket key per LSH table."""
+        if self._planes is None or self._planes.shape[-1] != vector.shape[0]:
+            self._reset(vector.shape[0])
+        bits = (self._planes @ vector) > 0
+        weights = 1 << np.arange(self.num_bits)
+        return [int(key) for key in bits.astype(np.int64) @ weights]
+
+    @staticmethod
+    def _digest(context: str) -> str:
+        return hashlib.sha1(context.encode("utf-8", "replace")).hexdigest()
+
+    def _remove(self, entry_id: int) -> None:
+        row, signatures = self._entries.pop(entry_id)[:2]
+        self._free_rows.append(row)
+        key = self._exact_keys.pop(entry_id, None)
+        if key is not None and self._exact.get(key) == entry_id:
+            del self._exact[key]
+        for table, key in zip(self._tables, signatures):
+            bucket = table.get(key)
+            if bucket and entry_id in bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del table[key]
+
+    def get(self, query: str, context: str = "") -> Optional[str]:
+        """Return a cached response for a similar query over the same context."""
+        digest = self._digest(context)
+        now = time.time()
+        with self._lock:
+            entry_id = self._exact.get((self._normalise(query), digest))
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                if now - entry[4] <= self.ttl_seconds:
+                    return entry[3]
+                self._remove(entry_id)
+        vector = self._embed(query)
+        with self._lock:
+            signatures = self._signatures(vector)
+            candidates = set()
+            for table, key in zip(self._tables, signatures):
+                candidates.update(table.get(key, ()))
+            live = []
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry[4] > self.ttl_seconds:
+                    self._remove(entry_id)
+                elif entry[2] == digest:
+                    live.append(entry)
+            if not live:
+                return None
+            rows, scores = topk_cosine(vector, self._matrix[[e[0] for e in live]], 1)
+            if scores[0] < self.threshold:
+                return None
+            return live[rows[0]][3]
+
+    def put(self, query: str, response: str, context: str = "") -> None:
+        """Store the LLM response for `query` over `context`."""
+        vector = self._embed(query)
+        with self._lock:
+            signatures = self._signatures(vector)
+            if not self._free_rows:
+                oldest = min(self._entries, key=lambda i: self._entries[i][4])
+                self._remove(oldest)
+            row = self._free_rows.pop()
+            self._matrix[row] = vector
+            entry_id = self._next_id
+            self._next_id += 1
+            digest = self._digest(context)
+            self._entries[entry_id] = (row, signatures, digest, response, time.time())
+            key = (self._normalise(query), digest)
+            self._exact[key] = entry_id
+            self._exact_keys[entry_id] = key
+            for table, key in zip(self._tables, signatures):
+                table.setdefault(key, []).append(entry_id)
+
+    def invalidate(self) -> None:
+        """Drop all cached responses, e.g. after a write to the database."""
+        with self._lock:
+            self._tables = [{} for _ in range(self.num_tables)]
+            self._entries.clear()
+            self._exact.clear()
+            self._exact_keys.clear()
+            self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+
+# Shared cache for agent summaries
+summary_cache = SemanticCache()
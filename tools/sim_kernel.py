@@ -0,0 +1,68 @@
+"""
+Similarity kernels for embedding lookups.
+
+`topk_cosine` scores a query vector against every row of a contiguous
+`float32[N, D]` matrix of L2-normalised vectors and returns the `k` best
+rows.  With numba installed the scoring loop is JIT-compiled and spread
+across cores; otherwise the same result is computed with NumPy.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cosine_jit(q, M, k):
+        n, d = M.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(d):
+                acc += M[i, j] * q[j]
+            scores[i] = acc
+        k = min(k, n)
+        order = np.argsort(-scores)[:k]
+        return order.astype(np.int32), scores[order]
+
+
+def _topk_cosine_numpy(q: np.ndarray, M: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    scores = M @ q
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1)[:k]
+    order = top[np.argsort(-scores[top])]
+    return order.astype(np.int32), scores[order]
+
+
+def topk_cosine(q: np.ndarray, M: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return `(row_indices, scores)` of the `k` rows of `M` most similar to `q`.
+
+    Both `q` and the rows of `M` must be L2-normalised so that the dot
+    product equals cosine similarity.  Results are ordered best first.
+    """
+    q = np.ascontiguousarray(q, dtype=np.float32)
+    M = np.ascontiguousarray(M, dtype=np.float32)
+    if M.shape[0] == 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    if HAS_NUMBA:
+        return _topk_cosine_jit(q, M, k)
+    return _topk_cosine_numpy(q, M, k)
+
+
+if HAS_NUMBA:
+    # Compile once at import so the first cache lookup does not pay for it
+    try:
+        _topk_cosine_jit(np.ones(4, dtype=np.float32), np.ones((2, 4), dtype=np.float32), 1)
+    except Exception as e:
+        print(f"Warning: Could not pre-compile similarity kernel: {e}")
@@ -22,11 +22,148 @@ sales_sql.write(
 
 from __future__ import annotations
 
-from typing import Any, List, Optional, Sequence, Tuple, Union
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import database
 
 
+# Every table a query reads is named after FROM, JOIN or a comma in a FROM
+# list.  Names after other commas (select lists, arguments) are picked up
+# too; they never have writes recorded, so they only lengthen the key.
+_TABLE_RE = re.compile(r"(?:\b(?:from|join)\s+|,\s*)[\"`\[]?(\w+)", re.IGNORECASE)
+# Results of these queries change between calls, so they are never cached
+_VOLATILE_RE = re.compile(r"random\s*\(|'now'|current_(?:date|time|timestamp)", re.IGNORECASE)
+
+
+class _ReadCache:
+    """Process-wide TTL-bounded LRU cache for SELECT results.
+
+    Entries are keyed by `(sql, params)` and remember the write generations of
+    the tables the query reads (see :func:`database.table_generations`), so
+    any write to one of those tables makes the entry stale.  Concurrent
+    callers issuing the same query share a single execution.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 256) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Tuple[Any, ...]], Tuple[float, Tuple[int, ...], List[dict]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Tuple[Any, ...]], Future] = {}
+        self._tables: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+
+    def _tables_for(self, sql: str) -> Tuple[str, ...]:
+        """Tables read by `sql`; call with `_lock` held."""
+        tables = self._tables.get(sql)
+        if tables is None:
+            tables = tuple(sorted({t.lower() for t in _TABLE_RE.findall(sql)}))
+            self._tables[sql] = tables
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+        else:
+            self._tables.move_to_end(sql)
+        return tables
+
+    def read(self, sql: str, params: Union[Sequence[Any], None], loader) -> List[dict]:
+        """Return cached rows for the query, calling `loader()` on a miss."""
+        if _VOLATILE_RE.search(sql):
+            return loader()
+        try:
+            # Generated SQL often differs only by surrounding whitespace or a
+            # trailing semicolon; those variants share one entry
+            key = (sql.strip().rstrip(";").rstrip(), tuple(params or ()))
+            hash(key)
+        except TypeError:
+            return loader()
+        with self._lock:
+            tables = self._tables_for(sql)
+            generations = database.table_generations(tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, stored_generations, rows = entry
+                if stored_generations == generations and time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return [dict(row) for row in rows]
+                del self._entries[key]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return [dict(row) for row in future.result()]
+
+        try:
+            rows = loader()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Generations were captured before the query ran, so a write that
+            # raced with it leaves this entry stale rather than wrong.
+            self._entries[key] = (time.monotonic(), generations, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.set_result(rows)
+        return [dict(row) for row in rows]
+
+
+_read_cache = _ReadCache()
+
+# The transaction opened by `SQLTool.transaction()` on the current thread
+_local = threading.local()
+
+
+class _Transaction:
+    """Reads and writes that share one database transaction.
+
+    Reads bypass the shared cache so they see the transaction's own writes;
+    the written tables are marked stale once the transaction commits.
+    """
+
+    def __init__(self, cur) -> None:
+        self._cur = cur
+        self.writes: List[str] = []
+
+    def read(self, sql: str, params: Union[Sequence[Any], None] = None) -> List[dict]:
+        self._cur.execute(sql, params or [])
+        rows = self._cur.fetchall()
+        if not self._cur.description:
+            return []
+        return database.tuples_to_dicts([d[0] for d in self._cur.description], rows)
+
+    def iter_read(self, sql: str, params: Union[Sequence[Any], None] = None) -> Iterator[Any]:
+        # A separate cursor, so writes in the same transaction do not reset it
+        cur = self._cur.connection.cursor()
+        try:
+            cur.execute(sql, params or [])
+            yield from cur
+        finally:
+            cur.close()
+
+    def write(self, sql: str, params: Union[Sequence[Any], None] = None) -> int:
+        self._cur.execute(sql, params or [])
+        self.writes.append(sql)
+        return self._cur.lastrowid
+
+    def write_many(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> int:
+        self._cur.executemany(sql, seq_of_params)
+        self.writes.append(sql)
+        return self._cur.rowcount
+
+
 class SQLTool:
     """A helper for executing SQL queries.
 
@@ -38,18 +175,97 @@ class SQLTool:
         self.name = name
 
     def read(self, sql: str, params: Union[Sequence[Any], None] = None) -> List[dict]:
-        """Execute a SELECT query and return the results as a list of dicts."""
-        rows = database.query(sql, params)
-        return database.to_dicts(rows)
+        """Execute a SELECT query and return the results as a list of dicts.
+
+        Results are served from a short-lived shared cache until one of the
+        tables the query reads from is written to.  Inside `transaction()`
+        the query runs in the open transaction instead.
+        """
+        tx = getattr(_local, "tx", None)
+        if tx is not None:
+            return tx.read(sql, params)
+        return _read_cache.read(sql, params, lambda: database.tuples_to_dicts(*database.query_tuples(sql, params)))
+
+    def iter_read(self, sql: str, params: Union[Sequence[Any], None] = None) -> Iterator[Any]:
+        """Execute a SELECT query and yield its rows lazily.
+
+        Rows are `sqlite3.Row` objects (indexable by column name) and are
+        never converted to dicts or cached, which suits large results that
+        are scanned once.  Call `dict(row)` where a dict is needed.  Inside
+        `transaction()` the query runs in the open transaction.
+        """
+        tx = getattr(_local, "tx", None)
+        if tx is not None:
+            return tx.iter_read(sql, params)
+        return database.iter_query(sql, params)
 
     def write(self, sql: str, params: Union[Sequence[Any], None] = None) -> int:
         """Execute an INSERT/UPDATE/DELETE query and return the last row ID.
 
         For statements that do not insert rows, SQLite sets `lastrowid` to
         the row ID of the most recent successful INSERT on the connection.
+
+        Inside `transaction()` on the same thread the statement joins the open
+        transaction: the row ID is available immediately and the commit
+        happens once, when the block exits.
         """
+        tx = getattr(_local, "tx", None)
+        if tx is not None:
+            return tx.write(sql, params)
         with database.transaction() as cur:
             cur.execute(sql, params or [])
             # `lastrowid` will be meaningful for INSERTs; for updates it will
             # reflect the last inserted row in the transaction.
-            return cur.lastrowid
+            row_id = cur.lastrowid
+        database.note_write(sql)
+        return row_id
+
+    def write_many(self, sql: str, seq_of_params: Iterable[Sequence[Any]]) -> int:
+        """Execute one statement for every parameter tuple with `executemany`.
+
+        All rows are written in a single transaction (or in the open
+        `transaction()` on this thread).  Returns the number of affected rows.
+        """
+        with self.transaction() as tx:
+            return tx.write_many(sql, seq_of_params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[_Transaction]:
+        """Run several reads and writes as one `BEGIN IMMEDIATE` transaction.
+
+        The write lock is taken up front, so rows read inside the block cannot
+        change before the block's writes, and everything is committed once
+        when the block exits (or rolled back if it raises).
+
+        ```python
+        with sql.transaction() as tx:
+            customer = tx.read("SELECT id FROM customers LIMIT 1")[0]
+            tx.write("INSERT INTO invoices (customer_id) VALUES (?)", (customer["id"],))
+        ```
+
+        Calls to `read()`/`write()` of any `SQLTool` on this thread join the
+        open transaction, and a nested `transaction()` block reuses it.
+        """
+        outer = getattr(_local, "tx", None)
+        if outer is not None:
+            yield outer
+            return
+        with database.transaction() as cur:
+            if not cur.connection.in_transaction:
+                cur.execute("BEGIN IMMEDIATE")
+            tx = _Transaction(cur)
+            _local.tx = tx
+            try:
+                yield tx
+            finally:
+                _local.tx = None
+        for sql in tx.writes:
+            database.note_write(sql)
+
+    async def aread(self, sql: str, params: Union[Sequence[Any], None] = None) -> List[dict]:
+        """Async variant of :meth:`read` that runs the query on a worker thread."""
+        return await asyncio.to_thread(self.read, sql, params)
+
+    async def awrite(self, sql: str, params: Union[Sequence[Any], None] = None) -> int:
+        """Async variant of :meth:`write` that runs the statement on a worker thread."""
+        return await asyncio.to_thread(self.write, sql, params)
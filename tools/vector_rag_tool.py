@@ -8,9 +8,21 @@ It provides domain-specific RAG tools for different business areas.
 
 from __future__ import annotations
 
+import asyncio
 import os
 import hashlib
-from typing import Dict, List, Optional, Any
+import functools
+import itertools
+import json
+import math
+import mmap
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Any, Tuple
 import numpy as np
 
 try:
@@ -22,17 +34,641 @@ except ImportError:
     HAS_VECTOR_DEPS = False
     print("Warning: Vector dependencies not installed. Install with: pip install sentence-transformers chromadb")
 
+try:
+    import torch
+    HAS_CUDA = torch.cuda.is_available()
+except ImportError:
+    HAS_CUDA = False
+
+try:
+    import onnxruntime as ort
+    HAS_ONNX = True
+except ImportError:
+    HAS_ONNX = False
+
+try:
+    import hnswlib
+    HAS_HNSWLIB = True
+except ImportError:
+    HAS_HNSWLIB = False
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
 import database
+from tools.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from tools.micro_batcher import MicroBatcher
+from tools.sim_kernel import topk_cosine
+
+
+_shared_lock = threading.Lock()
+
+BM25_INDEX_PATH = os.path.join("./vector_db", "bm25_index.json")
+# Chunk embeddings keyed by a hash of the chunk text (`_chunk_hash`), so
+# rebuilding a collection only encodes chunks that changed.  Like the query
+# embedding cache they are stored as float16: the vectors are unit length, so
+# half precision changes cosine scores by well under 1e-3 at half the size.
+EMBEDDING_CACHE_PATH = os.path.join("./vector_db", "emb_cache.npz")
+_embedding_cache_lock = threading.Lock()
+_bm25_index: Optional[BM25Index] = None
+_bm25_signature: Optional[str] = None
+_bm25_lock = threading.Lock()
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# ONNX exports tried in order: the int8 model for AVX-512 VNNI CPUs, then the
+# plain FP32 export.  Without onnxruntime the PyTorch model is used.
+_ONNX_FILE_NAMES = ("onnx/model_qint8_avx512_vnni.onnx", "onnx/model.onnx")
+# Texts per `encode()` batch: a GPU only pays off with large batches
+_CPU_BATCH_SIZE = 64
+_GPU_BATCH_SIZE = 256
+
+
+def _onnx_model_kwargs(file_name: str) -> Dict[str, Any]:
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = os.cpu_count() or 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return {
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": options,
+    }
+
+
+def _load_model(model_name: str):
+    """Load a sentence-transformer.
+
+    With a CUDA GPU the PyTorch model runs there in float16.  On CPU the ONNX
+    Runtime backend is preferred, with the int8-quantised export if the model
+    has one; `encode()` works the same with every backend.
+    """
+    if HAS_CUDA:
+        try:
+            return SentenceTransformer(model_name, device="cuda", model_kwargs={"torch_dtype": torch.float16})
+        except Exception as e:
+            print(f"Warning: Could not load model on GPU: {e}")
+    if HAS_ONNX:
+        for file_name in _ONNX_FILE_NAMES:
+            try:
+                return SentenceTransformer(model_name, backend="onnx", model_kwargs=_onnx_model_kwargs(file_name))
+            except Exception as e:
+                print(f"Warning: Could not load ONNX model {file_name}: {e}")
+    # Stay on CPU if loading onto the GPU failed above
+    return SentenceTransformer(model_name, device="cpu" if HAS_CUDA else None)
+
+
+def _encode_batch_size(model) -> int:
+    """`encode()` batch size for the device `model` runs on."""
+    device = getattr(model, "device", None)
+    return _GPU_BATCH_SIZE if getattr(device, "type", None) == "cuda" else _CPU_BATCH_SIZE
+
+
+# The encoder shared by every RAG tool: each domain tool has its own
+# collection, but the weights (and ONNX session) are loaded once per process
+_ENCODER = None
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """Return the shared `EMBEDDING_MODEL` encoder, loading it on first use."""
+    global _ENCODER
+    if _ENCODER is None:
+        with _encoder_lock:
+            if _ENCODER is None:
+                encoder = _load_model(EMBEDDING_MODEL)
+                # One throwaway inference pays for graph optimisation and
+                # first-run allocations here instead of in the first search
+                try:
+                    encoder.encode(["warmup query"], normalize_embeddings=True, show_progress_bar=False)
+                except Exception as e:
+                    print(f"Warning: Encoder warmup failed: {e}")
+                _ENCODER = encoder
+    return _ENCODER
+
+
+@functools.lru_cache(maxsize=None)
+def _open_client(path: str):
+    """Open the persistent ChromaDB client once per path."""
+    return chromadb.PersistentClient(
+        path=path,
+        settings=Settings(anonymized_telemetry=False)
+    )
+
+
+# Embeddings of recent search queries (float16), keyed by a hash of the
+# query text (`_query_key`); repeated questions skip the encoder
+_QUERY_CACHE_SIZE = 1024
+_query_cache: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+
+# Embeddings are L2-normalised on encode (see `VectorRAGTool._embed`), so the
+# inner product equals cosine similarity without normalising per comparison.
+# Chroma reports the distance as 1 - ip, like 1 - cosine.
+_HNSW_SPACE = "ip"
+
+
+def _auto_hnsw_params(count: int) -> Dict[str, Any]:
+    """HNSW index settings for a collection of `count` vectors.
+
+    Chroma's defaults (M=16, construction_ef=100, search_ef=10) favour build
+    speed; RAG collections are built once and searched often, so search_ef
+    is raised for recall and larger collections get a denser graph.
+    """
+    if count < 100_000:
+        m, construction_ef, search_ef = 16, 64, 40
+    elif count < 1_000_000:
+        m, construction_ef, search_ef = 24, 100, 100
+    else:
+        m, construction_ef, search_ef = 32, 128, 200
+    return {"hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+
+
+# Cache keys only need to tell texts apart, not resist attacks, so the much
+# faster xxHash is used when installed.  The chunk hash name is stored with
+# the embedding cache, which is discarded if it was keyed differently.
+_CHUNK_HASH_NAME = "xxh3_128" if HAS_XXHASH else "blake2b_128"
+
+
+def _chunk_hash(text: str) -> str:
+    if HAS_XXHASH:
+        return xxhash.xxh3_128_hexdigest(text)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _query_key(query: str) -> Hashable:
+    if HAS_XXHASH:
+        return xxhash.xxh3_64_intdigest(query)
+    return hashlib.sha1(query.encode("utf-8")).digest()
+
+
+def _load_embedding_cache() -> Tuple[Dict[str, int], Optional[np.ndarray]]:
+    """Return the persisted `{hash: row}` map and embedding matrix.
+
+    A missing or unreadable cache, or one written for another model or
+    chunk hash, is treated as empty.
+    """
+    try:
+        with np.load(EMBEDDING_CACHE_PATH, allow_pickle=False) as data:
+            if str(data["model"]) != EMBEDDING_MODEL or str(data["hash"]) != _CHUNK_HASH_NAME:
+                return {}, None
+            hashes = data["hashes"].tolist()
+            vectors = data["vectors"]
+    except (OSError, KeyError, ValueError):
+        return {}, None
+    return {h: i for i, h in enumerate(hashes)}, vectors
+
+
+def _save_embedding_cache(hashes: List[str], vectors: np.ndarray) -> None:
+    """Write the embedding cache atomically (temporary file, then rename)."""
+    os.makedirs(os.path.dirname(EMBEDDING_CACHE_PATH), exist_ok=True)
+    tmp_path = EMBEDDING_CACHE_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            model=np.array(EMBEDDING_MODEL),
+            hash=np.array(_CHUNK_HASH_NAME),
+            hashes=np.array(hashes),
+            vectors=vectors.astype(np.float16, copy=False)
+        )
+    os.replace(tmp_path, EMBEDDING_CACHE_PATH)
+
+
+_SQL_DOCUMENTS = "SELECT id, module, path, tags FROM documents"
+
+
+def _document_rows() -> List[Any]:
+    return database.query(_SQL_DOCUMENTS, None)
+
+
+def _iter_document_rows() -> Iterator[Any]:
+    """Yield the rows of `_document_rows` as they are fetched."""
+    return database.iter_query(_SQL_DOCUMENTS, None, batch_size=1000)
+
+
+def _estimate_chunk_count() -> int:
+    """Rough number of chunks `_iter_document_chunks` will yield.
+
+    Chunks hold up to 500 characters, so the total file size gives the
+    estimate without reading any file.
+    """
+    documents = total_bytes = 0
+    for row in _iter_document_rows():
+        documents += 1
+        try:
+            total_bytes += os.path.getsize(row["path"] or "")
+        except OSError:
+            pass
+    return max(documents, total_bytes // 500)
+
+
+def _corpus_signature(rows: List[Any]) -> str:
+    """Fingerprint of the document table and the files it points to."""
+    digest = hashlib.sha1()
+    for row in rows:
+        path = row["path"] or ""
+        try:
+            stat = os.stat(path)
+            file_state = f"{stat.st_mtime_ns}:{stat.st_size}"
+        except OSError:
+            file_state = "missing"
+        digest.update(f"{row['id']}|{row['module']}|{row['tags']}|{path}|{file_state}\n".encode())
+    return digest.hexdigest()
+
+
+# Document rows and their `_corpus_signature`, shared by the indexes that
+# are checked on every search.  They are recomputed when the documents
+# table is written to, after `_CORPUS_TTL_SECONDS` (files may change on disk
+# without a database write), or after `invalidate_corpus()`.
+_CORPUS_TTL_SECONDS = 30.0
+_corpus_state: Optional[Tuple[float, Tuple[int, ...], List[Any], str]] = None
+_corpus_lock = threading.Lock()
+
+
+def _current_corpus() -> Tuple[List[Any], str]:
+    """Return the document rows and their signature, cached (see above)."""
+    global _corpus_state
+    generations = database.table_generations(("documents",))
+    with _corpus_lock:
+        state = _corpus_state
+        if (
+            state is not None
+            and state[1] == generations
+            and time.monotonic() - state[0] < _CORPUS_TTL_SECONDS
+        ):
+            return state[2], state[3]
+        rows = _document_rows()
+        signature = _corpus_signature(rows)
+        _corpus_state = (time.monotonic(), generations, rows, signature)
+        return rows, signature
+
+
+def invalidate_corpus() -> None:
+    """Make the next search recheck the documents and their files."""
+    global _corpus_state
+    with _corpus_lock:
+        _corpus_state = None
+
+
+# A paragraph of `VectorRAGTool._split_document`: text between blank-line
+# breaks (two or more newlines), without its surrounding whitespace
+_PARA_SPAN_RE = re.compile(r"\S(?:[^\n]*(?:\n(?!\n)[^\n]*)*\S)?")
+
+# Threads reading document files at once; reads are I/O bound
+_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Documents whose text `_iter_document_chunks` holds in memory at once
+_READ_BATCH = _READ_WORKERS * 4
+
+
+def _read_document(path: Optional[str]) -> Optional[str]:
+    """Return the text of a document file, "" if it is missing, None on error."""
+    if not path or not os.path.isfile(path):
+        return ""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            # Decode straight from the mapped pages; reading in text mode
+            # buffers a bytes copy of the whole file first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8", errors="ignore")
+        # Universal newlines, as text mode gave
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+def _read_documents(rows: List[Any]) -> List[Optional[str]]:
+    """Read the files of `rows` concurrently, in order (see `_read_document`)."""
+    if not rows:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_READ_WORKERS, len(rows))) as pool:
+        return list(pool.map(_read_document, [row["path"] for row in rows]))
+
+
+def _iter_document_texts(rows: Iterable[Any]) -> Iterator[Tuple[Any, Optional[str]]]:
+    """Yield `(row, text)` for `rows`, reading `_READ_BATCH` files at a time."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, _READ_BATCH))
+        if not batch:
+            return
+        yield from zip(batch, _read_documents(batch))
+
+
+def _iter_document_chunks(rows: Iterable[Any]):
+    """Yield `(chunk_id, chunk_text, metadata)` for every document chunk.
+
+    `rows` may be a lazy iterator; files are read a batch at a time as the
+    chunks are consumed.
+    """
+    for row, text in _iter_document_texts(rows):
+        doc_id = row["id"]
+        module = row["module"]
+        path = row["path"]
+        tags = row["tags"] or ""
+        
+        if not text or not text.strip():
+            continue
+        
+        # Split document into chunks for better retrieval
+        for i, chunk in enumerate(VectorRAGTool._split_document(text, path)):
+            yield f"{doc_id}_{i}", chunk, {
+                "doc_id": doc_id,
+                "module": module,
+                "path": path,
+                "tags": tags,
+                "chunk_index": i
+            }
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """Return the keyword index over all document chunks.
+
+    The index is loaded from disk when its signature matches the current
+    documents, and rebuilt (and persisted) otherwise.  The documents are
+    rechecked at most every `_CORPUS_TTL_SECONDS`, or when the documents
+    table is written to.
+    """
+    global _bm25_index, _bm25_signature
+    try:
+        rows, signature = _current_corpus()
+    except Exception as e:
+        print(f"Warning: Could not read documents for keyword search: {e}")
+        return _bm25_index
+    with _bm25_lock:
+        if _bm25_index is not None and _bm25_signature == signature:
+            return _bm25_index
+        index = BM25Index.load(BM25_INDEX_PATH, signature)
+        if index is None:
+            chunks = list(_iter_document_chunks(rows))
+            index = BM25Index([c[1] for c in chunks], [c[2] for c in chunks])
+            try:
+                index.save(BM25_INDEX_PATH, signature)
+            except OSError as e:
+                print(f"Warning: Could not persist keyword index: {e}")
+        _bm25_index, _bm25_signature = index, signature
+        return index
+
+
+class _FallbackIndex:
+    """TF-IDF vectors of whole documents for `_fallback_search`.
+
+    Documents are read once when the index is built; a query is scored
+    against all of them with a few NumPy operations over the postings of its
+    terms.
+    """
+
+    def __init__(self, rows: List[Any]) -> None:
+        self.rows: List[Dict[str, Any]] = []
+        term_docs: Dict[str, List[int]] = {}
+        term_freqs: Dict[str, List[float]] = {}
+        for row, text in zip(rows, _read_documents(rows)):
+            if not text:
+                continue
+            path = row["path"]
+            i = len(self.rows)
+            self.rows.append({
+                "id": row["id"],
+                "module": row["module"],
+                "tags": row["tags"],
+                "excerpt": text[:200] + "..." if len(text) > 200 else text,
+                "path": path
+            })
+            counts: Dict[str, int] = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                term_docs.setdefault(term, []).append(i)
+                term_freqs.setdefault(term, []).append(float(tf))
+
+        n = len(self.rows)
+        squared_norms = np.zeros(n, dtype=np.float64)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, docs in term_docs.items():
+            idf = math.log((1 + n) / (1 + len(docs))) + 1
+            docs_array = np.asarray(docs, dtype=np.int32)
+            weights = np.asarray(term_freqs[term]) * idf
+            np.add.at(squared_norms, docs_array, weights ** 2)
+            self._postings[term] = (docs_array, weights, idf)
+        self._norms = np.sqrt(squared_norms)
+        self._norms[self._norms == 0] = 1.0
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity between `query` and every document."""
+        scores = np.zeros(len(self.rows), dtype=np.float64)
+        counts: Dict[str, int] = {}
+        for token in tokenize(query):
+            if token in self._postings:
+                counts[token] = counts.get(token, 0) + 1
+        query_norm = 0.0
+        for term, tf in counts.items():
+            docs, weights, idf = self._postings[term]
+            scores[docs] += weights * (tf * idf)
+            query_norm += (tf * idf) ** 2
+        return scores / (self._norms * math.sqrt(query_norm)) if query_norm else scores
+
+
+_fallback_index: Optional[_FallbackIndex] = None
+_fallback_signature: Optional[str] = None
+_fallback_lock = threading.Lock()
+
+
+def get_fallback_index() -> _FallbackIndex:
+    """Return the TF-IDF index of all documents, rebuilt when they change.
+
+    Changes are detected through the shared `_current_corpus` signature.
+    """
+    global _fallback_index, _fallback_signature
+    rows, signature = _current_corpus()
+    with _fallback_lock:
+        if _fallback_index is None or _fallback_signature != signature:
+            _fallback_index, _fallback_signature = _FallbackIndex(rows), signature
+        return _fallback_index
+
+
+# With hnswlib installed, dense search uses one hnswlib index over all
+# document chunks (every RAG collection holds the same chunks) instead of
+# ChromaDB; it is loaded from disk at startup when its signature matches
+HNSW_INDEX_PATH = os.path.join("./vector_db", "hnsw.bin")
+HNSW_META_PATH = os.path.join("./vector_db", "hnsw_meta.json")
+_hnsw_store: Optional["_HnswStore"] = None
+_hnsw_signature: Optional[str] = None
+_hnsw_lock = threading.Lock()
+
+
+# Filtered hnswlib queries with at most this many allowed chunks are scored
+# exactly with `topk_cosine` instead of walking the graph
+_EXACT_SEARCH_MAX = 2048
+
+
+class _HnswStore:
+    """Document chunks, their metadata and an hnswlib index of their embeddings.
+
+    Vectors are normalised, so the index uses the inner-product space and
+    its distances (1 - dot product) match ChromaDB's.
+    """
+
+    def __init__(self, index, chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.index = index
+        self.chunks = chunks
+        self.metadatas = metadatas
+        self.modules = np.array([m["module"] for m in metadatas], dtype=object)
+        self.doc_ids = np.array([m["doc_id"] for m in metadatas])
+        index.set_ef(_auto_hnsw_params(len(chunks))["hnsw:search_ef"])
+
+    @classmethod
+    def build(cls, chunks: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> "_HnswStore":
+        params = _auto_hnsw_params(len(chunks))
+        index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+        index.init_index(
+            max_elements=len(chunks),
+            ef_construction=params["hnsw:construction_ef"],
+            M=params["hnsw:M"]
+        )
+        index.add_items(embeddings, np.arange(len(chunks)))
+        return cls(index, chunks, metadatas)
+
+    @classmethod
+    def load(cls, signature: str) -> Optional["_HnswStore"]:
+        """Load the persisted store, or None if it is missing or stale."""
+        try:
+            with open(HNSW_META_PATH, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("signature") != signature or meta.get("model") != EMBEDDING_MODEL:
+                return None
+            index = hnswlib.Index(space="ip", dim=meta["dim"])
+            index.load_index(HNSW_INDEX_PATH, max_elements=len(meta["chunks"]))
+        except (OSError, ValueError, KeyError, RuntimeError):
+            return None
+        return cls(index, meta["chunks"], meta["metadatas"])
+
+    def save(self, signature: str) -> None:
+        os.makedirs(os.path.dirname(HNSW_INDEX_PATH), exist_ok=True)
+        self.index.save_index(HNSW_INDEX_PATH)
+        with open(HNSW_META_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "signature": signature,
+                "model": EMBEDDING_MODEL,
+                "dim": self.index.dim,
+                "chunks": self.chunks,
+                "metadatas": self.metadatas
+            }, f)
+
+    def query(
+        self,
+        vectors: np.ndarray,
+        n: int,
+        module: Optional[str],
+        doc_ids: Optional[List[int]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return `(labels, distances)` of the nearest `n` chunks per vector.
+
+        Only chunks of `module` and, if given, of the documents `doc_ids`
+        are searched.  When the filters leave few chunks their stored
+        vectors are compared directly, which is exact and cheaper than a
+        graph walk that skips most of the nodes it visits.
+        """
+        allowed = len(self.chunks)
+        predicate = None
+        if module or doc_ids is not None:
+            mask = np.ones(len(self.chunks), dtype=bool)
+            if module:
+                mask &= self.modules == module
+            if doc_ids is not None:
+                mask &= np.isin(self.doc_ids, doc_ids)
+            allowed = int(np.count_nonzero(mask))
+            predicate = lambda label: bool(mask[label])
+        n = min(n, allowed)
+        if n == 0:
+            empty = np.empty((len(vectors), 0))
+            return empty.astype(np.int64), empty
+        if predicate is not None and allowed <= _EXACT_SEARCH_MAX:
+            candidates = np.flatnonzero(mask)
+            matrix = np.asarray(self.index.get_items(candidates), dtype=np.float32)
+            labels = np.empty((len(vectors), n), dtype=np.int64)
+            distances = np.empty((len(vectors), n), dtype=np.float32)
+            for row, vector in enumerate(vectors):
+                top, scores = topk_cosine(vector, matrix, n)
+                labels[row] = candidates[top]
+                distances[row] = 1 - scores
+            return labels, distances
+        return self.index.knn_query(vectors, k=n, filter=predicate)
+
+
+def get_hnsw_store(embed_documents: Callable[[List[str]], np.ndarray]) -> Optional[_HnswStore]:
+    """Return the hnswlib store over all document chunks.
+
+    It is loaded from disk when its signature matches the current documents,
+    and otherwise built with `embed_documents` and persisted.
+    """
+    global _hnsw_store, _hnsw_signature
+    rows, signature = _current_corpus()
+    with _hnsw_lock:
+        if _hnsw_store is not None and _hnsw_signature == signature:
+            return _hnsw_store
+        store = _HnswStore.load(signature)
+        if store is None:
+            chunks = list(_iter_document_chunks(rows))
+            if not chunks:
+                return None
+            texts = [c[1] for c in chunks]
+            store = _HnswStore.build(texts, [c[2] for c in chunks], embed_documents(texts))
+            try:
+                store.save(signature)
+            except OSError as e:
+                print(f"Warning: Could not persist vector index: {e}")
+        _hnsw_store, _hnsw_signature = store, signature
+        return store
+
+
+def _tag_set(tags: Optional[str]) -> set:
+    """Lowercase tags of a comma-separated tag string."""
+    return {t.strip().lower() for t in (tags or "").split(",") if t.strip()}
+
+
+def _build_tag_index(rows: List[Any]) -> Dict[str, set]:
+    """Inverted index: tag -> ids of the documents carrying it."""
+    index: Dict[str, set] = {}
+    for row in rows:
+        for tag in _tag_set(row["tags"]):
+            index.setdefault(tag, set()).add(row["id"])
+    return index
+
+
+def _matches_filters(metadata: Dict[str, Any], module: Optional[str], tags: Optional[str]) -> bool:
+    if module and metadata.get("module") != module:
+        return False
+    if tags and not _tag_set(tags).issubset(_tag_set(metadata.get("tags", ""))):
+        return False
+    return True
 
 
 class VectorRAGTool:
-    """Vector-based RAG tool using sentence-transformers and ChromaDB."""
+    """Vector-based RAG tool using sentence-transformers and ChromaDB.
+
+    When hnswlib is installed the shared `_HnswStore` index is searched
+    directly and no ChromaDB collection is opened.
+    """
     
     def __init__(self, collection_name: str = "documents"):
         self.collection_name = collection_name
         self.model = None
         self.chroma_client = None
         self.collection = None
+        # hnswlib index used instead of the collection when installed
+        self.hnsw: Optional[_HnswStore] = None
+        # tag -> document ids, so tag filters restrict the vector search
+        # itself rather than its results
+        self._tag_to_doc_ids: Optional[Dict[str, set]] = None
+        # Coalesces concurrent `asearch_batched` calls into one `search_batch`
+        self._batcher = MicroBatcher(self._search_items, max_batch=16, max_wait=0.05)
         
         if HAS_VECTOR_DEPS:
             self._initialize_vector_components()
@@ -42,20 +678,21 @@ class VectorRAGTool:
     def _initialize_vector_components(self):
         """Initialize the sentence transformer model and ChromaDB client."""
         try:
-            # Initialize sentence transformer model
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            # Initialize ChromaDB client
-            self.chroma_client = chromadb.PersistentClient(
-                path="./vector_db",
-                settings=Settings(anonymized_telemetry=False)
-            )
+            # The sentence transformer model and ChromaDB client are shared
+            # by every collection
+            self.model = _get_encoder()
+            self._tag_to_doc_ids = _build_tag_index(_current_corpus()[0])
+            if HAS_HNSWLIB:
+                self.hnsw = get_hnsw_store(self._embed_documents)
+                if self.hnsw is not None:
+                    return
+            with _shared_lock:
+                self.chroma_client = _open_client("./vector_db")
             
             # Get or create collection
-            self.collection = self.chroma_client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            # Embeddings are computed with `self.model` (see `_embed`), so
+            # Chroma's own embedding function is disabled
+            self.collection = self._open_collection()
             
             # Load documents if collection is empty
             self._load_documents_if_needed()
@@ -65,6 +702,7 @@ class VectorRAGTool:
             self.model = None
             self.chroma_client = None
             self.collection = None
+            self.hnsw = None
     
     def _load_documents_if_needed(self):
         """Load documents into vector database if not already present."""
@@ -83,93 +721,187 @@ class VectorRAGTool:
         self._load_all_documents()
     
     def _load_all_documents(self):
-        """Load all documents from the database into the vector store."""
+        """Load all documents from the database into the vector store.
+
+        Document rows are streamed from the database and their chunks are
+        embedded and added `batch_size` at a time, so the corpus is never
+        held in memory at once.
+        """
         if not self.model or not self.collection:
             return
-            
-        rows = database.query("SELECT id, module, path, tags FROM documents", None)
         
-        documents = []
-        metadatas = []
-        ids = []
+        # HNSW settings are fixed when a collection is created, so the still
+        # empty collection is recreated sized for the expected chunk count
+        self._recreate_collection(_estimate_chunk_count())
         
-        for row in rows:
-            doc_id = row["id"]
-            module = row["module"]
-            path = row["path"]
-            tags = row["tags"] or ""
-            
-            # Read document content
-            text = ""
-            if path and os.path.isfile(path):
-                try:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        text = f.read()
-                except Exception as e:
-                    print(f"Error reading {path}: {e}")
-                    continue
-            
-            if not text.strip():
-                continue
-            
-            # Split document into chunks for better retrieval
-            chunks = self._split_document(text, path)
-            
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{doc_id}_{i}"
-                documents.append(chunk)
-                metadatas.append({
-                    "doc_id": doc_id,
-                    "module": module,
-                    "path": path,
-                    "tags": tags,
-                    "chunk_index": i
-                })
-                ids.append(chunk_id)
+        batch_size = 100
+        chunks = _iter_document_chunks(_iter_document_rows())
+        loaded = 0
+        try:
+            with self._document_embedder() as embed:
+                for i, batch in enumerate(iter(lambda: list(itertools.islice(chunks, batch_size)), [])):
+                    documents = [chunk for _, chunk, _ in batch]
+                    embeddings = embed(documents)
+                    try:
+                        self.collection.add(
+                            documents=documents,
+                            embeddings=embeddings.tolist(),
+                            metadatas=[metadata for _, _, metadata in batch],
+                            ids=[chunk_id for chunk_id, _, _ in batch]
+                        )
+                        loaded += len(batch)
+                    except Exception as e:
+                        print(f"Error adding batch {i}: {e}")
+        except Exception as e:
+            print(f"Error embedding documents: {e}")
         
-        if documents:
-            # Add documents to collection in batches
-            batch_size = 100
-            for i in range(0, len(documents), batch_size):
-                batch_docs = documents[i:i+batch_size]
-                batch_metas = metadatas[i:i+batch_size]
-                batch_ids = ids[i:i+batch_size]
-                
-                try:
-                    self.collection.add(
-                        documents=batch_docs,
-                        metadatas=batch_metas,
-                        ids=batch_ids
-                    )
-                except Exception as e:
-                    print(f"Error adding batch {i//batch_size}: {e}")
+        if loaded:
+            print(f"Loaded {loaded} document chunks into vector database")
+    
+    def _recreate_collection(self, size: int) -> None:
+        """Replace the empty collection with one whose HNSW index suits `size` vectors."""
+        try:
+            if self.collection.count() > 0:
+                return
+            self.chroma_client.delete_collection(self.collection_name)
+            self.collection = self.chroma_client.create_collection(
+                name=self.collection_name,
+                metadata={"hnsw:space": _HNSW_SPACE, **_auto_hnsw_params(size)},
+                embedding_function=None
+            )
+        except Exception as e:
+            print(f"Warning: Could not resize vector index: {e}")
+            self.collection = self._open_collection()
+    
+    def _open_collection(self):
+        """Open the existing collection, or create it with `_HNSW_SPACE`.
+
+        An existing collection keeps the space it was built with; older
+        collections use cosine, which ranks normalised vectors the same.
+        """
+        try:
+            return self.chroma_client.get_collection(name=self.collection_name, embedding_function=None)
+        except Exception:
+            return self.chroma_client.create_collection(
+                name=self.collection_name,
+                metadata={"hnsw:space": _HNSW_SPACE},
+                embedding_function=None
+            )
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Encode `texts` into unit-length embeddings, one row per text."""
+        return self.model.encode(
+            texts,
+            batch_size=_encode_batch_size(self.model),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+    
+    def _embed_documents(self, documents: List[str]) -> np.ndarray:
+        """Like `_embed`, reusing embeddings persisted in `EMBEDDING_CACHE_PATH`.
+
+        Only chunks whose text hash is not in the cache are encoded; the
+        cache is then rewritten with the new embeddings added.
+        """
+        with self._document_embedder() as embed:
+            return embed(documents)
+    
+    @contextmanager
+    def _document_embedder(self) -> Iterator[Callable[[List[str]], np.ndarray]]:
+        """Yield an `_embed_documents` function for several batches of chunks.
+
+        The embedding cache is loaded once on entry and, if any chunk had to
+        be encoded, rewritten once on exit.
+        """
+        with _embedding_cache_lock:
+            index, cached = _load_embedding_cache()
+            # Embeddings encoded since entry, by chunk hash
+            added: Dict[str, np.ndarray] = {}
             
-            print(f"Loaded {len(documents)} document chunks into vector database")
+            def embed(documents: List[str]) -> np.ndarray:
+                hashes = [_chunk_hash(document) for document in documents]
+                # First position of each chunk text that still needs encoding
+                missing: Dict[str, int] = {}
+                for i, h in enumerate(hashes):
+                    if h not in index and h not in added and h not in missing:
+                        missing[h] = i
+                if missing:
+                    vectors = np.asarray(self._embed([documents[i] for i in missing.values()]), dtype=np.float32)
+                    added.update(zip(missing, vectors))
+                if not added:
+                    return cached[[index[h] for h in hashes]].astype(np.float32, copy=False)
+                return np.stack([
+                    added[h] if h in added else cached[index[h]].astype(np.float32) for h in hashes
+                ])
+            
+            try:
+                yield embed
+            finally:
+                if added:
+                    vectors = np.stack(list(added.values()))
+                    if cached is not None:
+                        vectors = np.concatenate([cached.astype(np.float32), vectors])
+                    try:
+                        _save_embedding_cache(list(index) + list(added), vectors)
+                    except OSError as e:
+                        print(f"Warning: Could not persist embedding cache: {e}")
+    
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Like `_embed`, serving repeated queries from `_query_cache`."""
+        keys = [_query_key(query) for query in queries]
+        vectors: List[Optional[np.ndarray]] = []
+        with _query_cache_lock:
+            for key in keys:
+                vector = _query_cache.get(key)
+                if vector is not None:
+                    _query_cache.move_to_end(key)
+                vectors.append(vector)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = self._embed([queries[i] for i in missing])
+            with _query_cache_lock:
+                for i, vector in zip(missing, encoded):
+                    vectors[i] = vector
+                    _query_cache[keys[i]] = vector.astype(np.float16)
+                while len(_query_cache) > _QUERY_CACHE_SIZE:
+                    _query_cache.popitem(last=False)
+        return np.stack(vectors).astype(np.float32, copy=False)
     
-    def _split_document(self, text: str, path: str) -> List[str]:
+    @staticmethod
+    def _split_document(text: str, path: str) -> List[str]:
         """Split document into smaller chunks for better retrieval."""
-        # Simple chunking strategy - split by paragraphs and limit size
-        paragraphs = text.split('\n\n')
+        # Simple chunking strategy - split by paragraphs and limit size.
+        # One pass over the paragraph offsets; a chunk whose paragraphs are
+        # separated by exactly "\n\n" is a single slice of `text`, and
+        # only other separators are normalised by joining its paragraphs.
         chunks = []
-        current_chunk = ""
+        spans: List[Tuple[int, int]] = []  # paragraphs of the current chunk
+        current_len = 0  # length of the chunk once its paragraphs are joined
+        contiguous = True  # whether `text` already has that chunk verbatim
         max_chunk_size = 500  # characters
         
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
-                
-            if len(current_chunk) + len(paragraph) > max_chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = paragraph
+        def emit() -> None:
+            if contiguous:
+                chunks.append(text[spans[0][0]:spans[-1][1]])
             else:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
-                else:
-                    current_chunk = paragraph
+                chunks.append("\n\n".join(text[start:end] for start, end in spans))
+        
+        for match in _PARA_SPAN_RE.finditer(text):
+            start, end = match.span()
+            if spans and current_len + (end - start) > max_chunk_size:
+                emit()
+                spans = []
+                current_len = 0
+                contiguous = True
+            if spans:
+                current_len += 2
+                contiguous = contiguous and start - spans[-1][1] == 2
+            current_len += end - start
+            spans.append((start, end))
         
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if spans:
+            emit()
         
         # Ensure we have at least one chunk
         if not chunks and text.strip():
@@ -183,6 +915,7 @@ class VectorRAGTool:
         k: int = 3,
         module: Optional[str] = None,
         tags: Optional[str] = None,
+        hybrid: bool = True,
     ) -> List[Dict[str, Any]]:
         """
         Search for relevant documents using vector similarity.
@@ -192,119 +925,255 @@ class VectorRAGTool:
             k: Maximum number of results to return.
             module: Optional filter to restrict results to a given module.
             tags: Optional comma-separated list of tags to filter documents.
+            hybrid: Also run BM25 keyword search and fuse both rankings
+                with Reciprocal Rank Fusion.
         
         Returns:
             A list of dictionaries with document information and excerpts.
         """
+        return self.search_batch([query], k, module, tags, hybrid)[0]
+
+    async def asearch(
+        self,
+        query: str,
+        k: int = 3,
+        module: Optional[str] = None,
+        tags: Optional[str] = None,
+        hybrid: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Async variant of :meth:`search` that runs on a worker thread."""
+        return await asyncio.to_thread(self.search, query, k, module, tags, hybrid)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 3,
+        module: Optional[str] = None,
+        tags: Optional[str] = None,
+        hybrid: bool = True,
+    ) -> List[List[Dict[str, Any]]]:
+        """Run :meth:`search` for several queries, embedding them in one call.
+
+        Returns one result list per query, in order.
+        """
+        dense = self._vector_search_many(queries, k, module, tags)
+        if not hybrid:
+            return dense
+        return [
+            self._fuse_keyword_results(query, results, k, module, tags)
+            for query, results in zip(queries, dense)
+        ]
+
+    async def asearch_batched(
+        self,
+        query: str,
+        k: int = 3,
+        module: Optional[str] = None,
+        tags: Optional[str] = None,
+        hybrid: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Async :meth:`search` that is coalesced with concurrent calls.
+
+        Queries submitted within a short window are searched together by
+        :meth:`search_batch`, so concurrent sessions share one embedding and
+        vector store call.  The wait adds up to 50 ms, so use this where the
+        search overlaps other work.
+        """
+        return await self._batcher.submit((query, k, module, tags, hybrid))
+
+    async def _search_items(self, items: List[tuple]) -> List[Any]:
+        """Batch handler for `_batcher`: one `search_batch` per set of options."""
+        groups: Dict[tuple, List[int]] = {}
+        for i, (_, *options) in enumerate(items):
+            groups.setdefault(tuple(options), []).append(i)
+        results: List[Any] = [None] * len(items)
+        for options, indexes in groups.items():
+            queries = [items[i][0] for i in indexes]
+            try:
+                found = await asyncio.to_thread(self.search_batch, queries, *options)
+            except Exception as e:
+                found = [e] * len(indexes)
+            for i, result in zip(indexes, found):
+                results[i] = result
+        return results
+
+    def _fuse_keyword_results(
+        self,
+        query: str,
+        dense_results: List[Dict[str, Any]],
+        k: int,
+        module: Optional[str],
+        tags: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """Combine vector results with BM25 results using RRF (k=60)."""
+        try:
+            index = get_bm25_index()
+            hits = index.search(query, k, lambda m: _matches_filters(m, module, tags)) if index else []
+        except Exception as e:
+            print(f"Warning: Keyword search failed: {e}")
+            return dense_results[:k]
+        if not hits:
+            return dense_results[:k]
+
+        candidates: Dict[Any, Dict[str, Any]] = {}
+        dense_keys = []
+        for result in dense_results:
+            key = (result["id"], result["excerpt"])
+            candidates.setdefault(key, result)
+            dense_keys.append(key)
+        keyword_keys = []
+        for i, _ in hits:
+            doc = index.chunks[i]
+            metadata = index.metadatas[i]
+            result = {
+                "id": metadata["doc_id"],
+                "module": metadata["module"],
+                "tags": metadata["tags"],
+                "excerpt": doc[:200] + "..." if len(doc) > 200 else doc,
+                "path": metadata["path"]
+            }
+            key = (result["id"], result["excerpt"])
+            candidates.setdefault(key, result)
+            keyword_keys.append(key)
+
+        fused = reciprocal_rank_fusion([dense_keys, keyword_keys], k=60)
+        return [{**candidates[key], "score": score} for key, score in fused[:k]]
+
+    def _vector_search_many(
+        self,
+        queries: List[str],
+        k: int,
+        module: Optional[str],
+        tags: Optional[str],
+    ) -> List[List[Dict[str, Any]]]:
+        """Dense retrieval for several queries with a single ChromaDB query."""
+        if self.model and self.hnsw:
+            return self._hnsw_search_many(queries, k, module, tags)
         if not self.model or not self.collection:
             # Fallback to simple search if vector components not available
-            return self._fallback_search(query, k, module, tags)
+            return [self._fallback_search(query, k, module, tags) for query in queries]
         
         try:
-            # Build filter conditions
-            where_conditions = {}
+            # Build filter conditions; tags are matched through the inverted
+            # tag index as a set of allowed document ids
+            conditions = []
             if module:
-                where_conditions["module"] = module
+                conditions.append({"module": module})
+            doc_ids = self._allowed_doc_ids(tags)
+            if doc_ids is not None:
+                if not doc_ids:
+                    return [[] for _ in queries]
+                conditions.append({"doc_id": {"$in": doc_ids}})
+            where = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else None)
             
-            if tags:
-                # For tags, we'll do a post-processing filter since ChromaDB
-                # doesn't support complex string matching in where clause
-                pass
-            
-            # Query the vector database
+            # Query the vector database; all queries are embedded together
             results = self.collection.query(
-                query_texts=[query],
-                n_results=min(k * 2, 20),  # Get more results for filtering
-                where=where_conditions if where_conditions else None
+                query_embeddings=self._embed_queries(list(queries)).tolist(),
+                n_results=max(k, min(k * 2, 20)),  # Get more results for filtering
+                where=where
             )
             
-            if not results["documents"] or not results["documents"][0]:
-                return []
-            
-            # Process results
-            processed_results = []
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results["documents"][0],
-                results["metadatas"][0], 
-                results["distances"][0]
-            )):
-                # Apply tag filtering if specified
-                if tags:
-                    requested_tags = {t.strip().lower() for t in tags.split(",") if t.strip()}
-                    doc_tags = {t.strip().lower() for t in (metadata.get("tags", "") or "").split(",") if t.strip()}
-                    if not requested_tags.issubset(doc_tags):
-                        continue
-                
-                # Convert distance to similarity score (0-1, higher is better)
-                score = max(0, 1 - distance)
-                
-                processed_results.append({
-                    "id": metadata["doc_id"],
-                    "module": metadata["module"],
-                    "tags": metadata["tags"],
-                    "score": score,
-                    "excerpt": doc[:200] + "..." if len(doc) > 200 else doc,
-                    "path": metadata["path"]
-                })
-                
-                if len(processed_results) >= k:
-                    break
-            
-            return processed_results
+            if not results["documents"]:
+                return [[] for _ in queries]
+            return [
+                self._process_vector_hits(documents, metadatas, distances, k, tags)
+                for documents, metadatas, distances in zip(
+                    results["documents"], results["metadatas"], results["distances"]
+                )
+            ]
             
         except Exception as e:
             print(f"Error in vector search: {e}")
-            return self._fallback_search(query, k, module, tags)
-    
-    def _fallback_search(self, query: str, k: int, module: Optional[str], tags: Optional[str]) -> List[Dict[str, Any]]:
-        """Fallback to simple text search when vector search is not available."""
-        # Simple keyword matching fallback
-        query_words = set(query.lower().split())
-        rows = database.query("SELECT id, module, path, tags FROM documents", None)
-        
-        results = []
-        for row in rows:
-            if module and row["module"] != module:
+            return [self._fallback_search(query, k, module, tags) for query in queries]
+
+    def _allowed_doc_ids(self, tags: Optional[str]) -> Optional[List[int]]:
+        """Ids of the documents carrying every tag in `tags`, or None for no filter."""
+        requested = _tag_set(tags)
+        if not requested or self._tag_to_doc_ids is None:
+            return None
+        return sorted(set.intersection(*(self._tag_to_doc_ids.get(tag, set()) for tag in requested)))
+
+    def _hnsw_search_many(
+        self,
+        queries: List[str],
+        k: int,
+        module: Optional[str],
+        tags: Optional[str],
+    ) -> List[List[Dict[str, Any]]]:
+        """Dense retrieval for several queries from the hnswlib index."""
+        try:
+            labels, distances = self.hnsw.query(
+                self._embed_queries(list(queries)),
+                max(k, min(k * 2, 20)),
+                module,
+                self._allowed_doc_ids(tags)
+            )
+        except Exception as e:
+            print(f"Error in vector search: {e}")
+            return [self._fallback_search(query, k, module, tags) for query in queries]
+        return [
+            self._process_vector_hits(
+                [self.hnsw.chunks[i] for i in row_labels],
+                [self.hnsw.metadatas[i] for i in row_labels],
+                row_distances.tolist(),
+                k,
+                tags
+            )
+            for row_labels, row_distances in zip(labels, distances)
+        ]
+
+    @staticmethod
+    def _process_vector_hits(
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        distances: List[float],
+        k: int,
+        tags: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """Turn the ChromaDB hits of one query into result dictionaries."""
+        processed_results = []
+        for doc, metadata, distance in zip(documents, metadatas, distances):
+            # Tags are normally filtered before the search; this catches
+            # tools without a tag index
+            if tags and not _tag_set(tags).issubset(_tag_set(metadata.get("tags", ""))):
                 continue
             
-            if tags:
-                requested_tags = {t.strip().lower() for t in tags.split(",") if t.strip()}
-                doc_tags = {t.strip().lower() for t in (row["tags"] or "").split(",") if t.strip()}
-                if not requested_tags.issubset(doc_tags):
-                    continue
-            
-            # Read document and calculate simple score
-            path = row["path"]
-            text = ""
-            if path and os.path.isfile(path):
-                try:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        text = f.read()
-                except:
-                    continue
-            
-            if not text:
-                continue
+            # Convert distance to similarity score (0-1, higher is better)
+            score = max(0, 1 - distance)
             
-            # Simple word overlap score
-            doc_words = set(text.lower().split())
-            overlap = len(query_words & doc_words)
-            total = len(query_words | doc_words)
-            score = overlap / total if total > 0 else 0
+            processed_results.append({
+                "id": metadata["doc_id"],
+                "module": metadata["module"],
+                "tags": metadata["tags"],
+                "score": score,
+                "excerpt": doc[:200] + "..." if len(doc) > 200 else doc,
+                "path": metadata["path"]
+            })
             
-            if score > 0:
-                results.append({
-                    "id": row["id"],
-                    "module": row["module"], 
-                    "tags": row["tags"],
-                    "score": score,
-                    "excerpt": text[:200] + "..." if len(text) > 200 else text,
-                    "path": row["path"]
-                })
+            if len(processed_results) >= k:
+                break
         
-        # Sort by score and return top k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:k]
+        return processed_results
+
+    def _fallback_search(self, query: str, k: int, module: Optional[str], tags: Optional[str]) -> List[Dict[str, Any]]:
+        """Fallback to TF-IDF keyword search when vector search is not available."""
+        index = get_fallback_index()
+        scores = index.scores(query)
+        if module or tags:
+            for i, row in enumerate(index.rows):
+                if not _matches_filters(row, module, tags):
+                    scores[i] = 0.0
+        
+        # Partition out the top k in O(n), then sort just those, best first;
+        # documents without any query term are dropped
+        if k <= 0 or not len(scores):
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind="stable")]
+        return [{**index.rows[i], "score": float(scores[i])} for i in order if scores[i] > 0]
 
 
 # Domain-specific RAG tools as required by project specifications
@@ -354,3 +1223,7 @@ class SalesRAGTool(VectorRAGTool):
     def search_procedures(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
         """Search sales procedures and CRM documentation."""
         return self.search(query, k=k, module="sales")
+
+    async def asearch_procedures(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Async variant of :meth:`search_procedures`, coalesced with concurrent calls."""
+        return await self.asearch_batched(query, k=k, module="sales")